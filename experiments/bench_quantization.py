@@ -0,0 +1,93 @@
+"""
+Benchmark: int8 quantized LTM search vs exact float32 search (numpy backend).
+
+Builds one user's store from clustered synthetic embeddings, then reports
+recall@k against the exact float32 results, query latency and the bytes
+per vector that a query has to scan, for float32 / float16 / int8 with
+several re-rank factors.
+
+    python experiments/bench_quantization.py [--n 100000] [--dim 384] [--k 10]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.memory.numpy_store import NumpyLongTermMemory  # noqa: E402
+
+
+def make_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    # unit vectors around a few hundred topics, like sentence embeddings of one user's memories
+    centers = rng.standard_normal((max(8, n // 200), dim)).astype(np.float32)
+    x = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def build(path: str, vecs: np.ndarray, **kwargs) -> NumpyLongTermMemory:
+    ltm = NumpyLongTermMemory(path, **kwargs)
+    for start in range(0, len(vecs), 5000):
+        blk = vecs[start : start + 5000]
+        ltm.add_many(
+            [{"user_id": "bench", "text": f"m{start + i}", "embedding": v} for i, v in enumerate(blk)]
+        )
+    return ltm
+
+
+def run(ltm: NumpyLongTermMemory, queries: np.ndarray, k: int):
+    ltm.query("bench", queries[0], k)  # warm: loads the shard
+    t0 = time.perf_counter()
+    results = [[h["text"] for h in ltm.query("bench", q, k)] for q in queries]
+    return results, (time.perf_counter() - t0) / len(queries) * 1000
+
+
+def recall(results, truth) -> float:
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = make_vectors(args.n, args.dim, rng)
+    queries = make_vectors(args.queries, args.dim, rng)
+    root = tempfile.mkdtemp(prefix="bench_quant_")
+    try:
+        exact = build(os.path.join(root, "f32"), vecs)
+        truth, ms = run(exact, queries, args.k)
+        rows = [("float32 exact", 4 * args.dim, 1.0, ms)]
+
+        half = build(os.path.join(root, "f16"), vecs, dtype="float16")
+        res, ms = run(half, queries, args.k)
+        rows.append(("float16 exact", 2 * args.dim, recall(res, truth), ms))
+
+        quant = build(os.path.join(root, "int8"), vecs, quantize="int8")
+        quant.train_quantizer()
+        for rerank in (1, 2, 4, 8):
+            quant.rerank = rerank
+            quant._shard("bench").set_quantizer(quant.quantizer, rerank)
+            res, ms = run(quant, queries, args.k)
+            rows.append((f"int8 rerank x{rerank}", args.dim, recall(res, truth), ms))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"n={args.n} dim={args.dim} k={args.k} queries={args.queries}")
+    print(f"{'variant':<18} {'scan bytes/vec':>15} {f'recall@{args.k}':>10} {'ms/query':>9}")
+    for name, nbytes, rec, ms in rows:
+        print(f"{name:<18} {nbytes:>15} {rec:>10.4f} {ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark: sensitivity detection + redaction on long pasted inputs.
+
+Compares the previous per-turn path (contains_sensitive twice, four regexes
+plus a keyword loop, then three more regexes to redact) against the
+single-pass SensitivityScanner.
+
+    python experiments/bench_sensitivity.py [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import sensitivity_scanner  # noqa: E402
+
+KEYWORDS = ["password", "bank", "card", "ni number"]
+
+# ---------- previous implementation, kept here for comparison ----------
+_EMAIL_RE = re.compile(r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", re.I)
+_PHONE_RE = re.compile(r"\b(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{2,4}\)?[\s-]?)?\d{3,4}[\s-]?\d{3,4}\b")
+_PASSWORD_HINT_RE = re.compile(r"\b(my password is|password:|passcode:)\b", re.I)
+_OLD_CARD_RE = re.compile(r"\b(?:\d[ -]*?){13,16}\b")
+
+
+def old_contains(text: str, kws: list) -> bool:
+    if _EMAIL_RE.search(text) or _PASSWORD_HINT_RE.search(text) or _OLD_CARD_RE.search(text):
+        return True
+    if _PHONE_RE.search(text):
+        return True
+    low = text.lower()
+    return any(k.lower() in low for k in kws)
+
+
+def old_turn(text: str) -> str:
+    old_contains(text, KEYWORDS)  # should_treat_as_sensitive
+    if old_contains(text, KEYWORDS):  # redact_if_needed
+        text = _EMAIL_RE.sub("[REDACTED_EMAIL]", text)
+        text = _OLD_CARD_RE.sub("[REDACTED_CARD]", text)
+        text = _PHONE_RE.sub("[REDACTED_PHONE]", text)
+    return text
+
+
+def new_turn(text: str) -> str:
+    scanner = sensitivity_scanner(KEYWORDS)
+    spans = scanner.scan(text)
+    return scanner.redact(text, spans) if spans else text
+
+
+# ---------- inputs ----------
+def make_inputs(rng: random.Random) -> dict:
+    words = "the service returned an error while processing the request for user".split()
+    prose = " ".join(rng.choice(words) for _ in range(20_000))
+    log = "\n".join(
+        f"2024-05-{rng.randint(1, 28):02d}T12:{rng.randint(0, 59):02d}:00 INFO req={rng.randint(10**9, 10**10)} "
+        f"latency_ms={rng.randint(1, 999)} bytes={rng.randint(100, 99999)}"
+        for _ in range(2_000)
+    )
+    csv = "\n".join(",".join(str(rng.randint(0, 10**6)) for _ in range(12)) for _ in range(2_000))
+    digits = " ".join("".join(rng.choice("0123456789") for _ in range(12)) for _ in range(2_000))
+    mixed = prose[:20_000] + " contact me at someone@example.com or 4111 1111 1111 1111 " + csv[:20_000]
+    return {"prose": prose, "log": log, "csv": csv, "digit_runs": digits, "mixed": mixed}
+
+
+def bench(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    inputs = make_inputs(random.Random(0))
+    print(f"{'input':<12} {'chars':>9} {'old ms':>10} {'new ms':>10} {'speedup':>8}")
+    for name, text in inputs.items():
+        old = bench(old_turn, text, args.repeat)
+        new = bench(new_turn, text, args.repeat)
+        print(f"{name:<12} {len(text):>9} {old:>10.2f} {new:>10.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: CLI cold-start time per mode, and the import cost of the heavy dependencies.
+
+Each mode runs `run.py` in a fresh interpreter, in an empty scratch directory,
+with the offline embedder: a chat session that exits at once, or a one-record
+ingest. It reports the median wall time and which heavy packages the mode
+actually imported (from -X importtime). A second table times `import <pkg>`
+alone for each heavy package.
+
+    python experiments/bench_startup.py [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN = os.path.join(ROOT, "run.py")
+HEAVY = ("chromadb", "openai", "rich", "pydantic", "numpy", "dotenv")
+# the module the code actually imports (bare `rich` is nearly free)
+IMPORTED_AS = {"rich": "rich.console"}
+
+MODES = {
+    "help": ["--help"],
+    "chat no_memory": ["chat", "--memory_mode", "no_memory"],
+    "chat stm": ["chat", "--memory_mode", "stm"],
+    "chat stm_ltm numpy": ["chat", "--memory_mode", "stm_ltm", "--ltm_backend", "numpy"],
+    "chat stm_ltm chroma": ["chat", "--memory_mode", "stm_ltm", "--ltm_backend", "chroma"],
+    "ingest chroma": ["ingest", "--input", "one.jsonl", "--ltm_backend", "chroma"],
+}
+
+
+def run_once(args, cwd: str, importtime: bool = False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [RUN, *args, "--embed_backend", "local"]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=cwd, input=":exit\n", capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+    return wall, proc.stderr
+
+
+def imported(stderr: str):
+    found = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:"):
+            name = line.rsplit("|", 1)[-1].strip()
+            if name in HEAVY:
+                found.add(name)
+    return sorted(found)
+
+
+def import_cost(pkg: str, repeat: int) -> float:
+    module = IMPORTED_AS.get(pkg, pkg)
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    runs = [float(subprocess.check_output([sys.executable, "-c", code], text=True)) for _ in range(repeat)]
+    return statistics.median(runs) * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'mode':<22} {'median ms':>10} {'min ms':>8}  heavy imports")
+    for name, mode_args in MODES.items():
+        with tempfile.TemporaryDirectory(prefix="bench_startup_") as cwd:
+            with open(os.path.join(cwd, "one.jsonl"), "w", encoding="utf-8") as f:
+                f.write('{"user_id": "u", "text": "I prefer tea"}\n')
+            # first run creates the data directory; later runs are the steady state
+            _, stderr = run_once(mode_args, cwd, importtime=True)
+            walls = [run_once(mode_args, cwd)[0] * 1000 for _ in range(args.repeat)]
+        heavy = ", ".join(imported(stderr)) or "-"
+        print(f"{name:<22} {statistics.median(walls):>10.0f} {min(walls):>8.0f}  {heavy}")
+
+    print()
+    print(f"{'package':<22} {'import ms':>10}")
+    for pkg in HEAVY:
+        print(f"{IMPORTED_AS.get(pkg, pkg):<22} {import_cost(pkg, args.repeat):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
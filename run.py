@@ -3,53 +3,355 @@ load_dotenv(dotenv_path=".env")
 
 import argparse
 import os
-from rich.console import Console
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Optional
 
-from src.digital_self import DigitalSelf
-from src.memory.session import SessionMemory
-from src.memory.short_term import ShortTermMemory
-from src.memory.long_term import LongTermMemory
+from src.digital_self import PrivacyConfig
+from src.digital_self_store import DigitalSelfStore
+from src.memory.session import SessionMemory, set_session_spill
+from src.memory.short_term import short_term_for_mode
+from src.memory.long_term import LongTermMemoryBase, LTM_BACKENDS, open_long_term_memory
+from src.memory.expiry import ExpirySweeper
+from src.memory.consolidation import Consolidator, consolidate_all
 from src.agent import handle_turn
-from src.utils import safe_json_load, safe_json_dump
+from src.metrics import metrics_enabled, set_metrics_enabled
+from src.retrieval import RETRIEVAL_MODES, set_ltm_gate, set_retrieval_mode
+from src.migration import Cutover, WriteFence, read_active_embedding
+from src.utils import LazyConsole, set_embedding_backend, EmbeddingBackend
 
 
-console = Console()
+console = LazyConsole()
 
 
-def load_or_create_digital_self(user_id: str, path: str) -> DigitalSelf:
-    data = safe_json_load(path, default=None)
-    if data is None:
-        ds = DigitalSelf(user_id=user_id)
-        safe_json_dump(path, ds.model_dump())
-        return ds
-    return DigitalSelf(**data)
+def open_ltm(
+    args: argparse.Namespace, backend: EmbeddingBackend, keep_layout: bool = False, fenced: bool = True
+) -> LongTermMemoryBase:
+    """
+    fenced: every write holds the migration write fence (the default for anything
+    that writes while a migration may run; the migration's own stores are unfenced).
+    """
+    kwargs = {}
+    if args.ltm_backend == "numpy":
+        kwargs = {"dtype": args.vector_dtype, "quantize": args.quantize, "rerank": args.rerank}
+    else:
+        # keep_layout: open the store as persisted (after a reshard-ltm it may differ from --ltm_shards)
+        kwargs = {"shards": None if keep_layout else args.ltm_shards, "shard_dirs": args.ltm_shard_dirs}
+    ltm = open_long_term_memory(args.ltm_backend, embedding_model=backend.name, data_dir="data", **kwargs)
+    if fenced:
+        ltm.fence = WriteFence("data")
+    return ltm
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--user_id", type=str, default="default_user")
-    parser.add_argument("--memory_mode", type=str, default="stm_ltm", choices=["no_memory", "stm", "stm_ltm"])
-    args = parser.parse_args()
+def open_cutover(
+    args: argparse.Namespace,
+    ltm: LongTermMemoryBase,
+    sweeper: Optional[ExpirySweeper],
+    consolidator: Optional[Consolidator],
+) -> Cutover:
+    """Follows migrate-embeddings / reshard-ltm runs in this process; the background workers move along."""
+    cutover = Cutover(ltm, lambda backend: open_ltm(args, backend, keep_layout=True), data_dir="data")
+
+    def repoint(new: LongTermMemoryBase) -> None:
+        if sweeper is not None:
+            sweeper.ltm = new
+        if consolidator is not None:
+            consolidator.ltm = new
+            new.add_write_listener(consolidator.notify)
+
+    cutover.on_switch(repoint)
+    return cutover
+
+
+def start_consolidator(args: argparse.Namespace, ltm: LongTermMemoryBase) -> Optional[Consolidator]:
+    if args.consolidate_interval <= 0:
+        return None
+    return Consolidator(ltm, threshold=args.consolidate_threshold, interval_seconds=args.consolidate_interval).start()
+
+
+def open_ds_store(args: argparse.Namespace) -> DigitalSelfStore:
+    return DigitalSelfStore(args.ds_db, legacy_dir="data", flush_interval=args.ds_flush_interval)
+
+
+def run_import_profiles(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    store = open_ds_store(args)
+    n = store.import_json_dir("data")
+    store.close()
+    console.print(f"[green]Imported {n} Digital Self JSON files into {args.ds_db}.[/green]")
+
+
+def run_ingest(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    from src.ingest import iter_jsonl, ingest_records
+
+    if not args.input:
+        console.print("[red]ingest requires --input <records.jsonl>[/red]")
+        return
+
+    ltm = open_ltm(args, backend)
+    store = open_ds_store(args)
+
+    @lru_cache(maxsize=4096)
+    def privacy_for_user(user_id: str) -> PrivacyConfig:
+        """Privacy settings from the user's saved Digital Self, or the defaults."""
+        ds = store.get(user_id)
+        return ds.privacy if ds is not None else PrivacyConfig()
+
+    console.print(f"[bold]Ingesting[/bold] {args.input} | batch_size={args.batch_size} | embeddings={backend.name}")
+    stats = ingest_records(
+        iter_jsonl(args.input),
+        ltm,
+        privacy_for=privacy_for_user,
+        batch_size=args.batch_size,
+        on_batch=lambda s: console.print(f"[dim]stored={s['stored']} read={s['read']}[/dim]"),
+    )
+    store.close()
+    console.print(f"[green]Ingest complete:[/green] {stats}")
+
+
+def run_migrate_expiry(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    ltm = open_ltm(args, backend)
+    n = ltm.migrate_expiry_metadata()
+    console.print(f"[green]Added expires_at_ts to {n} long-term memories.[/green]")
+
+
+def run_consolidate(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    ltm = open_ltm(args, backend)
+    stats = consolidate_all(ltm, threshold=args.consolidate_threshold)
+    console.print(f"[green]Consolidation complete:[/green] {stats}")
+
+
+def run_quantize(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    if args.ltm_backend != "numpy" or not args.quantize:
+        console.print("[red]quantize requires --ltm_backend numpy --quantize int8[/red]")
+        return
+    ltm = open_ltm(args, backend)
+    q = ltm.train_quantizer()
+    if q is None:
+        console.print("[yellow]No vectors stored yet; nothing to train.[/yellow]")
+    else:
+        console.print(f"[green]Trained {args.quantize} quantizer ({q.dim} dims) for {ltm.persist_dir}.[/green]")
+
+
+def run_migrate_embeddings(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    from src.migration import checkpoint_path, migrate_embeddings, set_active_embedding
+    from src.utils import make_embedding_backend
+
+    if not args.target_embed:
+        console.print("[red]migrate-embeddings requires --target_embed <backend spec>[/red]")
+        return
+    target_backend = make_embedding_backend(args.target_embed)
+    if target_backend.name == backend.name:
+        console.print(f"[yellow]Already using {backend.name}; nothing to migrate.[/yellow]")
+        return
+
+    source = open_ltm(args, backend, fenced=False)
+    target = open_ltm(args, target_backend, fenced=False)
+    ckpt = checkpoint_path(backend.name, target_backend.name)
+    profiles = 0
+
+    def switch() -> None:
+        # under the write fence: new turns (here and in running services) embed with the target
+        # model and use its collection
+        nonlocal profiles
+        set_active_embedding(args.target_embed)
+        store = open_ds_store(args)
+        profiles = store.rename_embedding_model(backend.name, target_backend.name)
+        store.close()
+
+    console.print(
+        f"[bold]Re-embedding[/bold] {backend.name} -> {target_backend.name} | workers={args.migrate_workers}"
+        f" | rate={args.migrate_rate or 'unlimited'}/s | checkpoint={ckpt}"
+    )
+    state = migrate_embeddings(
+        source,
+        target,
+        target_backend,
+        ckpt,
+        page_size=args.migrate_page_size,
+        batch_size=args.batch_size,
+        workers=args.migrate_workers,
+        rate=args.migrate_rate,
+        on_page=lambda s: console.print(f"[dim]offset={s['offset']} migrated={s['migrated']}[/dim]"),
+        fence=WriteFence("data"),
+        on_cutover=switch,
+    )
+    console.print(
+        f"[green]Migration complete:[/green] {state['migrated']} memories re-embedded, {profiles} profiles updated."
+        f" Active embedding backend is now {args.target_embed}; running services switch on their next turn."
+    )
+    if args.drop_source:
+        source.drop_store()
+        console.print(f"[green]The {backend.name} store was dropped.[/green]")
+    else:
+        console.print(
+            f"The {backend.name} store was kept. Once no process uses it, rerun this command with"
+            f" --embed_backend {args.embed_backend} --drop_source to delete it."
+        )
 
-    os.makedirs("data", exist_ok=True)
-    ds_path = f"data/digital_self_{args.user_id}.json"
-    ds = load_or_create_digital_self(args.user_id, ds_path)
+
+def run_reshard_ltm(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    from src.memory.long_term import LongTermMemory, ShardLayout, collection_name_for, read_layout
+    from src.migration import WriteFence, checkpoint_path, finished_reshards, reshard_ltm
+
+    if args.ltm_backend != "chroma" or not args.ltm_shards:
+        console.print("[red]reshard-ltm requires --ltm_backend chroma --ltm_shards none|user|hash:<N>[/red]")
+        return
+    persist_dir = os.path.join("data", "chroma")
+    collection = collection_name_for(backend.name)
+    current = read_layout(persist_dir, collection) or ShardLayout()
+    wanted = ShardLayout.parse(args.ltm_shards, args.ltm_shard_dirs)
+
+    def drop(old: ShardLayout, ckpt: str) -> None:
+        LongTermMemory(persist_dir, collection, old).drop_store()
+        os.remove(ckpt)
+        console.print(f"[green]Dropped the {old.spec} collections of {collection}.[/green]")
+
+    if wanted == current:
+        old = finished_reshards(collection, current) if args.drop_source else []
+        for ckpt, layout in old:
+            drop(layout, ckpt)
+        if not old:
+            console.print(f"[yellow]{collection} is already sharded as {current.spec}; nothing to do.[/yellow]")
+        return
+
+    source = LongTermMemory(persist_dir, collection, current)
+    target = LongTermMemory(persist_dir, collection, wanted)
+    ckpt = checkpoint_path(f"{collection}.{current.tag or 'none'}", f"{collection}.{wanted.tag or 'none'}")
+    console.print(f"[bold]Re-sharding[/bold] {collection}: {current.spec} -> {wanted.spec} | checkpoint={ckpt}")
+    state = reshard_ltm(
+        source,
+        target,
+        ckpt,
+        page_size=args.migrate_page_size,
+        on_page=lambda s: console.print(f"[dim]offset={s['offset']} copied={s['migrated']}[/dim]"),
+        fence=WriteFence("data"),
+    )
+    console.print(
+        f"[green]Re-sharding complete:[/green] {state['migrated']} memories copied and verified; {collection} now"
+        f" routes through {wanted.spec}, and running services switch on their next turn."
+    )
+    if args.drop_source:
+        drop(current, ckpt)
+    else:
+        console.print(
+            f"The {current.spec} collections were kept. Once no process uses them, rerun this command with"
+            " --drop_source to delete them."
+        )
+
+
+def run_replay(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    from src.digital_self import DS_SECTIONS, DigitalSelf, mark_changed
+    from src.replay import replay_transcripts
+
+    if not args.input or not args.output:
+        console.print("[red]replay requires --input <turns.jsonl> --output <results.jsonl>[/red]")
+        return
+    store = open_ds_store(args) if args.replay_save_profiles else None
+
+    def save_profile(rec: dict) -> None:
+        ds = DigitalSelf(**rec["digital_self"])
+        for section in DS_SECTIONS:
+            mark_changed(ds, section)
+        store.put(ds)
+
+    console.print(f"[bold]Replaying[/bold] {args.input} | workers={args.replay_workers or os.cpu_count()}")
+    stats = replay_transcripts(
+        args.input,
+        args.output,
+        workers=args.replay_workers,
+        embed_backend=args.embed_backend,
+        memory_mode=args.memory_mode,
+        ltm_backend=args.ltm_backend,
+        profiles_from=args.ds_db if args.replay_from_store else None,
+        on_profile=save_profile if store is not None else None,
+        on_bucket=lambda s: console.print(f"[dim]users={s['users']} turns={s['turns']}[/dim]"),
+    )
+    if store is not None:
+        store.close()
+    console.print(f"[green]Replay complete:[/green] {stats}")
+
+
+def run_serve(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    from src.server import SessionRegistry, TurnService, serve
+
+    ltm = open_ltm(args, backend) if args.memory_mode == "stm_ltm" else None
+    sweeper = ExpirySweeper(ltm, interval_seconds=args.sweep_interval) if ltm is not None else None
+    if sweeper is not None:
+        sweeper.start()
+    consolidator = start_consolidator(args, ltm) if ltm is not None else None
+    cutover = open_cutover(args, ltm, sweeper, consolidator) if ltm is not None else None
+
+    store = open_ds_store(args).start()
+    registry = SessionRegistry(
+        load_ds=store.get_or_create,
+        save_ds=store.put,
+        make_stm=lambda: short_term_for_mode(args.memory_mode),
+        max_users=args.max_users,
+        idle_seconds=args.idle_seconds,
+    )
+    service = TurnService(registry, ltm, save_ds=store.put, cutover=cutover)
+    serve(
+        service,
+        host=args.host,
+        port=args.port,
+        on_ready=lambda h, p: console.print(
+            f"[bold]Digital Self service[/bold] on http://{h}:{p} | memory_mode={args.memory_mode}"
+            f" | embeddings={backend.name} | ltm_backend={args.ltm_backend}"
+        ),
+    )
+    store.close()
+    if sweeper is not None:
+        sweeper.stop()
+    if consolidator is not None:
+        consolidator.stop()
+
+
+def run_bench(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    from src.bench import BENCH_MODES, run_benchmark, write_report
+
+    modes = [m.strip() for m in args.bench_modes.split(",") if m.strip()] or list(BENCH_MODES)
+    report = run_benchmark(
+        modes=modes,
+        users=args.bench_users,
+        turns_per_user=args.bench_turns,
+        seed=args.bench_seed,
+        ltm_backend=args.ltm_backend,
+        embed_latency_ms=args.bench_embed_latency_ms,
+        metrics=metrics_enabled(),  # off with --no_metrics or DS_METRICS=0
+    )
+    print(write_report(report, args.output))
+
+
+def run_chat(args: argparse.Namespace, backend: EmbeddingBackend) -> None:
+    store = open_ds_store(args).start()
+    ds = store.get_or_create(args.user_id)
 
     session = SessionMemory()
 
     # Memory modes
-    if args.memory_mode == "no_memory":
-        stm = ShortTermMemory(max_items=0, ttl_minutes=1)
-        ltm = None
-    elif args.memory_mode == "stm":
-        stm = ShortTermMemory(max_items=20, ttl_minutes=240)
-        ltm = None
-    else:
-        stm = ShortTermMemory(max_items=20, ttl_minutes=240)
-        ltm = LongTermMemory(persist_dir="data/chroma", collection_name="ltm")
+    stm = short_term_for_mode(args.memory_mode)
+    ltm = open_ltm(args, backend) if args.memory_mode == "stm_ltm" else None
 
-    console.print(f"[bold]Digital Self Engine[/bold] | user_id={args.user_id} | memory_mode={args.memory_mode}")
-    console.print("Commands: :forget last | :forget all | :forget <keyword> | :show stm | :show ltm | :exit\n")
+    sweeper = None
+    consolidator = None
+    cutover = None
+    if ltm is not None:
+        # First sweep builds the expiry index (and migrates legacy records) before any query runs.
+        sweeper = ExpirySweeper(ltm, interval_seconds=args.sweep_interval)
+        sweeper.start()
+        consolidator = start_consolidator(args, ltm)
+        cutover = open_cutover(args, ltm, sweeper, consolidator)
+
+    console.print(
+        f"[bold]Digital Self Engine[/bold] | user_id={args.user_id} | memory_mode={args.memory_mode}"
+        f" | embeddings={backend.name} | ltm_backend={args.ltm_backend}"
+    )
+    if ltm is not None and ds.profile.embedding_model != backend.name:
+        console.print(
+            f"[yellow]Stored memories for this user were embedded with {ds.profile.embedding_model}; "
+            f"retrieval against {backend.name} vectors will not be meaningful.[/yellow]"
+        )
+    console.print("Commands: :forget last | :forget all | :forget <keyword> | :show stm | :show ltm | :stats | :exit\n")
 
     while True:
         user_text = input("> ").strip()
@@ -58,12 +360,17 @@ def main() -> None:
         if user_text == ":exit":
             break
 
-        out = handle_turn(user_text, ds, session, stm, ltm)
+        with (cutover.turn() if cutover is not None else nullcontext(ltm)) as ltm:
+            out = handle_turn(user_text, ds, session, stm, ltm)
 
-        # Persist updated digital self if present
+        # Persist updated digital self if present (written behind by the store)
         if "digital_self" in out:
             ds = out["digital_self"]
-            safe_json_dump(ds_path, ds.model_dump())
+            store.put(ds)
+
+        if out.get("control_output"):
+            # plain text: memory contents must not be read as rich markup
+            console.print(out["control_output"], markup=False, highlight=False)
 
         # Print reply
         if "reply" in out:
@@ -77,8 +384,156 @@ def main() -> None:
             console.print(out.get("personalization", {}))
             console.print()
 
+    store.close()
+    session.close()
+    if sweeper is not None:
+        sweeper.stop()
+    if consolidator is not None:
+        consolidator.stop()
     console.print("[green]Session ended. Session memory cleared by design.[/green]")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="chat",
+        choices=["chat", "ingest", "migrate-expiry", "serve", "import-profiles", "bench", "consolidate", "quantize", "migrate-embeddings", "replay", "reshard-ltm"],
+    )
+    parser.add_argument("--user_id", type=str, default="default_user")
+    parser.add_argument("--memory_mode", type=str, default="stm_ltm", choices=["no_memory", "stm", "stm_ltm"])
+    parser.add_argument(
+        "--embed_backend",
+        type=str,
+        default=read_active_embedding("data") or os.getenv("EMBED_BACKEND", "openai"),
+        help="openai | openai:<model> | local | local:<dim> (offline hashing embedder);"
+        " defaults to the model set by the last migrate-embeddings",
+    )
+    parser.add_argument("--ltm_backend", type=str, default="chroma", choices=list(LTM_BACKENDS))
+    parser.add_argument(
+        "--ltm_shards",
+        type=str,
+        default=None,
+        help="chroma backend: none | user | hash:<N> collections (default: the store's current layout)",
+    )
+    parser.add_argument(
+        "--ltm_shard_dirs", action="store_true", help="chroma backend: give every shard its own persist directory"
+    )
+    parser.add_argument(
+        "--vector_dtype", type=str, default="float32", choices=["float32", "float16"], help="numpy backend storage"
+    )
+    parser.add_argument(
+        "--quantize", type=str, default=None, choices=["int8"], help="numpy backend: search on int8 codes"
+    )
+    parser.add_argument(
+        "--rerank", type=int, default=4, help="numpy backend: re-rank top_k * rerank quantized hits exactly"
+    )
+    parser.add_argument(
+        "--input", type=str, default=None, help="ingest: JSONL of {user_id, text, tags}; replay: {user_id, text}"
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=256, help="ingest, migrate-embeddings: records per embedding/write batch"
+    )
+    parser.add_argument("--target_embed", type=str, default=None, help="migrate-embeddings: new backend spec")
+    parser.add_argument("--migrate_workers", type=int, default=4, help="migrate-embeddings: concurrent batches")
+    parser.add_argument("--migrate_rate", type=float, default=0.0, help="migrate-embeddings: texts/s (0 = no cap)")
+    parser.add_argument(
+        "--migrate_page_size", type=int, default=1024, help="migrate-embeddings, reshard-ltm: records per page"
+    )
+    parser.add_argument(
+        "--drop_source",
+        action="store_true",
+        help="migrate-embeddings, reshard-ltm: delete the old store after the switch (kept by default)",
+    )
+    parser.add_argument("--sweep_interval", type=float, default=300.0, help="seconds between expired-LTM sweeps")
+    parser.add_argument(
+        "--consolidate_threshold", type=float, default=0.95, help="cosine similarity at which memories are merged"
+    )
+    parser.add_argument(
+        "--consolidate_interval", type=float, default=0.0, help="seconds between incremental merges (0 = off)"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="serve: bind address")
+    parser.add_argument("--port", type=int, default=8765, help="serve: port")
+    parser.add_argument("--max_users", type=int, default=1000, help="serve: per-user states kept in memory")
+    parser.add_argument("--idle_seconds", type=float, default=1800.0, help="serve: evict users idle this long")
+    parser.add_argument("--ds_db", type=str, default="data/digital_self.sqlite3", help="Digital Self database")
+    parser.add_argument(
+        "--ds_flush_interval", type=float, default=5.0, help="seconds between Digital Self write-behind flushes"
+    )
+    parser.add_argument("--bench_users", type=int, default=50, help="bench: simulated users (seeds + synthetic)")
+    parser.add_argument("--bench_turns", type=int, default=10, help="bench: turns per user")
+    parser.add_argument("--bench_modes", type=str, default="no_memory,stm,stm_ltm", help="bench: comma-separated")
+    parser.add_argument("--bench_seed", type=int, default=0, help="bench: synthetic conversation seed")
+    parser.add_argument(
+        "--bench_embed_latency_ms",
+        type=float,
+        default=0.0,
+        help="bench: simulated embedding API round-trip per batch (compare stm_ltm with stm_ltm_async)",
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="bench: also write the JSON report here; replay: results JSONL"
+    )
+    parser.add_argument("--replay_workers", type=int, default=0, help="replay: processes (0 = all cores)")
+    parser.add_argument(
+        "--replay_from_store", action="store_true", help="replay: start users from their saved Digital Self"
+    )
+    parser.add_argument(
+        "--replay_save_profiles", action="store_true", help="replay: write the rebuilt profiles to --ds_db"
+    )
+    parser.add_argument(
+        "--retrieval_mode",
+        type=str,
+        default="vector",
+        choices=list(RETRIEVAL_MODES),
+        help="LTM search: vector (all memories) or hybrid (BM25 candidates + vector rerank)",
+    )
+    parser.add_argument(
+        "--ltm_gate",
+        type=float,
+        default=None,
+        help="skip the LTM search when the query's cosine to every profile centroid is below this (off by default)",
+    )
+    parser.add_argument("--no_metrics", action="store_true", help="disable per-stage timing (same as DS_METRICS=0)")
+    parser.add_argument(
+        "--session_spill",
+        action="store_true",
+        help="also write each session's full (redacted) history to a private temp dir, deleted at exit",
+    )
+    args = parser.parse_args()
+
+    if args.no_metrics:
+        set_metrics_enabled(False)
+    set_retrieval_mode(args.retrieval_mode)
+    set_ltm_gate(args.ltm_gate)
+    set_session_spill(args.session_spill)
+
+    backend = set_embedding_backend(args.embed_backend)
+    os.makedirs("data", exist_ok=True)
+
+    if args.command == "ingest":
+        run_ingest(args, backend)
+    elif args.command == "migrate-expiry":
+        run_migrate_expiry(args, backend)
+    elif args.command == "serve":
+        run_serve(args, backend)
+    elif args.command == "import-profiles":
+        run_import_profiles(args, backend)
+    elif args.command == "bench":
+        run_bench(args, backend)
+    elif args.command == "consolidate":
+        run_consolidate(args, backend)
+    elif args.command == "quantize":
+        run_quantize(args, backend)
+    elif args.command == "migrate-embeddings":
+        run_migrate_embeddings(args, backend)
+    elif args.command == "replay":
+        run_replay(args, backend)
+    elif args.command == "reshard-ltm":
+        run_reshard_ltm(args, backend)
+    else:
+        run_chat(args, backend)
+
+
 if __name__ == "__main__":
     main()
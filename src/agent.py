@@ -1,24 +1,24 @@
 from __future__ import annotations
 
-from typing import Dict, Any, Optional
-
-from rich.console import Console
+import asyncio
+from typing import Dict, Any, Optional, Tuple
 
 from .digital_self import (
     DigitalSelf,
     update_dynamic,
     update_stable_from_text,
-    should_treat_as_sensitive,
+    scan_sensitive,
     redact_if_needed,
+    mark_changed,
 )
 from .memory.session import SessionMemory
 from .memory.short_term import ShortTermMemory
-from .memory.long_term import LongTermMemory
-from .retrieval import build_context_package
-from .personalization import derive_personalization, build_system_prompt
-from .utils import truncate
-
-console = Console()
+from .memory.long_term import LongTermMemoryBase, AsyncLongTermMemory
+from .retrieval import build_context_package, abuild_context_package
+from .context import context_builder_for
+from .metrics import collect_spans, metrics_summary, span
+from .rules import TurnSignals, scan_turn
+from .utils import truncate, embed_text, aembed_text, embedding_model_name
 
 
 def is_control_command(text: str) -> bool:
@@ -29,108 +29,92 @@ def handle_control_command(
     cmd: str,
     ds: DigitalSelf,
     stm: ShortTermMemory,
-    ltm: Optional[LongTermMemory],
-) -> bool:
+    ltm: Optional[LongTermMemoryBase],
+) -> str:
     """
-    Returns True if handled (and should skip normal generation).
+    Runs a control command (it skips normal generation) and returns its
+    output text, which the CLI prints and POST /turn returns.
     Commands:
       :forget last
       :forget all
       :forget <keyword>
       :show stm
       :show ltm
+      :stats
       :exit
     """
     parts = cmd.strip().split(maxsplit=2)
     if not parts:
-        return True
+        return ""
 
     if parts[0] == ":forget":
         if len(parts) < 2:
-            console.print("Usage: :forget last | :forget all | :forget <keyword>")
-            return True
+            return "Usage: :forget last | :forget all | :forget <keyword>"
 
         target = parts[1].lower()
 
         if target == "last":
-            recent = stm.get_recent()
-            if recent:
-                first_summary = recent[0].get("summary", "")
-                stm.delete(lambda x: x.get("summary") == first_summary and x.get("ts") == recent[0].get("ts"))
-                console.print("[green]Deleted last short-term item.[/green]")
-            else:
-                console.print("[yellow]No short-term items to delete.[/yellow]")
-            return True
+            if stm.delete_latest() is not None:
+                return "Deleted last short-term item."
+            return "No short-term items to delete."
 
         if target == "all":
             stm.clear()
             if ltm:
                 n = ltm.wipe_user(ds.user_id)
-                console.print(f"[green]Cleared STM and wiped {n} long-term memories.[/green]")
-            else:
-                console.print("[green]Cleared STM.[/green]")
-            return True
+                return f"Cleared STM and wiped {n} long-term memories."
+            return "Cleared STM."
 
         keyword = cmd.strip().split(maxsplit=1)[1].replace("forget", "", 1).strip()
-        stm_deleted = stm.delete(
-            lambda x: keyword.lower() in ((x.get("text", "") + " " + x.get("summary", "")).lower())
-        )
+        stm_deleted = stm.delete_by_keyword(keyword)
         ltm_deleted = 0
         if ltm:
             ltm_deleted = ltm.delete_by_keyword(ds.user_id, keyword)
-        console.print(f"[green]Deleted STM={stm_deleted}, LTM={ltm_deleted} items matching '{keyword}'.[/green]")
-        return True
+        return f"Deleted STM={stm_deleted}, LTM={ltm_deleted} items matching '{keyword}'."
 
     if parts[0] == ":show":
         if len(parts) < 2:
-            console.print("Usage: :show stm | :show ltm")
-            return True
+            return "Usage: :show stm | :show ltm"
 
         if parts[1].lower() == "stm":
             items = stm.get_recent()
-            console.print(f"[cyan]STM items ({len(items)}):[/cyan]")
+            lines = [f"STM items ({len(items)}):"]
             for i, it in enumerate(items[:10], start=1):
-                console.print(f"{i}. {truncate(it.get('summary',''), 140)}")
-            return True
+                lines.append(f"{i}. {truncate(it.get('summary',''), 140)}")
+            return "\n".join(lines)
 
         if parts[1].lower() == "ltm":
             if not ltm:
-                console.print("[yellow]LTM disabled in this memory_mode.[/yellow]")
-                return True
-            res = ltm.col.get(where={"user_id": ds.user_id}, include=["documents", "metadatas"])
-            ids = res.get("ids", [])
-            docs = res.get("documents", [])
-            metas = res.get("metadatas", [])
-            console.print(f"[cyan]LTM items ({len(ids)}):[/cyan]")
-            for i, (mid, doc, meta) in enumerate(zip(ids[:10], docs[:10], metas[:10]), start=1):
-                console.print(
-                    f"{i}. {mid} | {truncate(doc or '', 140)} | sensitive={meta.get('is_sensitive') if meta else None}"
-                )
-            return True
-
-        console.print("[yellow]Unknown show target.[/yellow]")
-        return True
+                return "LTM disabled in this memory_mode."
+            total, items = ltm.get_user_memories(ds.user_id, limit=10)
+            lines = [f"LTM items ({total}):"]
+            for i, m in enumerate(items, start=1):
+                lines.append(f"{i}. {m['id']} | {truncate(m['text'] or '', 140)} | sensitive={m['is_sensitive']}")
+            return "\n".join(lines)
+
+        return "Unknown show target."
+
+    if parts[0] == ":stats":
+        summary = metrics_summary()
+        if not summary:
+            return "No timings recorded (metrics disabled or no turns yet)."
+        lines = ["Stage timings (ms):"]
+        for stage, st in summary.items():
+            lines.append(
+                f"{stage:<28} n={st['count']:<6} mean={st['mean_ms']:<9} p50={st['p50_ms']:<9} "
+                f"p95={st['p95_ms']:<9} p99={st['p99_ms']:<9} max={st['max_ms']}"
+            )
+        return "\n".join(lines)
 
     if parts[0] == ":exit":
-        return True
+        return ""
 
-    console.print("[yellow]Unknown command.[/yellow]")
-    return True
+    return "Unknown command."
 
 
-def should_store_long_term(user_text: str, ds: DigitalSelf) -> bool:
-    t = user_text.lower()
-    triggers = [
-        "remember that",
-        "remember this",
-        "i prefer",
-        "i like",
-        "i hate",
-        "my goal is",
-        "i am working on",
-        "i'm working on",
-    ]
-    return any(x in t for x in triggers)
+def should_store_long_term(user_text: str, ds: DigitalSelf, signals: Optional[TurnSignals] = None) -> bool:
+    # triggers: rules.DEFAULT_STORE_TRIGGERS
+    return (signals or scan_turn(user_text)).store_ltm
 
 
 def generate_response(system_prompt: str, context_text: str, user_text: str) -> str:
@@ -149,45 +133,185 @@ def generate_response(system_prompt: str, context_text: str, user_text: str) ->
     )
 
 
+def _observe_turn(
+    user_text: str,
+    ds: DigitalSelf,
+    session: SessionMemory,
+    stm: ShortTermMemory,
+) -> Tuple[DigitalSelf, bool, TurnSignals]:
+    """Cheap in-process stages shared by handle_turn and ahandle_turn."""
+    with span("observe.sensitivity"):
+        spans = scan_sensitive(ds, user_text)
+    sensitive = bool(spans)
+
+    with span("observe.rules"):
+        signals = scan_turn(user_text)
+    ds = update_dynamic(ds, user_text, signals=signals)
+    ds = update_stable_from_text(ds, user_text, signals=signals)
+
+    safe_text = redact_if_needed(ds, user_text, spans)
+    session.add("user", user_text, redacted=safe_text)
+    stm.add(
+        text=safe_text,
+        summary=truncate(safe_text, 180),
+        tags=ds.dynamic.recent_topics[:1],
+    )
+    return ds, sensitive, signals
+
+
 def handle_turn(
     user_text: str,
     ds: DigitalSelf,
     session: SessionMemory,
     stm: ShortTermMemory,
-    ltm: Optional[LongTermMemory],
+    ltm: Optional[LongTermMemoryBase],
 ) -> Dict[str, Any]:
     if is_control_command(user_text):
-        handled = handle_control_command(user_text, ds, stm, ltm)
-        return {"handled_control": handled}
+        output = handle_control_command(user_text, ds, stm, ltm)
+        return {"handled_control": True, "control_output": output}
 
-    session.add("user", user_text)
+    with collect_spans() as timings:
+        with span("total"):
+            out = _run_turn(user_text, ds, session, stm, ltm)
+    return _with_timings(out, timings)
 
-    sensitive = should_treat_as_sensitive(ds, user_text)
 
-    ds = update_dynamic(ds, user_text)
-    ds = update_stable_from_text(ds, user_text)
+def _with_timings(out: Dict[str, Any], timings: Dict[str, float]) -> Dict[str, Any]:
+    # per-stage ms for this turn (empty when metrics are disabled); histograms via :stats
+    out["retrieval_log"]["timings_ms"] = timings
+    out["timings_ms"] = timings
+    return out
 
-    safe_text = redact_if_needed(ds, user_text)
-    stm.add(
-        text=safe_text,
-        summary=truncate(safe_text, 180),
-        tags=ds.dynamic.recent_topics[:1],
-    )
+
+def _run_turn(
+    user_text: str,
+    ds: DigitalSelf,
+    session: SessionMemory,
+    stm: ShortTermMemory,
+    ltm: Optional[LongTermMemoryBase],
+) -> Dict[str, Any]:
+    with span("observe"):
+        ds, sensitive, signals = _observe_turn(user_text, ds, session, stm)
+
+    # sensitive text is embedded for this turn's query only, never into the on-disk cache;
+    # without LTM nothing reads the embedding
+    emb = None
+    if ltm is not None:
+        with span("embed_query"):
+            emb = embed_text(user_text, persist=not sensitive)
 
     ltm_id = None
-    if ltm is not None and (not sensitive) and should_store_long_term(user_text, ds):
-        from .utils import embed_text
-        emb = embed_text(user_text).tolist()
-        ltm_id = ltm.add(
+    with span("ltm_write"):
+        if ltm is not None and (not sensitive) and should_store_long_term(user_text, ds, signals):
+            if ds.profile.embedding_model != embedding_model_name():
+                ds.profile.embedding_model = embedding_model_name()
+                mark_changed(ds, "profile.embedding_model")
+            ltm_id = ltm.add(
+                user_id=ds.user_id,
+                text=user_text,
+                embedding=emb,
+                tags=[ds.dynamic.recent_topics[0]] if ds.dynamic.recent_topics else [],
+                is_sensitive=False,
+                retention_days=ds.privacy.retention_days.long_term,
+            )
+
+    with span("retrieval"):
+        pack = build_context_package(
+            user_query=user_text,
+            ds=ds,
+            session=session,
+            stm=stm,
+            ltm=ltm,
+            top_k=5,
+            exclude_ltm_ids=[ltm_id] if ltm_id else None,  # avoid self-retrieval
+            query_embedding=emb,
+        )
+
+    return _respond(user_text, ds, session, pack, ltm_id, sensitive)
+
+
+def _respond(
+    user_text: str,
+    ds: DigitalSelf,
+    session: SessionMemory,
+    pack: Dict[str, Any],
+    ltm_id: Optional[str],
+    sensitive: bool,
+) -> Dict[str, Any]:
+    with span("prompt"):
+        personalization, system_prompt = context_builder_for(ds).persona(ds, user_text, pack["stm_items"])
+
+    with span("respond"):
+        reply = generate_response(system_prompt, pack["context_text"], user_text)
+        session.add("assistant", reply, redacted=redact_if_needed(ds, reply) if session.spill else None)
+
+    return {
+        "digital_self": ds,
+        "reply": reply,
+        "stored_long_term_id": ltm_id,
+        "sensitive": sensitive,
+        "retrieval_log": pack["retrieval_log"],
+        "personalization": personalization,
+    }
+
+
+async def ahandle_turn(
+    user_text: str,
+    ds: DigitalSelf,
+    session: SessionMemory,
+    stm: ShortTermMemory,
+    ltm: Optional[AsyncLongTermMemory],
+) -> Dict[str, Any]:
+    """
+    Async handle_turn with the same output. The user_text embedding is computed
+    once and shared; the LTM write and the LTM query then run concurrently.
+    Self-retrieval is still excluded: the new memory's id is chosen before the
+    write, so the query can filter it whichever finishes first.
+    """
+    if is_control_command(user_text):
+        sync_ltm = ltm.sync if ltm is not None else None
+        output = await asyncio.to_thread(handle_control_command, user_text, ds, stm, sync_ltm)
+        return {"handled_control": True, "control_output": output}
+
+    with collect_spans() as timings:
+        with span("total"):
+            out = await _arun_turn(user_text, ds, session, stm, ltm)
+    return _with_timings(out, timings)
+
+
+async def _arun_turn(
+    user_text: str,
+    ds: DigitalSelf,
+    session: SessionMemory,
+    stm: ShortTermMemory,
+    ltm: Optional[AsyncLongTermMemory],
+) -> Dict[str, Any]:
+    with span("observe"):
+        ds, sensitive, signals = _observe_turn(user_text, ds, session, stm)
+
+    q_emb = None
+    if ltm is not None:
+        with span("embed_query"):
+            q_emb = await aembed_text(user_text, persist=not sensitive)
+
+    ltm_id = None
+    write = None
+    if ltm is not None and (not sensitive) and should_store_long_term(user_text, ds, signals):
+        if ds.profile.embedding_model != embedding_model_name():
+            ds.profile.embedding_model = embedding_model_name()
+            mark_changed(ds, "profile.embedding_model")
+        ltm_id = LongTermMemoryBase.new_id(ds.user_id, user_text)
+        write = ltm.add(
+            memory_id=ltm_id,
             user_id=ds.user_id,
             text=user_text,
-            embedding=emb,
+            embedding=q_emb,
             tags=[ds.dynamic.recent_topics[0]] if ds.dynamic.recent_topics else [],
             is_sensitive=False,
             retention_days=ds.privacy.retention_days.long_term,
         )
 
-    pack = build_context_package(
+    retrieve = abuild_context_package(
         user_query=user_text,
         ds=ds,
         session=session,
@@ -195,21 +319,12 @@ def handle_turn(
         ltm=ltm,
         top_k=5,
         exclude_ltm_ids=[ltm_id] if ltm_id else None,  # avoid self-retrieval
+        query_embedding=q_emb,
     )
+    with span("ltm_write_and_retrieval"):
+        if write is not None:
+            pack, _ = await asyncio.gather(retrieve, write)
+        else:
+            pack = await retrieve
 
-    personalization = derive_personalization(ds, user_text, pack["stm_items"])
-    system_prompt = build_system_prompt(personalization)
-
-    reply = generate_response(system_prompt, pack["context_text"], user_text)
-
-    session.add("assistant", reply)
-
-    return {
-        "digital_self": ds,
-        "reply": reply,
-        "stored_long_term_id": ltm_id,
-        "sensitive": sensitive,
-        "retrieval_log": pack["retrieval_log"],
-        "personalization": personalization,
-    }
-
+    return _respond(user_text, ds, session, pack, ltm_id, sensitive)
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .utils import EmbeddingBackend, safe_json_load
+
+BENCH_MODES = ("no_memory", "stm", "stm_ltm", "stm_ltm_async")
+# <mode>_async replays through agent.ahandle_turn, one concurrent turn per user per round
+ASYNC_SUFFIX = "_async"
+
+# Used when data/simulated_users.json is empty or missing; mirrors the notebook prompt sequences.
+SEED_CONVERSATIONS: List[Dict[str, Any]] = [
+    {
+        "user_id": "seed_concise",
+        "turns": [
+            "remember that I prefer concise answers and no fluff",
+            "explain your memory system",
+            "what tone should you use when answering me?",
+        ],
+    },
+    {
+        "user_id": "seed_devops",
+        "turns": [
+            "I am working on a kubernetes migration for our python services",
+            "walk me through a safe docker image build step by step",
+            "I hate long yaml files. remember that",
+            "what should I automate first in ci/cd?",
+        ],
+    },
+    {
+        "user_id": "seed_privacy",
+        "turns": [
+            "my password is hunter2",
+            "what data do you keep about me and what is your data retention?",
+            "I like privacy-preserving designs. tell me more",
+        ],
+    },
+]
+
+_SYNTH_TOPICS = [
+    "python", "docker", "terraform", "rust", "gardening", "photography", "chess", "cycling",
+    "sourdough", "jazz", "postgres", "kubernetes", "hiking", "machine learning", "typography",
+]
+_SYNTH_TEMPLATES = [
+    "remember that I prefer {a} over {b}",
+    "I like {a}. it keeps me focused",
+    "I don't like {b} much",
+    "my goal is to get better at {a}",
+    "explain how {a} relates to {b}",
+    "what do you remember about my interest in {a}?",
+    "walk me through {a} step by step",
+    "be concise: what is the fastest way to learn {b}?",
+    "I'm working on a {a} project this week",
+    "any tips for {b}? my email is someone@example.com",
+]
+
+
+def _turn_text(turn: Any) -> str:
+    if isinstance(turn, dict):
+        return str(turn.get("text") or turn.get("content") or "")
+    return str(turn or "")
+
+
+def load_conversations(path: str = "data/simulated_users.json") -> List[Dict[str, Any]]:
+    """
+    Accepts [{"user_id": ..., "turns": [...]}, ...] or {"user_id": [turns]}; a turn is a
+    string or {"text"|"content": ...}. Control commands are dropped. Falls back to
+    SEED_CONVERSATIONS when the file is missing, empty or has no usable turns.
+    """
+    try:
+        data = safe_json_load(path, default=None)
+    except (json.JSONDecodeError, OSError):
+        data = None
+    if isinstance(data, dict):
+        data = [{"user_id": uid, "turns": turns} for uid, turns in data.items()]
+    convs = []
+    for i, c in enumerate(data or []):
+        if not isinstance(c, dict):
+            continue
+        raw = c.get("turns") or c.get("messages") or c.get("conversation") or []
+        turns = [t for t in (_turn_text(x).strip() for x in raw) if t and not t.startswith(":")]
+        if turns:
+            convs.append({"user_id": str(c.get("user_id") or f"sim_{i}"), "turns": turns})
+    return convs or [dict(c) for c in SEED_CONVERSATIONS]
+
+
+def scale_conversations(
+    seeds: Sequence[Dict[str, Any]], users: int, turns_per_user: int, seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    The seed conversations plus synthetic users, every one exactly
+    turns_per_user turns long: each synthetic user replays a seed conversation,
+    and any conversation shorter than turns_per_user (seeds included) continues
+    with templated turns over random topics. Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+
+    def fill(turns: List[str]) -> List[str]:
+        turns = list(turns)[:turns_per_user]
+        while len(turns) < turns_per_user:
+            a, b = rng.sample(_SYNTH_TOPICS, 2)
+            turns.append(rng.choice(_SYNTH_TEMPLATES).format(a=a, b=b))
+        return turns
+
+    out = [{**c, "turns": fill(c["turns"])} for c in seeds][:users]
+    while len(out) < users:
+        base = seeds[len(out) % len(seeds)]
+        out.append({"user_id": f"synth_{len(out):05d}", "turns": fill(base["turns"])})
+    return out
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+class RemoteLikeBackend(EmbeddingBackend):
+    """
+    Wraps an embedding backend and adds a fixed delay per batch, standing in
+    for the round-trip of a hosted embedding API (blocking in embed_batch,
+    awaited in aembed_batch).
+    """
+
+    def __init__(self, inner: EmbeddingBackend, latency_ms: float) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.latency_s = latency_ms / 1000.0
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        time.sleep(self.latency_s)
+        return self.inner.embed_batch(texts)
+
+    async def aembed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        await asyncio.sleep(self.latency_s)
+        return self.inner.embed_batch(texts)
+
+
+def _replay(states: List[tuple], ltm: Any) -> Iterator[Tuple[Dict[str, Any], float]]:
+    from .agent import handle_turn
+
+    for i in range(max((len(s[3]) for s in states), default=0)):
+        for ds, session, stm, user_turns in states:
+            if i < len(user_turns):
+                t0 = time.perf_counter()
+                out = handle_turn(user_turns[i], ds, session, stm, ltm)
+                yield out, (time.perf_counter() - t0) * 1000
+
+
+async def _areplay(states: List[tuple], ltm: Any) -> List[Tuple[Dict[str, Any], float]]:
+    """Same order of rounds as _replay; the turns of one round run concurrently."""
+    from .agent import ahandle_turn
+    from .memory.long_term import AsyncLongTermMemory
+
+    altm = AsyncLongTermMemory(ltm) if ltm is not None else None
+
+    async def timed_turn(*args: Any) -> Tuple[Dict[str, Any], float]:
+        t0 = time.perf_counter()
+        out = await ahandle_turn(*args)
+        return out, (time.perf_counter() - t0) * 1000
+
+    outs: List[Tuple[Dict[str, Any], float]] = []
+    for i in range(max((len(s[3]) for s in states), default=0)):
+        outs.extend(
+            await asyncio.gather(
+                *(
+                    timed_turn(user_turns[i], ds, session, stm, altm)
+                    for ds, session, stm, user_turns in states
+                    if i < len(user_turns)
+                )
+            )
+        )
+    return outs
+
+
+def run_mode(
+    mode: str,
+    conversations: List[Dict[str, Any]],
+    ltm_backend: str = "numpy",
+    embed_backend: str = "local",
+    embed_latency_ms: float = 0.0,
+    metrics: bool = True,
+) -> Dict[str, Any]:
+    """
+    Replays conversations round-robin (all sessions stay live) through
+    handle_turn in one mode, or through ahandle_turn for <mode>_async.
+    embed_latency_ms > 0 adds a simulated API round-trip to every embedding batch.
+    With metrics=False the turns run without spans and only the "total"
+    latency (timed around each turn) is reported.
+    """
+    from .digital_self import DigitalSelf
+    from .memory.long_term import open_long_term_memory
+    from .memory.session import SessionMemory
+    from .memory.short_term import short_term_for_mode
+    from .metrics import set_metrics_enabled
+    from .utils import configure_embedding_cache, make_embedding_backend, set_embedding_backend
+
+    is_async = mode.endswith(ASYNC_SUFFIX)
+    memory_mode = mode[: -len(ASYNC_SUFFIX)] if is_async else mode
+    set_metrics_enabled(metrics)  # per-stage timings come from the turn's spans
+    backend = make_embedding_backend(embed_backend)
+    if embed_latency_ms > 0:
+        backend = RemoteLikeBackend(backend, embed_latency_ms)
+    set_embedding_backend(backend)
+    configure_embedding_cache(path=None)  # memory-only: no state carried between runs
+    data_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    try:
+        ltm = None
+        if memory_mode == "stm_ltm":
+            ltm = open_long_term_memory(ltm_backend, embedding_model=backend.name, data_dir=data_dir)
+        states = [
+            (DigitalSelf(user_id=c["user_id"]), SessionMemory(), short_term_for_mode(memory_mode), c["turns"])
+            for c in conversations
+        ]
+        stages: Dict[str, List[float]] = {}
+        turns = 0
+        stored = 0
+        t0 = time.perf_counter()
+        outs = asyncio.run(_areplay(states, ltm)) if is_async else _replay(states, ltm)
+        for out, turn_ms in outs:
+            turns += 1
+            stored += bool(out.get("stored_long_term_id"))
+            for stage, ms in (out.get("timings_ms") or {"total": turn_ms}).items():
+                stages.setdefault(stage, []).append(ms)
+        wall = time.perf_counter() - t0
+        return {
+            "turns": turns,
+            "users": len(states),
+            "ltm_stored": stored,
+            "wall_s": round(wall, 3),
+            "throughput_turns_per_s": round(turns / wall, 1) if wall else 0.0,
+            "latency_ms": {stage: _percentiles(v) for stage, v in stages.items()},
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def run_benchmark(
+    modes: Sequence[str] = BENCH_MODES,
+    users: int = 50,
+    turns_per_user: int = 10,
+    seed: int = 0,
+    ltm_backend: str = "numpy",
+    simulated_users_path: str = "data/simulated_users.json",
+    isolate: bool = True,
+    embed_latency_ms: float = 0.0,
+    metrics: bool = True,
+) -> Dict[str, Any]:
+    """
+    Runs every mode on the same conversations. With isolate=True each mode runs
+    in a fresh process, so peak RSS is per mode rather than cumulative.
+    """
+    convs = scale_conversations(load_conversations(simulated_users_path), users, turns_per_user, seed)
+    results: Dict[str, Any] = {}
+    for mode in modes:
+        mode_args = (mode, convs, ltm_backend, "local", embed_latency_ms, metrics)
+        if isolate:
+            with mp.get_context("spawn").Pool(1) as pool:
+                results[mode] = pool.apply(run_mode, mode_args)
+        else:
+            results[mode] = run_mode(*mode_args)
+    return {
+        "meta": {
+            "users": len(convs),
+            "turns_per_user": turns_per_user,
+            "seed": seed,
+            "embed_backend": "local",
+            "embed_latency_ms": embed_latency_ms,
+            "metrics": metrics,
+            "ltm_backend": ltm_backend,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "modes": results,
+    }
+
+
+def write_report(report: Dict[str, Any], path: Optional[str]) -> str:
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return text
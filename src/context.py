@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .digital_self import DigitalSelf, section_version
+from .memory.short_term import ShortTermMemory, STMItem
+from .personalization import derive_personalization, build_system_prompt
+from .utils import truncate
+
+
+# Shared budget for the three context blocks (the old 800/800/1200 char caps ~= 700 tokens).
+CONTEXT_TOKEN_BUDGET = 700
+CHARS_PER_TOKEN = 4
+CONTEXT_BLOCKS = ("ds", "stm", "ltm")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token); good enough for budgeting."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def allocate_budget(needs: Dict[str, int], budget: int) -> Dict[str, int]:
+    """
+    Water-filling: every block gets an equal share of what is left, and a block
+    that needs less than its share passes the surplus on to the others.
+    """
+    alloc: Dict[str, int] = {}
+    remaining = budget
+    pending = sorted(needs.items(), key=lambda kv: kv[1])
+    while pending:
+        share = remaining // len(pending)
+        name, need = pending[0]
+        if need > share:
+            # nobody left fits in their share: split evenly, smallest first gets the remainder
+            for i, (name, _) in enumerate(pending):
+                alloc[name] = share + (1 if i < remaining - share * len(pending) else 0)
+            break
+        alloc[name] = need
+        remaining -= need
+        pending.pop(0)
+    return {name: alloc[name] for name in needs}
+
+
+def _format_stable(ds: DigitalSelf) -> str:
+    return f"STABLE: {ds.stable.model_dump()}\n"
+
+
+def _dynamic_key(ds: DigitalSelf) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    # everything the block shows; last_updated is rewritten every turn and left out
+    return tuple(ds.dynamic.recent_topics), tuple(ds.dynamic.current_goals)
+
+
+def _format_dynamic(ds: DigitalSelf) -> str:
+    return f"DYNAMIC: {ds.dynamic.model_dump(exclude={'last_updated'})}\n"
+
+
+def _format_short_term(items: Sequence[STMItem]) -> str:
+    lines = []
+    for it in items[:8]:
+        summ = it.get("summary") or ""
+        tags = it.get("tags") or []
+        lines.append(f"- {summ} (tags={tags})")
+    return "\n".join(lines)
+
+
+def _long_term_key(memories: List[dict]) -> Tuple:
+    # a memory's text never changes under its id; its metadata can (consolidation rewrites tags)
+    return tuple((m.get("id"), m.get("distance"), m.get("ts"), repr(m.get("tags"))) for m in memories)
+
+
+def _format_long_term(memories: List[dict]) -> str:
+    lines = []
+    for m in memories:
+        preview = truncate(m["text"], 220)
+        lines.append(f"- {preview} (dist={m.get('distance')}, ts={m.get('ts')}, tags={m.get('tags')})")
+    return "\n".join(lines)
+
+
+class ContextBuilder:
+    """
+    Builds the context text and system prompt for one DigitalSelf, reusing
+    every piece whose inputs did not change:
+      - DS block: the stable section version (digital_self.mark_changed) and
+        the dynamic topics and goals (not last_updated, which changes every turn)
+      - STM block: the ShortTermMemory's version counter
+      - LTM block: the ids, distances, timestamps and tags of the hits
+      - personalization + system prompt: the stable section version
+      - final context text: all of the above plus the budget
+    The blocks share one token budget (allocate_budget) instead of fixed char caps.
+    Use context_builder_for(ds) to get the builder cached on a DigitalSelf.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET) -> None:
+        self.token_budget = token_budget
+        self._blocks: Dict[str, Tuple[Any, str]] = {}
+        self._assembled: Optional[Tuple[Any, str, Dict[str, Any]]] = None
+        self._persona: Optional[Tuple[int, Dict[str, Any], str]] = None
+        self.rebuilt: Dict[str, int] = {}
+
+    def _cached(self, name: str, key: Any, build) -> str:
+        entry = self._blocks.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        text = build()
+        self._blocks[name] = (key, text)
+        self.rebuilt[name] = self.rebuilt.get(name, 0) + 1
+        return text
+
+    def _ds_block(self, ds: DigitalSelf) -> str:
+        stable = self._cached("stable", section_version(ds, "stable"), lambda: _format_stable(ds))
+        dynamic = self._cached("dynamic", _dynamic_key(ds), lambda: _format_dynamic(ds))
+        return stable + dynamic
+
+    def context(
+        self, ds: DigitalSelf, stm: ShortTermMemory, recent_stm: Sequence[STMItem], ltm_hits: List[dict]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """(context_text, budget log)"""
+        ds_block = self._ds_block(ds)
+        stm_block = self._cached("stm", (id(stm), stm.version), lambda: _format_short_term(recent_stm))
+        ltm_block = self._cached("ltm", _long_term_key(ltm_hits), lambda: _format_long_term(ltm_hits))
+
+        key = (ds_block, stm_block, ltm_block, self.token_budget)
+        if self._assembled is not None and self._assembled[0] == key:
+            return self._assembled[1], self._assembled[2]
+
+        blocks = {"ds": ds_block, "stm": stm_block, "ltm": ltm_block}
+        needs = {name: estimate_tokens(text) for name, text in blocks.items()}
+        alloc = allocate_budget(needs, self.token_budget)
+        cut = {name: truncate(text, alloc[name] * CHARS_PER_TOKEN) for name, text in blocks.items()}
+
+        context_text = (
+            "=== DIGITAL SELF ===\n"
+            f"{cut['ds']}\n\n"
+            "=== SHORT-TERM MEMORY ===\n"
+            f"{cut['stm']}\n\n"
+            "=== LONG-TERM MEMORY ===\n"
+            f"{cut['ltm']}\n"
+        )
+        budget_log = {"token_budget": self.token_budget, "needed": needs, "allocated": alloc}
+        self._assembled = (key, context_text, budget_log)
+        return context_text, budget_log
+
+    def persona(self, ds: DigitalSelf, user_query: str, stm_items: Sequence[STMItem]) -> Tuple[Dict[str, Any], str]:
+        """(personalization, system_prompt); both only depend on the stable section."""
+        version = section_version(ds, "stable")
+        if self._persona is None or self._persona[0] != version:
+            personalization = derive_personalization(ds, user_query, stm_items)
+            self._persona = (version, personalization, build_system_prompt(personalization))
+            self.rebuilt["persona"] = self.rebuilt.get("persona", 0) + 1
+        return self._persona[1], self._persona[2]
+
+
+def context_builder_for(ds: DigitalSelf) -> ContextBuilder:
+    if ds._context is None:
+        ds._context = ContextBuilder()
+    return ds._context
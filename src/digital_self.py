@@ -1,9 +1,19 @@
 from __future__ import annotations
 
-from typing import Optional
-from pydantic import BaseModel, Field
-
-from .utils import now_iso, contains_sensitive, redact_sensitive
+import threading
+from typing import Any, Dict, Optional, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .rules import TurnSignals, scan_turn
+from .utils import (
+    now_iso,
+    redact_sensitive,
+    safe_json_load,
+    safe_json_dump,
+    embedding_model_name,
+    sensitivity_scanner,
+    SensitiveSpan,
+)
 
 
 class RetentionDays(BaseModel):
@@ -32,8 +42,10 @@ class DynamicSignals(BaseModel):
 
 
 class Profile(BaseModel):
+    # unit mean of the user's stored LTM embeddings (memory/profile_vectors.py), kept in sync by retrieval
     embedding: Optional[list[float]] = None
-    embedding_model: str = "text-embedding-3-small"  # matches OpenAI embeddings
+    embedding_count: int = 0
+    embedding_model: str = "text-embedding-3-small"  # name of the backend that produced this user's LTM vectors
 
 
 class DigitalSelf(BaseModel):
@@ -43,13 +55,88 @@ class DigitalSelf(BaseModel):
     profile: Profile = Field(default_factory=Profile)
     privacy: PrivacyConfig = Field(default_factory=PrivacyConfig)
 
+    # Dotted names of fields changed since the last save (e.g. "stable.tone").
+    # Not serialized; see mark_changed / DigitalSelfStore.
+    _dirty: set[str] = PrivateAttr(default_factory=set)
+    # Per-section change counters, never reset; caches derived from a section key on them.
+    _versions: dict[str, int] = PrivateAttr(default_factory=dict)
+    # Cached prompt blocks for this object (context.ContextBuilder).
+    _context: Any = PrivateAttr(default=None)
+    # Guards _dirty: turns mark fields from their thread while the store's flusher takes them from its own.
+    _dirty_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+
+DS_SECTIONS = ("stable", "dynamic", "profile", "privacy")
+
+
+def mark_changed(ds: DigitalSelf, field: str) -> None:
+    section = field.split(".", 1)[0]
+    with ds._dirty_lock:
+        ds._dirty.add(field)
+        ds._versions[section] = ds._versions.get(section, 0) + 1
+
+
+def section_version(ds: DigitalSelf, section: str) -> int:
+    return ds._versions.get(section, 0)
+
+
+def dirty_fields(ds: DigitalSelf) -> set[str]:
+    with ds._dirty_lock:
+        return set(ds._dirty)
+
+
+def take_dirty_sections(ds: DigitalSelf) -> set[str]:
+    """Returns the top-level sections with changes and clears the dirty set."""
+    with ds._dirty_lock:
+        sections = {f.split(".", 1)[0] for f in ds._dirty}
+        ds._dirty.clear()
+    return sections
+
+
+def snapshot_dirty_sections(ds: DigitalSelf) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    ({section: dumped value} for the sections with changes, full dump), taken
+    and cleared in one step under the object's lock, so a field marked by a
+    concurrent turn is either in this snapshot or still dirty afterwards.
+    The full dump is {} when nothing changed.
+    """
+    with ds._dirty_lock:
+        sections = {f.split(".", 1)[0] for f in ds._dirty}
+        ds._dirty.clear()
+        if not sections:
+            return {}, {}
+        dump = ds.model_dump()
+    return {k: dump[k] for k in DS_SECTIONS if k in sections}, dump
+
+
+def digital_self_path(user_id: str, data_dir: str = "data") -> str:
+    return f"{data_dir}/digital_self_{user_id}.json"
+
+
+def load_or_create_digital_self(user_id: str, path: str) -> DigitalSelf:
+    data = safe_json_load(path, default=None)
+    if data is None:
+        ds = DigitalSelf(user_id=user_id)
+        ds.profile.embedding_model = embedding_model_name()
+        safe_json_dump(path, ds.model_dump())
+        return ds
+    return DigitalSelf(**data)
+
+
+def scan_sensitive(ds: DigitalSelf, text: str) -> list[SensitiveSpan]:
+    """Typed sensitive spans in text under this user's privacy settings (one pass)."""
+    return sensitivity_scanner(ds.privacy.sensitive_keywords).scan(text)
+
 
 def should_treat_as_sensitive(ds: DigitalSelf, text: str) -> bool:
-    return contains_sensitive(text, ds.privacy.sensitive_keywords)
+    return sensitivity_scanner(ds.privacy.sensitive_keywords).search(text)
 
 
-def redact_if_needed(ds: DigitalSelf, text: str) -> str:
-    return redact_sensitive(text) if should_treat_as_sensitive(ds, text) else text
+def redact_if_needed(ds: DigitalSelf, text: str, spans: Optional[list[SensitiveSpan]] = None) -> str:
+    """Pass spans from scan_sensitive to avoid scanning the text again."""
+    if spans is None:
+        spans = scan_sensitive(ds, text)
+    return redact_sensitive(text, spans) if spans else text
 
 
 def _push_topic(ds: DigitalSelf, label: str) -> None:
@@ -64,84 +151,56 @@ def _push_topic(ds: DigitalSelf, label: str) -> None:
         return
 
     # remove existing occurrence to avoid duplicates
-    ds.dynamic.recent_topics = [t for t in ds.dynamic.recent_topics if t != label]
-    ds.dynamic.recent_topics = ([label] + ds.dynamic.recent_topics)[:10]
+    topics = ([label] + [t for t in ds.dynamic.recent_topics if t != label])[:10]
+    if topics != ds.dynamic.recent_topics:
+        ds.dynamic.recent_topics = topics
+        mark_changed(ds, "dynamic.recent_topics")
 
 
-def update_dynamic(ds: DigitalSelf, user_text: str, topic: Optional[str] = None) -> DigitalSelf:
+def update_dynamic(
+    ds: DigitalSelf, user_text: str, topic: Optional[str] = None, signals: Optional[TurnSignals] = None
+) -> DigitalSelf:
     ds.dynamic.last_updated = now_iso()
+    mark_changed(ds, "dynamic.last_updated")
 
     if topic:
         _push_topic(ds, topic)
         return ds
 
-    t = user_text.lower()
-
-    # Minimal, explainable topic labels (extend later if you want)
-    if any(k in t for k in ["memory", "remember", "recall", "store this"]):
-        label = "memory"
-    elif any(k in t for k in ["privacy", "password", "sensitive", "data retention", "delete this"]):
-        label = "privacy"
-    elif any(k in t for k in ["devops", "kubernetes", "terraform", "docker", "ci/cd"]):
-        label = "devops"
-    elif "python" in t:
-        label = "python"
-    else:
-        label = "general"
-
-    _push_topic(ds, label)
+    # Minimal, explainable topic labels (see rules.DEFAULT_TOPIC_RULES; extend with add_topic_rule)
+    signals = signals or scan_turn(user_text)
+    _push_topic(ds, signals.topic)
     return ds
 
 
-def update_stable_from_text(ds: DigitalSelf, user_text: str) -> DigitalSelf:
+def update_stable_from_text(ds: DigitalSelf, user_text: str, signals: Optional[TurnSignals] = None) -> DigitalSelf:
     """
     Minimal heuristic extraction:
     - tone preference
     - explicit interests/dislikes
     Keep it simple and explainable.
+    Pass signals from rules.scan_turn to reuse a scan already done for this turn.
     """
-    t = user_text.lower()
-
-    # Tone signals (expanded + more robust)
-    concise_signals = [
-        "be concise",
-        "keep it short",
-        "concise answers",
-        "prefer concise",
-        "i prefer concise",
-        "i prefer concise answers",
-        "no fluff",
-        "avoid fluff",
-    ]
-    detailed_signals = [
-        "be detailed",
-        "step by step",
-        "walk me through",
-        "in detail",
-    ]
-
-    if any(s in t for s in concise_signals):
-        ds.stable.tone = "concise"
-    elif any(s in t for s in detailed_signals):
-        ds.stable.tone = "detailed"
+    signals = signals or scan_turn(user_text)
+
+    if signals.tone and signals.tone != ds.stable.tone:
+        ds.stable.tone = signals.tone
+        mark_changed(ds, "stable.tone")
 
     # Interests (store original snippet, compare lowercase)
-    if "i like " in t:
-        raw = user_text.split("i like ", 1)[1]
-        interest = raw.split(".")[0].strip()
-        if interest:
-            existing = [x.lower() for x in ds.stable.interests]
-            if interest.lower() not in existing:
-                ds.stable.interests.append(interest)
+    interest = signals.interest
+    if interest:
+        existing = [x.lower() for x in ds.stable.interests]
+        if interest.lower() not in existing:
+            ds.stable.interests.append(interest)
+            mark_changed(ds, "stable.interests")
 
     # Dislikes
-    if "i hate " in t or "i don't like " in t:
-        key = "i hate " if "i hate " in t else "i don't like "
-        raw = user_text.lower().split(key, 1)[1]
-        dislike = raw.split(".")[0].strip()
-        if dislike:
-            existing = [x.lower() for x in ds.stable.dislikes]
-            if dislike.lower() not in existing:
-                ds.stable.dislikes.append(dislike)
+    dislike = signals.dislike
+    if dislike:
+        existing = [x.lower() for x in ds.stable.dislikes]
+        if dislike.lower() not in existing:
+            ds.stable.dislikes.append(dislike)
+            mark_changed(ds, "stable.dislikes")
 
     return ds
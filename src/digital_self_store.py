@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .digital_self import (
+    DS_SECTIONS,
+    DigitalSelf,
+    digital_self_path,
+    mark_changed,
+    snapshot_dirty_sections,
+)
+from .metrics import timed
+from .utils import embedding_model_name, safe_json_load
+
+log = logging.getLogger(__name__)
+
+
+class DigitalSelfStore:
+    """
+    All Digital Selves in one SQLite database, one row per user and one JSON
+    column per section (stable, dynamic, profile, privacy).
+
+    Write-behind: put() only registers a profile as pending. flush() writes
+    every pending profile in one transaction, and only the sections whose
+    fields changed since the last flush (see digital_self.mark_changed).
+    Flushing happens every flush_interval seconds on a background thread once
+    start() is called, and always on close().
+
+    Profiles that are not in the database yet are imported on first access
+    from the legacy data/digital_self_<user>.json file if one exists.
+    """
+
+    def __init__(
+        self,
+        path: str = "data/digital_self.sqlite3",
+        legacy_dir: Optional[str] = "data",
+        flush_interval: float = 5.0,
+    ) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS digital_selves ("
+            "user_id TEXT PRIMARY KEY, stable TEXT NOT NULL, dynamic TEXT NOT NULL, "
+            "profile TEXT NOT NULL, privacy TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.RLock()
+        self._pending: Dict[str, DigitalSelf] = {}
+        self._known: set[str] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    # --- reads ---
+    def _load_row(self, user_id: str) -> Optional[DigitalSelf]:
+        row = self._db.execute(
+            "SELECT stable, dynamic, profile, privacy FROM digital_selves WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._known.add(user_id)
+        return DigitalSelf(user_id=user_id, **{k: json.loads(v) for k, v in zip(DS_SECTIONS, row)})
+
+    def get(self, user_id: str) -> Optional[DigitalSelf]:
+        with self._lock:
+            ds = self._pending.get(user_id)
+            if ds is not None:
+                return ds
+            ds = self._load_row(user_id)
+            if ds is None and self.legacy_dir:
+                data = safe_json_load(digital_self_path(user_id, self.legacy_dir), default=None)
+                if data is not None:
+                    ds = DigitalSelf(**data)
+                    self._mark_all(ds)
+                    self._pending[user_id] = ds
+            return ds
+
+    def get_or_create(self, user_id: str) -> DigitalSelf:
+        with self._lock:
+            ds = self.get(user_id)
+            if ds is None:
+                ds = DigitalSelf(user_id=user_id)
+                ds.profile.embedding_model = embedding_model_name()
+                self._mark_all(ds)
+                self._pending[user_id] = ds
+            return ds
+
+    # --- writes ---
+    @staticmethod
+    def _mark_all(ds: DigitalSelf) -> None:
+        for section in DS_SECTIONS:
+            mark_changed(ds, section)
+
+    def put(self, ds: DigitalSelf) -> None:
+        """Registers ds for the next flush; no I/O. Unchanged profiles are skipped at flush time."""
+        with self._lock:
+            self._pending[ds.user_id] = ds
+
+    def flush(self) -> int:
+        """Writes pending dirty sections atomically; returns the number of profiles written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            rows = []
+            for ds in pending.values():
+                # dirty set and contents are taken together under the profile's lock (turns may be running)
+                sections, dump = snapshot_dirty_sections(ds)
+                if sections:
+                    rows.append((ds, sections, dump))
+            if not rows:
+                return 0
+            self._write_rows(rows)
+            self._known.update(ds.user_id for ds, _, _ in rows)
+            self.flushes += 1
+            self.rows_written += len(rows)
+            return len(rows)
+
+    @timed("ds.flush")
+    def _write_rows(self, rows: List[Tuple[DigitalSelf, Dict[str, Any], Dict[str, Any]]]) -> None:
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            for ds, sections, dump in rows:
+                if ds.user_id not in self._known:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO digital_selves"
+                        "(user_id, stable, dynamic, profile, privacy, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (ds.user_id, *(json.dumps(dump[k], ensure_ascii=False) for k in DS_SECTIONS), now),
+                    )
+                else:
+                    assignments = ", ".join(f"{k} = ?" for k in sections)
+                    values = [json.dumps(v, ensure_ascii=False) for v in sections.values()]
+                    self._db.execute(
+                        f"UPDATE digital_selves SET {assignments}, updated_at = ? WHERE user_id = ?",
+                        (*values, now, ds.user_id),
+                    )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            # keep the changes for the next attempt
+            for ds, sections, _ in rows:
+                for section in sections:
+                    mark_changed(ds, section)
+                self._pending.setdefault(ds.user_id, ds)
+            raise
+
+    def rename_embedding_model(self, old: str, new: str) -> int:
+        """Points every profile recorded with embedding model `old` at `new` (after a re-embedding migration)."""
+        with self._lock:
+            for ds in self._pending.values():
+                if ds.profile.embedding_model == old:
+                    ds.profile.embedding_model = new
+                    mark_changed(ds, "profile.embedding_model")
+            cur = self._db.execute(
+                "UPDATE digital_selves SET profile = json_set(profile, '$.embedding_model', ?), updated_at = ? "
+                "WHERE json_extract(profile, '$.embedding_model') = ?",
+                (new, time.time(), old),
+            )
+            return cur.rowcount
+
+    def import_json_dir(self, data_dir: str = "data") -> int:
+        """Imports legacy digital_self_*.json files for users not already stored."""
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(data_dir, "digital_self_*.json"))):
+            data = safe_json_load(path, default=None)
+            if not isinstance(data, dict) or "user_id" not in data:
+                continue
+            with self._lock:
+                if data["user_id"] in self._pending or self._load_row(data["user_id"]) is not None:
+                    continue
+                ds = DigitalSelf(**data)
+                self._mark_all(ds)
+                self._pending[ds.user_id] = ds
+                imported += 1
+        self.flush()
+        return imported
+
+    # --- lifecycle ---
+    def _loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # retried next tick; pending changes were re-queued
+                log.exception("Digital Self flush failed")
+
+    def start(self) -> "DigitalSelfStore":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="digital-self-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .digital_self import PrivacyConfig
+from .memory.long_term import LongTermMemoryBase
+from .utils import contains_sensitive, embed_texts
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams records from a JSONL file, one line at a time.
+    Blank lines are skipped; malformed lines yield {} so the caller can count them.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                rec = {}
+            yield rec if isinstance(rec, dict) else {}
+
+
+def ingest_records(
+    records: Iterator[Dict[str, Any]],
+    ltm: LongTermMemoryBase,
+    privacy_for: Callable[[str], PrivacyConfig],
+    batch_size: int = 256,
+    on_batch: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """
+    Bulk-loads (user_id, text, tags) records into long-term memory.
+    - applies the same sensitivity rule as handle_turn (sensitive text is never stored)
+    - uses the user's long-term retention setting
+    - embeds and writes one batch at a time, so memory stays bounded by batch_size
+    """
+    stats = {"read": 0, "stored": 0, "skipped_sensitive": 0, "skipped_invalid": 0}
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        if not batch:
+            return
+        vecs = embed_texts([r["text"] for r in batch])
+        for r, v in zip(batch, vecs):
+            r["embedding"] = v
+        ltm.add_many(batch)
+        stats["stored"] += len(batch)
+        batch.clear()
+        if on_batch:
+            on_batch(stats)
+
+    for rec in records:
+        stats["read"] += 1
+        user_id = str(rec.get("user_id") or "").strip()
+        text = str(rec.get("text") or "").strip()
+        if not user_id or not text:
+            stats["skipped_invalid"] += 1
+            continue
+
+        privacy = privacy_for(user_id)
+        if contains_sensitive(text, privacy.sensitive_keywords):
+            stats["skipped_sensitive"] += 1
+            continue
+
+        batch.append(
+            {
+                "user_id": user_id,
+                "text": text,
+                "tags": rec.get("tags") or [],
+                "is_sensitive": False,
+                "retention_days": privacy.retention_days.long_term,
+            }
+        )
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return stats
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Very common words carry no signal and have the longest postings lists.
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by do does did for from had has have he her his how i i'm if in into is it
+    its me my no not of on or our she so that the their them then there these they this to us was we were
+    what when where which who why will with you your about can could would should just also very than too
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class _UserIndex:
+    __slots__ = ("postings", "doc_len", "total_len")
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {memory_id: term frequency}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+
+    def add(self, memory_id: str, text: str) -> None:
+        if memory_id in self.doc_len:
+            self.remove(memory_id, text)
+        terms = tokenize(text)
+        tf: Dict[str, int] = {}
+        for t in terms:
+            tf[t] = tf.get(t, 0) + 1
+        for t, n in tf.items():
+            self.postings.setdefault(t, {})[memory_id] = n
+        self.doc_len[memory_id] = len(terms)
+        self.total_len += len(terms)
+
+    def remove(self, memory_id: str, text: str) -> None:
+        n = self.doc_len.pop(memory_id, None)
+        if n is None:
+            return
+        self.total_len -= n
+        for t in set(tokenize(text)):
+            docs = self.postings.get(t)
+            if docs is not None:
+                docs.pop(memory_id, None)
+                if not docs:
+                    del self.postings[t]
+
+
+class BM25Index:
+    """
+    In-memory per-user BM25 over LTM documents, used as the lexical candidate
+    generator for hybrid retrieval. A user's index is built from the store on
+    first search (loader) and then kept in sync by LongTermMemoryBase on every
+    add and delete. Search cost follows the postings of the query terms, not
+    the number of memories. At most `max_users` user indexes are kept (LRU).
+    """
+
+    def __init__(self, max_users: int = 1000, k1: float = 1.2, b: float = 0.75) -> None:
+        self.max_users = max_users
+        self.k1 = k1
+        self.b = b
+        self._users: "OrderedDict[str, _UserIndex]" = OrderedDict()
+        self._docs: Dict[str, Tuple[str, str]] = {}  # memory_id -> (user_id, text), loaded users only
+        self._lock = threading.Lock()
+
+    def _load(self, user_id: str, loader: Callable[[], Iterable[Tuple[str, str]]]) -> _UserIndex:
+        idx = self._users.get(user_id)
+        if idx is not None:
+            self._users.move_to_end(user_id)
+            return idx
+        idx = self._users[user_id] = _UserIndex()
+        for memory_id, text in loader():
+            if text:
+                idx.add(memory_id, text)
+                self._docs[memory_id] = (user_id, text)
+        while len(self._users) > self.max_users:
+            self._drop(next(iter(self._users)))
+        return idx
+
+    def _drop(self, user_id: str) -> None:
+        idx = self._users.pop(user_id, None)
+        if idx is not None:
+            for memory_id in idx.doc_len:
+                self._docs.pop(memory_id, None)
+
+    # --- maintenance (called by LongTermMemoryBase) ---
+    def add(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """rows: (memory_id, user_id, text). Users whose index is not loaded are skipped."""
+        with self._lock:
+            for memory_id, user_id, text in rows:
+                idx = self._users.get(user_id)
+                if idx is not None and text:
+                    idx.add(memory_id, text)
+                    self._docs[memory_id] = (user_id, text)
+
+    def delete(self, memory_ids: Iterable[str]) -> None:
+        with self._lock:
+            for memory_id in memory_ids:
+                owner = self._docs.pop(memory_id, None)
+                if owner is not None and owner[0] in self._users:
+                    self._users[owner[0]].remove(memory_id, owner[1])
+
+    def delete_user(self, user_id: str) -> None:
+        with self._lock:
+            self._drop(user_id)
+
+    # --- reads ---
+    def size(self, user_id: str) -> int:
+        idx = self._users.get(user_id)
+        return len(idx.doc_len) if idx is not None else 0
+
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        limit: int,
+        loader: Callable[[], Iterable[Tuple[str, str]]],
+    ) -> List[Tuple[str, float]]:
+        """Top `limit` (memory_id, score) for the user, best first; [] when no term matches."""
+        terms = set(tokenize(query))
+        with self._lock:
+            idx = self._load(user_id, loader)
+            n = len(idx.doc_len)
+            if not terms or not n:
+                return []
+            avgdl = idx.total_len / n or 1.0
+            scores: Dict[str, float] = {}
+            for t in terms:
+                docs = idx.postings.get(t)
+                if not docs:
+                    continue
+                df = len(docs)
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                for memory_id, tf in docs.items():
+                    norm = tf + self.k1 * (1.0 - self.b + self.b * idx.doc_len[memory_id] / avgdl)
+                    scores[memory_id] = scores.get(memory_id, 0.0) + idf * tf * (self.k1 + 1.0) / norm
+        return heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> Dict[str, float]:
+    """sum over rankings of 1 / (k + rank), rank starting at 1."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, memory_id in enumerate(ranking, start=1):
+            fused[memory_id] = fused.get(memory_id, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+from ..metrics import timed
+from ..utils import now_epoch
+
+# Cosine similarity at or above which two memories count as the same statement.
+DEFAULT_THRESHOLD = 0.95
+# Upper bound on one block of the similarity matrix (float32 elements, ~64 MB).
+BLOCK_ELEMENTS = 1 << 24
+
+
+def find_duplicate_groups(
+    vectors: np.ndarray,
+    threshold: float = DEFAULT_THRESHOLD,
+    groups: Optional[Sequence[Any]] = None,
+    rows: Optional[Sequence[int]] = None,
+    block_elements: int = BLOCK_ELEMENTS,
+) -> List[List[int]]:
+    """
+    Groups in which every pair has cosine >= threshold (complete linkage), so
+    a chain of statements that each resemble the next is never merged into
+    one. Pairs above the threshold are found block by block (block x n), so
+    memory is bounded by block_elements whatever the store size; their
+    connected components are then split greedily, in row order: a row joins
+    the first group it is similar to in full, otherwise starts a new one.
+    Only rows with equal `groups` values can be grouped. With `rows`, only
+    pairs touching those rows are looked for and only groups containing one
+    of them are returned (incremental mode). Returns row lists of size > 1.
+    """
+    n = len(vectors)
+    if n < 2:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+    codes = None
+    if groups is not None:
+        _, codes = np.unique(np.asarray([str(g) for g in groups]), return_inverse=True)
+
+    parent = np.arange(n)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    query_rows = np.arange(n) if rows is None else np.unique(np.asarray(rows, dtype=np.int64))
+    block = max(1, min(len(query_rows), block_elements // n))
+    cols = np.arange(n)
+    for start in range(0, len(query_rows), block):
+        blk = query_rows[start : start + block]
+        sims = unit[blk] @ unit.T
+        if rows is None:
+            sims[cols[None, :] <= blk[:, None]] = -1.0  # each pair once, never a row with itself
+        else:
+            sims[np.arange(len(blk)), blk] = -1.0
+        if codes is not None:
+            sims[codes[blk][:, None] != codes[None, :]] = -1.0
+        for a, b in zip(*np.nonzero(sims >= threshold)):
+            ra, rb = find(int(blk[a])), find(int(b))
+            if ra != rb:
+                parent[rb] = ra
+
+    components: Dict[int, List[int]] = {}
+    for i in range(n):
+        components.setdefault(find(i), []).append(i)
+    wanted = None if rows is None else set(query_rows.tolist())
+    out: List[List[int]] = []
+    for comp in components.values():
+        if len(comp) < 2:
+            continue
+        # candidate components are small: their full similarity matrix is cheap
+        within = unit[comp] @ unit[comp].T >= threshold
+        split: List[List[int]] = []
+        for j in range(len(comp)):
+            for g in split:
+                if within[j, g].all():
+                    g.append(j)
+                    break
+            else:
+                split.append([j])
+        for g in split:
+            members = [comp[j] for j in g]
+            if len(members) > 1 and (wanted is None or wanted.intersection(members)):
+                out.append(members)
+    return out
+
+
+def _merged_meta(metas: List[Dict[str, Any]], keep: int) -> Dict[str, Any]:
+    """
+    The kept memory's metadata with the union of tags, the latest expiry
+    (a restated fact lives as long as its most recent statement) and a
+    merge count.
+    """
+    tags: List[str] = []
+    for m in metas:
+        for t in (m.get("tags") or "").split(","):
+            t = t.strip()
+            if t and t not in tags:
+                tags.append(t)
+    dated = [m for m in metas if m.get("expires_at_ts") is not None]
+    latest = max(dated, key=lambda m: m["expires_at_ts"]) if dated else metas[keep]
+    out = dict(metas[keep])
+    out["tags"] = ", ".join(tags)
+    out["expires_at"] = latest.get("expires_at")
+    out["expires_at_ts"] = latest.get("expires_at_ts")
+    out["merged_count"] = sum(int(m.get("merged_count", 1)) for m in metas)
+    return out
+
+
+@timed("ltm.consolidate")
+def consolidate_user(
+    ltm: Any,
+    user_id: str,
+    threshold: float = DEFAULT_THRESHOLD,
+    new_ids: Optional[Iterable[str]] = None,
+) -> Dict[str, int]:
+    """
+    Merges each cluster of near-duplicate memories into its newest member
+    (tags merged, latest expiry kept) and deletes the others. With new_ids,
+    only clusters that contain one of those memories are looked for.
+    Sensitive and non-sensitive memories are never merged together.
+    """
+    ids, metas, mat = ltm._user_vectors(user_id)
+    now = now_epoch()
+    live = [i for i, m in enumerate(metas) if (m.get("expires_at_ts") or now + 1) > now]
+    stats = {"memories": len(live), "clusters": 0, "removed": 0}
+    if len(live) < 2:
+        return stats
+    ids = [ids[i] for i in live]
+    metas = [metas[i] for i in live]
+    mat = mat[live]
+
+    rows = None
+    if new_ids is not None:
+        wanted = set(new_ids)
+        rows = [i for i, mid in enumerate(ids) if mid in wanted]
+        if not rows:
+            return stats
+    keys = [(bool(m.get("is_sensitive")), m.get("memory_type", "long_term")) for m in metas]
+    for comp in find_duplicate_groups(mat, threshold, groups=keys, rows=rows):
+        # newest statement wins; row order breaks timestamp ties (later rows were written later)
+        keep = max(range(len(comp)), key=lambda j: (metas[comp[j]].get("ts") or "", comp[j]))
+        meta = _merged_meta([metas[i] for i in comp], keep)
+        drop = [ids[i] for j, i in enumerate(comp) if j != keep]
+        stats["removed"] += ltm.merge_memories(user_id, ids[comp[keep]], meta, drop)
+        stats["clusters"] += 1
+    return stats
+
+
+def consolidate_all(ltm: Any, threshold: float = DEFAULT_THRESHOLD) -> Dict[str, int]:
+    """Full offline pass over every user."""
+    total = {"users": 0, "memories": 0, "clusters": 0, "removed": 0}
+    for user_id in ltm.list_users():
+        stats = consolidate_user(ltm, user_id, threshold)
+        total["users"] += 1
+        for k, v in stats.items():
+            total[k] += v
+    return total
+
+
+class Consolidator:
+    """
+    Background incremental consolidation. Registers as a write listener on the
+    LTM store, so every add queues (user, new ids); a worker thread merges
+    those new memories into existing near-duplicates every interval_seconds.
+    Queries stay correct without it; it only keeps stores from filling with repeats.
+    """
+
+    def __init__(self, ltm: Any, threshold: float = DEFAULT_THRESHOLD, interval_seconds: float = 60.0) -> None:
+        self.ltm = ltm
+        self.threshold = threshold
+        self.interval_seconds = interval_seconds
+        self._pending: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.removed_total = 0
+        ltm.add_write_listener(self.notify)
+
+    def notify(self, user_id: str, new_ids: List[str]) -> None:
+        with self._lock:
+            self._pending.setdefault(user_id, set()).update(new_ids)
+
+    def run_once(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        removed = 0
+        for user_id, new_ids in pending.items():
+            removed += consolidate_user(self.ltm, user_id, self.threshold, new_ids)["removed"]
+        self.removed_total += removed
+        return removed
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception:
+                # users of a failed run are dropped; the next full pass picks them up
+                pass
+
+    def start(self) -> "Consolidator":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="ltm-consolidator", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
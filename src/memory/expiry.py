@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (expires_at_ts, memory_id, user_id).
+    Popping expired entries is O(expired * log n); nothing is scanned.
+    Entries for memories deleted by other paths are left in place and become
+    harmless no-op deletes when they surface. A memory whose expiry was
+    pushed back (reschedule) has its older entries skipped.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, str, str]] = []
+        self._rescheduled: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def push(self, expires_at_ts: float, memory_id: str, user_id: str) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (float(expires_at_ts), memory_id, user_id))
+
+    def push_many(self, entries: List[Tuple[float, str, str]]) -> None:
+        with self._lock:
+            for e in entries:
+                heapq.heappush(self._heap, (float(e[0]), e[1], e[2]))
+
+    def push_missing(self, entries: List[Tuple[float, str, str]]) -> None:
+        """push_many for a full load: memories already in the heap (pushed by their writer meanwhile) are skipped."""
+        with self._lock:
+            known = {e[1] for e in self._heap}
+            for e in entries:
+                if e[1] not in known:
+                    heapq.heappush(self._heap, (float(e[0]), e[1], e[2]))
+
+    def reschedule(self, expires_at_ts: float, memory_id: str, user_id: str) -> None:
+        """Moves a memory's expiry; entries pushed for it earlier are ignored from now on."""
+        with self._lock:
+            self._rescheduled[memory_id] = float(expires_at_ts)
+            heapq.heappush(self._heap, (float(expires_at_ts), memory_id, user_id))
+
+    def pop_expired(self, now: float) -> List[Tuple[str, str]]:
+        out: List[Tuple[str, str]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                ts, memory_id, user_id = heapq.heappop(self._heap)
+                latest = self._rescheduled.get(memory_id)
+                if latest is not None:
+                    if ts < latest:
+                        continue
+                    del self._rescheduled[memory_id]
+                out.append((memory_id, user_id))
+        return out
+
+    def next_expiry(self) -> Optional[float]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class ExpirySweeper:
+    """
+    Background thread that physically deletes expired memories.
+    Query-time correctness does not depend on it (queries filter on
+    expires_at_ts); it only keeps the store from growing. The first sweep
+    runs as soon as the thread starts and builds the expiry heap (a full
+    store scan), so startup does not wait for it.
+    """
+
+    def __init__(self, ltm: Any, interval_seconds: float = 300.0) -> None:
+        self.ltm = ltm
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.swept_total = 0
+
+    def run_once(self) -> int:
+        n = self.ltm.sweep_expired()
+        self.swept_total += n
+        return n
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                # A failed sweep is retried on the next tick; expired items stay hidden meanwhile.
+                pass
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def start(self) -> "ExpirySweeper":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="ltm-expiry-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
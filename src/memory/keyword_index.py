@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+
+class KeywordIndex:
+    """
+    SQLite full-text index over LTM documents, used for keyword forgetting.
+    - docs: memory_id -> (user_id, text), indexed by user_id
+    - docs_fts: FTS5 trigram index over docs.text (external content, kept in sync by triggers)
+    A keyword of 3+ characters is a trigram MATCH (case-insensitive substring),
+    so lookups do not scan the user's memories. Shorter keywords fall back to a
+    per-user scan inside SQLite. If FTS5/trigram is unavailable, the per-user
+    scan is used for everything.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "rowid INTEGER PRIMARY KEY, memory_id TEXT UNIQUE NOT NULL, user_id TEXT NOT NULL, text TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_user ON docs(user_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.fts = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5("
+                "text, content='docs', content_rowid='rowid', tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        self._db.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+              INSERT INTO docs_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+              INSERT INTO docs_fts(docs_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+            END;
+            """
+        )
+        return True
+
+    # --- bookkeeping ---
+    def is_marked(self, key: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return bool(row and row[0] == "1")
+
+    def mark(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, '1')", (key,))
+
+    def is_built(self) -> bool:
+        return self.is_marked("built")
+
+    def mark_built(self) -> None:
+        self.mark("built")
+
+    # --- writes ---
+    def add(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """rows: (memory_id, user_id, text)"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO docs(memory_id, user_id, text) VALUES (?, ?, ?)", rows
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def delete(self, memory_ids: List[str]) -> None:
+        if not memory_ids:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("DELETE FROM docs WHERE memory_id = ?", [(m,) for m in memory_ids])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def delete_user(self, user_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM docs WHERE user_id = ?", (user_id,))
+
+    # --- reads ---
+    def existing(self, memory_ids: List[str]) -> set:
+        """The subset of memory_ids that are indexed."""
+        found: set = set()
+        with self._lock:
+            for start in range(0, len(memory_ids), 500):
+                chunk = memory_ids[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT memory_id FROM docs WHERE memory_id IN ({marks})", chunk)
+                found.update(r[0] for r in rows)
+        return found
+
+    def owners(self, memory_ids: List[str]) -> Dict[str, str]:
+        """memory_id -> user_id for the indexed subset of memory_ids."""
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(memory_ids), 500):
+                chunk = memory_ids[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT memory_id, user_id FROM docs WHERE memory_id IN ({marks})", chunk)
+                found.update(rows)
+        return found
+
+    def search(self, user_id: str, keyword: str) -> List[str]:
+        """Ids of the user's memories whose text contains keyword (case-insensitive)."""
+        kw = keyword.strip()
+        if not kw:
+            return []
+        with self._lock:
+            if self.fts and len(kw) >= 3:
+                phrase = '"' + kw.replace('"', '""') + '"'
+                rows = self._db.execute(
+                    "SELECT d.memory_id FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+                    "WHERE docs_fts MATCH ? AND d.user_id = ?",
+                    (phrase, user_id),
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT memory_id FROM docs WHERE user_id = ? AND instr(lower(text), ?) > 0",
+                    (user_id, kw.lower()),
+                ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
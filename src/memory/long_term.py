@@ -1,32 +1,157 @@
+import asyncio
 import os
+import re
+import threading
+from contextlib import contextmanager
 
 os.environ["CHROMA_TELEMETRY"] = "FALSE"
 os.environ["ANONYMIZED_TELEMETRY"] = "FALSE"
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import chromadb
-from chromadb.config import Settings
+import numpy as np
 
-from ..utils import now_iso, iso_in_days, is_expired, stable_hash_id
+from ..utils import (
+    DEFAULT_EMBED_MODEL,
+    now_iso,
+    now_epoch,
+    iso_in_days,
+    epoch_in_days,
+    iso_to_epoch,
+    safe_json_dump,
+    safe_json_load,
+    stable_hash_id,
+)
+from ..metrics import span, timed
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .expiry import ExpiryIndex
+from .keyword_index import KeywordIndex
+from .profile_vectors import ProfileVectors
 
 
-class LongTermMemory:
+def _tags_to_str(tags: Any) -> str:
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return ", ".join([t.strip() for t in (tags or []) if t and t.strip()])
+
+
+def _with_expiry_ts(meta: Dict[str, Any]) -> Dict[str, Any]:
+    # records written before expires_at_ts existed only carry the ISO expires_at
+    if "expires_at_ts" in meta or not meta.get("expires_at"):
+        return meta
+    return {**meta, "expires_at_ts": iso_to_epoch(meta["expires_at"])}
+
+
+def _hit(memory_id: str, doc: Optional[str], meta: Dict[str, Any], dist: Optional[float]) -> Dict[str, Any]:
+    raw_tags = meta.get("tags", "") or ""
+    return {
+        "id": memory_id,
+        "text": doc,
+        "distance": float(dist) if dist is not None else None,
+        "ts": meta.get("ts"),
+        "tags": [t.strip() for t in raw_tags.split(",") if t.strip()],
+        "is_sensitive": bool(meta.get("is_sensitive", False)),
+        "expires_at": meta.get("expires_at"),
+    }
+
+
+class LongTermMemoryBase:
     """
-    Chroma-backed semantic memory.
-    Stores:
-      - documents (raw or summarized memory text)
-      - embeddings
-      - metadata (user_id, ts, is_sensitive, expires_at, tags)
-    NOTE: Chroma metadata values must be scalar types (str/int/float/bool/None).
+    Backend-independent part of long-term memory:
+      - record/metadata construction (add, add_many)
+      - the keyword index used for forgetting (memory/keyword_index.py)
+      - the expiry heap used by the sweeper (memory/expiry.py)
+      - the BM25 index used by hybrid_query (memory/bm25.py)
+      - per-user embedding centroids (memory/profile_vectors.py)
+      - a single delete path (_delete_ids) so all of the above stay in sync
+      - store versions (store_version) that change on every write, for caches
+      - an optional write fence (migration.WriteFence) held around every
+        write, so a migration can cut over without losing one
+
+    Backends implement storage: _write, _remove, _update_metadata, _iter_pages,
+    _user_page, _ids_for_user, _user_vectors, query, score_ids, purge_expired
+    and get_user_memories.
+    Distances are squared L2 (Chroma's default space) in every backend.
     """
 
-    def __init__(self, persist_dir: str = "data/chroma", collection_name: str = "ltm") -> None:
-        self.client = chromadb.PersistentClient(
-            path=persist_dir,
-            settings=Settings(anonymized_telemetry=False),
-        )
-        self.col = self.client.get_or_create_collection(name=collection_name)
+    def __init__(self, keyword_index_path: str) -> None:
+        self.expiry = ExpiryIndex()
+        self._expiry_loaded = False
+        self._expiry_ts_checked = False
+        self.keywords = KeywordIndex(keyword_index_path)
+        self.lexical = BM25Index()
+        self.profiles = ProfileVectors()
+        # per-user write counters plus a global epoch for changes whose user is unknown
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0
+        self._version_lock = threading.Lock()
+        # called as fn(user_id, new_ids) after every write (memory/consolidation.py)
+        self._write_listeners: List[Callable[[str, List[str]], None]] = []
+        # set by processes that serve or write (run.py); see _writing
+        self.fence: Optional[Any] = None
+
+    # --- storage hooks (backend-specific) ---
+    def _write(self, ids: List[str], docs: List[str], embs: List[Any], metas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def _remove(self, ids: List[str], user_id: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def _update_metadata(self, ids: List[str], metas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def _iter_pages(self, include: List[str], page_size: int = 1000, start: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Yields Chroma-style pages: {"ids": [...], "documents": [...], "metadatas": [...]},
+        skipping the first `start` records (in a stable order while nothing is deleted).
+        """
+        raise NotImplementedError
+
+    def _user_page(self, user_id: str, include: List[str]) -> Dict[str, Any]:
+        """All of the user's records as one _iter_pages-style page."""
+        raise NotImplementedError
+
+    def _ids_for_user(self, user_id: str) -> List[str]:
+        raise NotImplementedError
+
+    def _user_vectors(self, user_id: str) -> Tuple[List[str], List[Dict[str, Any]], np.ndarray]:
+        """(ids, metadatas, float32 embedding matrix) of the user's stored memories."""
+        raise NotImplementedError
+
+    def list_users(self) -> List[str]:
+        users = set()
+        for _, metas in self._iter_metadata_pages():
+            users.update((m or {}).get("user_id", "") for m in metas)
+        users.discard("")
+        return sorted(users)
+
+    # --- versions ---
+    def store_version(self, user_id: str) -> Tuple[int, int]:
+        """Changes whenever anything that could alter this user's query results is written."""
+        return self._epoch, self._versions.get(user_id, 0)
+
+    def _bump(self, user_id: Optional[str] = None) -> None:
+        with self._version_lock:
+            if user_id:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            else:
+                self._epoch += 1
+
+    # --- writes ---
+    @contextmanager
+    def _writing(self, user_ids: Iterable[Optional[str]]) -> Iterator[None]:
+        """
+        Wraps every change to the stored records: holds the write fence shared
+        and journals the users touched, so a running migration re-syncs them.
+        """
+        if self.fence is None:
+            yield
+            return
+        with self.fence.shared():
+            try:
+                yield
+            finally:
+                self.fence.record(u for u in user_ids if u)
 
     def add(
         self,
@@ -37,66 +162,712 @@ class LongTermMemory:
         is_sensitive: bool = False,
         retention_days: int = 30,
         memory_type: str = "long_term",
+        memory_id: Optional[str] = None,
     ) -> str:
-        memory_id = stable_hash_id(f"{user_id}:{text}:{now_iso()}")
+        return self.add_many(
+            [
+                {
+                    "id": memory_id,
+                    "user_id": user_id,
+                    "text": text,
+                    "embedding": embedding,
+                    "tags": tags,
+                    "is_sensitive": is_sensitive,
+                    "retention_days": retention_days,
+                    "memory_type": memory_type,
+                }
+            ]
+        )[0]
 
-        tags_str = ", ".join([t.strip() for t in (tags or []) if t and t.strip()])
+    @staticmethod
+    def new_id(user_id: str, text: str) -> str:
+        """An id that can be chosen before the write (see agent.ahandle_turn)."""
+        return stable_hash_id(f"{user_id}:{text}:{now_iso()}")
 
-        meta = {
-            "user_id": user_id,
-            "ts": now_iso(),
-            "memory_type": memory_type,
-            "is_sensitive": bool(is_sensitive),
-            "expires_at": iso_in_days(retention_days),
-            "tags": tags_str,  # must be scalar
-        }
+    @timed("ltm.write")
+    def add_many(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Bulk insert. Each record needs user_id, text and embedding; id, tags,
+        is_sensitive, retention_days and memory_type are optional (same
+        defaults as add). Returns the new ids in input order.
+        """
+        ts = now_iso()
+        ids: List[str] = []
+        docs: List[str] = []
+        embs: List[Any] = []
+        metas: List[Dict[str, Any]] = []
+        for i, r in enumerate(records):
+            user_id = r["user_id"]
+            # index keeps ids unique when one batch repeats a text for a user
+            ids.append(r.get("id") or stable_hash_id(f"{user_id}:{r['text']}:{ts}:{i}"))
+            docs.append(r["text"])
+            embs.append(r["embedding"])
+            retention_days = r.get("retention_days", 30)
+            metas.append(
+                {
+                    "user_id": user_id,
+                    "ts": ts,
+                    "memory_type": r.get("memory_type", "long_term"),
+                    "is_sensitive": bool(r.get("is_sensitive", False)),
+                    "expires_at": iso_in_days(retention_days),
+                    "expires_at_ts": epoch_in_days(retention_days),
+                    "tags": _tags_to_str(r.get("tags")),  # must be scalar
+                }
+            )
 
-        self.col.add(
-            ids=[memory_id],
-            documents=[text],
-            embeddings=[embedding],
-            metadatas=[meta],
-        )
-        return memory_id
+        if not ids:
+            return ids
+        with self._writing(m["user_id"] for m in metas):
+            self._write(ids, docs, embs, metas)
+        for uid in {m["user_id"] for m in metas}:
+            self._bump(uid)
+        rows = [(mid, m["user_id"], doc) for mid, m, doc in zip(ids, metas, docs)]
+        self.keywords.add(rows)
+        self.lexical.add(rows)
+        self._add_profile_vectors(embs, metas)
+        if self._expiry_loaded:
+            self.expiry.push_many([(m["expires_at_ts"], mid, m["user_id"]) for mid, m in zip(ids, metas)])
+        if self._write_listeners:
+            by_user: Dict[str, List[str]] = {}
+            for mid, m in zip(ids, metas):
+                by_user.setdefault(m["user_id"], []).append(mid)
+            for fn in self._write_listeners:
+                for uid, new_ids in by_user.items():
+                    fn(uid, new_ids)
+        return ids
 
-    def purge_expired(self, user_id: str) -> int:
-        res = self.col.get(where={"user_id": user_id}, include=["metadatas"])
-        ids = res.get("ids", [])
-        metas = res.get("metadatas", [])
+    def import_records(
+        self, ids: List[str], docs: List[str], embs: List[Any], metas: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Writes records with their metadata as-is (ts, expiry, tags are kept);
+        ids already present are skipped, so replays are idempotent. Used by
+        the re-embedding migration (src/migration.py).
+        """
+        present = self.keywords.existing(ids)
+        keep = [i for i, mid in enumerate(ids) if mid not in present]
+        if not keep:
+            return 0
+        ids, docs = [ids[i] for i in keep], [docs[i] for i in keep]
+        embs, metas = [embs[i] for i in keep], [_with_expiry_ts(metas[i]) for i in keep]
+        with self._writing(m["user_id"] for m in metas):
+            self._write(ids, docs, embs, metas)
+        for uid in {m["user_id"] for m in metas}:
+            self._bump(uid)
+        rows = [(mid, m["user_id"], doc) for mid, m, doc in zip(ids, metas, docs)]
+        self.keywords.add(rows)
+        self.lexical.add(rows)
+        self._add_profile_vectors(embs, metas)
+        if self._expiry_loaded:
+            self.expiry.push_many(
+                [(m["expires_at_ts"], mid, m["user_id"]) for mid, m in zip(ids, metas) if "expires_at_ts" in m]
+            )
+        return len(ids)
+
+    def add_write_listener(self, fn: Callable[[str, List[str]], None]) -> None:
+        self._write_listeners.append(fn)
 
-        to_delete = []
-        for mid, meta in zip(ids, metas):
-            if meta and "expires_at" in meta and is_expired(meta["expires_at"]):
-                to_delete.append(mid)
+    def merge_memories(self, user_id: str, keep_id: str, keep_meta: Dict[str, Any], drop_ids: List[str]) -> int:
+        """Rewrites keep_id's metadata, then deletes drop_ids; used by consolidation."""
+        with self._writing([user_id]):
+            self._update_metadata([keep_id], [keep_meta])
+        if self._expiry_loaded and keep_meta.get("expires_at_ts") is not None:
+            self.expiry.reschedule(keep_meta["expires_at_ts"], keep_id, user_id)
+        self._bump(user_id)
+        return self._delete_ids(drop_ids, user_id)
 
-        if to_delete:
-            self.col.delete(ids=to_delete)
-        return len(to_delete)
+    @timed("ltm.delete")
+    def _delete_ids(self, ids: List[str], user_id: Optional[str] = None) -> int:
+        """
+        Single delete path so every index stays in sync with the store.
+        Without user_id, the owners are looked up in the keyword index, so
+        backends never have to search every user for an id.
+        """
+        if ids and user_id is None:
+            self._ensure_keyword_index()
+            by_user: Dict[str, List[str]] = {}
+            for mid, uid in self.keywords.owners(ids).items():
+                by_user.setdefault(uid, []).append(mid)
+            return sum(self._delete_ids(mids, uid) for uid, mids in by_user.items())
+        if ids:
+            with self._writing([user_id]):
+                self._remove(ids, user_id)
+            self._bump(user_id)
+            self.keywords.delete(ids)
+            self.lexical.delete(ids)
+            self.profiles.invalidate(user_id)
+        return len(ids)
 
     def delete_by_id(self, memory_id: str) -> None:
-        self.col.delete(ids=[memory_id])
+        self._delete_ids([memory_id])
 
     def delete_by_keyword(self, user_id: str, keyword: str) -> int:
-        res = self.col.get(where={"user_id": user_id}, include=["documents"])
-        ids = res.get("ids", [])
-        docs = res.get("documents", [])
+        """Index lookup + one batched delete; cost follows the number of matches."""
+        self._ensure_keyword_index()
+        return self._delete_ids(self.keywords.search(user_id, keyword), user_id)
+
+    def wipe_user(self, user_id: str) -> int:
+        n = self._delete_ids(self._ids_for_user(user_id), user_id)
+        self.keywords.delete_user(user_id)
+        self.lexical.delete_user(user_id)
+        return n
 
-        to_delete = []
-        for mid, doc in zip(ids, docs):
-            if doc and keyword.lower() in doc.lower():
-                to_delete.append(mid)
+    def drop_store(self) -> None:
+        """
+        Deletes the whole store (vectors and keyword index) from disk; used on
+        the source once a migration has cut over. The object is unusable afterwards.
+        """
+        raise NotImplementedError
 
-        if to_delete:
-            self.col.delete(ids=to_delete)
-        return len(to_delete)
+    def _drop_keyword_index(self) -> None:
+        self.keywords.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.keywords.path + suffix):
+                os.remove(self.keywords.path + suffix)
 
-    def wipe_user(self, user_id: str) -> int:
-        res = self.col.get(where={"user_id": user_id}, include=[])
+    def _add_profile_vectors(self, embs: List[Any], metas: List[Dict[str, Any]]) -> None:
+        by_user: Dict[str, List[Any]] = {}
+        for emb, m in zip(embs, metas):
+            by_user.setdefault(m["user_id"], []).append(emb)
+        for uid, vecs in by_user.items():
+            self.profiles.add(uid, vecs)
+
+    def profile_centroids(self, user_id: str) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """(unit centroids, member counts, unit mean) of the user's stored embeddings."""
+        version = self.store_version(user_id)
+        return self.profiles.get(
+            user_id, lambda: self._user_vectors(user_id)[2], lambda: self.store_version(user_id) == version
+        )
+
+    # --- indexes ---
+    def _iter_metadata_pages(self, page_size: int = 1000):
+        for res in self._iter_pages(["metadatas"], page_size):
+            yield res["ids"], res.get("metadatas", [])
+
+    def _ensure_keyword_index(self) -> None:
+        # Backfill once for stores written before the index existed.
+        if self.keywords.is_built():
+            return
+        for res in self._iter_pages(["documents", "metadatas"]):
+            self.keywords.add(
+                [
+                    (mid, (meta or {}).get("user_id", ""), doc)
+                    for mid, doc, meta in zip(res["ids"], res.get("documents", []), res.get("metadatas", []))
+                    if doc
+                ]
+            )
+        self.keywords.mark_built()
+
+    def migrate_expiry_metadata(self, page_size: int = 1000) -> int:
+        """
+        Adds expires_at_ts to records that only carry the ISO expires_at.
+        Idempotent; returns the number of records rewritten.
+        """
+        updated = 0
+        for ids, metas in self._iter_metadata_pages(page_size):
+            fix_ids, fix_metas = [], []
+            for mid, meta in zip(ids, metas):
+                if meta and "expires_at_ts" not in meta and meta.get("expires_at"):
+                    fix_ids.append(mid)
+                    fix_metas.append(_with_expiry_ts(meta))
+            if fix_ids:
+                with self._writing(m.get("user_id") for m in fix_metas):
+                    self._update_metadata(fix_ids, fix_metas)
+                updated += len(fix_ids)
+        if updated:
+            self._bump()
+        self.keywords.mark("expiry_ts")
+        self._expiry_ts_checked = True
+        return updated
+
+    def _ensure_expiry_metadata(self) -> None:
+        """
+        Queries filter on expires_at_ts, which would hide records that only
+        carry the ISO expires_at: backfill them once per store (the keyword
+        index remembers it), before the first query of the process.
+        """
+        if self._expiry_ts_checked:
+            return
+        if not self.keywords.is_marked("expiry_ts"):
+            self.migrate_expiry_metadata()
+        self._expiry_ts_checked = True
+
+    def _load_expiry_index(self, page_size: int = 1000) -> None:
+        """
+        One paged scan per process: fills the heap (and migrates legacy records it meets).
+        Runs on the sweeper thread while turns go on; the flag is set first so that
+        records written during the scan are pushed by their writers.
+        """
+        self._expiry_loaded = True
+        try:
+            entries = []
+            legacy = False
+            for ids, metas in self._iter_metadata_pages(page_size):
+                for mid, meta in zip(ids, metas):
+                    if not meta:
+                        continue
+                    ts = meta.get("expires_at_ts")
+                    if ts is None and meta.get("expires_at"):
+                        legacy = True
+                        ts = iso_to_epoch(meta["expires_at"])
+                    if ts is not None:
+                        entries.append((ts, mid, meta.get("user_id", "")))
+            if legacy:
+                self.migrate_expiry_metadata(page_size)
+        except BaseException:
+            self._expiry_loaded = False
+            raise
+        self.expiry.push_missing(entries)
+
+    @timed("ltm.sweep_expired")
+    def sweep_expired(self, now: Optional[float] = None) -> int:
+        """Deletes every expired memory (all users) using the expiry heap."""
+        if not self._expiry_loaded:
+            self._load_expiry_index()
+        expired = self.expiry.pop_expired(now_epoch() if now is None else now)
+        by_user: Dict[str, List[str]] = {}
+        for mid, uid in expired:
+            by_user.setdefault(uid, []).append(mid)
+        return sum(self._delete_ids(ids, uid or None) for uid, ids in by_user.items())
+
+    # --- reads (backend-specific) ---
+    def purge_expired(self, user_id: str) -> int:
+        raise NotImplementedError
+
+    def query(
+        self,
+        user_id: str,
+        query_embedding: list[float],
+        top_k: int = 5,
+        exclude_sensitive: bool = True,
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def score_ids(
+        self,
+        user_id: str,
+        query_embedding: Any,
+        ids: List[str],
+        exclude_sensitive: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Exact distances for the given ids only (the user's, unexpired, and
+        non-sensitive if asked), as query-style hits sorted by distance.
+        """
+        raise NotImplementedError
+
+    def get_user_memories(self, user_id: str, limit: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """(total count, up to `limit` memories as query-style dicts without distance)"""
+        raise NotImplementedError
+
+    # --- hybrid retrieval ---
+    def hybrid_query(
+        self,
+        user_id: str,
+        query_text: str,
+        query_embedding: Any,
+        top_k: int = 5,
+        exclude_sensitive: bool = True,
+        candidates: int = 200,
+        rrf_k: int = 60,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Lexical prefilter + exact vector scoring + reciprocal rank fusion:
+          1. BM25 over the user's memories picks up to `candidates` ids
+          2. score_ids computes exact distances for those ids only
+          3. the BM25 ranking and the distance ranking are fused (RRF)
+        Cost follows the candidate set, not the store. When BM25 finds fewer
+        than top_k candidates (no shared terms), a regular query() fills in.
+        Returns (hits, log); hits carry "distance", "lexical_score" and "fused_score".
+        """
+        with span("ltm.lexical"):
+            lexical = self.lexical.search(user_id, query_text, candidates, lambda: self._user_docs(user_id))
+        with span("ltm.score_candidates"):
+            scored = self.score_ids(user_id, query_embedding, [mid for mid, _ in lexical], exclude_sensitive)
+        fallback = len(scored) < top_k
+        if fallback:
+            seen = {h["id"] for h in scored}
+            extra = self.query(user_id, query_embedding, top_k, exclude_sensitive)
+            scored = sorted(scored + [h for h in extra if h["id"] not in seen], key=lambda h: h["distance"])
+
+        with span("ltm.fuse"):
+            by_id = {h["id"]: h for h in scored}
+            lex_scores = dict(lexical)
+            lex_rank = [mid for mid, _ in lexical if mid in by_id]
+            fused = reciprocal_rank_fusion([lex_rank, [h["id"] for h in scored]], k=rrf_k)
+            best = sorted(by_id, key=lambda mid: (-fused[mid], by_id[mid]["distance"]))[:top_k]
+            hits = [
+                {
+                    **by_id[mid],
+                    "lexical_score": round(lex_scores[mid], 4) if mid in lex_scores else None,
+                    "fused_score": round(fused[mid], 6),
+                }
+                for mid in best
+            ]
+        log = {
+            "mode": "hybrid",
+            "store_size": self.lexical.size(user_id),
+            "lexical_candidates": len(lexical),
+            "scored": len(scored),
+            "fallback_vector_query": fallback,
+        }
+        return hits, log
+
+    def _user_docs(self, user_id: str) -> List[Tuple[str, str]]:
+        _, items = self.get_user_memories(user_id)
+        return [(m["id"], m["text"]) for m in items]
+
+
+LTM_SHARD_MODES = ("none", "user", "hash")
+
+
+class ShardLayout:
+    """
+    How the Chroma store splits one logical LTM collection:
+      none   - a single collection; every call filters on user_id
+      user   - one collection per user; wipe_user drops it
+      hash:N - N collections, users spread over them by a stable hash
+    With separate_dirs every collection gets its own persist directory
+    (its own SQLite file and index) under <persist_dir>/shards/.
+    """
+
+    def __init__(self, mode: str = "none", count: int = 1, separate_dirs: bool = False) -> None:
+        if mode not in LTM_SHARD_MODES:
+            raise ValueError(f"unknown LTM shard mode: {mode}")
+        if mode == "hash" and count < 1:
+            raise ValueError("hash sharding needs at least one shard")
+        self.mode = mode
+        self.count = count if mode == "hash" else 1
+        self.separate_dirs = separate_dirs and mode != "none"
+
+    @classmethod
+    def parse(cls, spec: str, separate_dirs: bool = False) -> "ShardLayout":
+        """none | user | hash:<N>"""
+        mode, _, count = spec.partition(":")
+        return cls(mode, int(count or 16), separate_dirs)
+
+    @property
+    def spec(self) -> str:
+        return f"hash:{self.count}" if self.mode == "hash" else self.mode
+
+    @property
+    def tag(self) -> str:
+        """Distinguishes layouts in file and collection names ("" for none)."""
+        if self.mode == "none":
+            return ""
+        return (f"hash{self.count}" if self.mode == "hash" else "user") + ("_dirs" if self.separate_dirs else "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "count": self.count, "separate_dirs": self.separate_dirs}
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ShardLayout) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"ShardLayout({self.spec!r}, separate_dirs={self.separate_dirs})"
+
+
+def layout_path(persist_dir: str, collection_name: str) -> str:
+    return os.path.join(persist_dir, f"layout_{collection_name}.json")
+
+
+def read_layout(persist_dir: str, collection_name: str) -> Optional[ShardLayout]:
+    data = safe_json_load(layout_path(persist_dir, collection_name), default=None)
+    return ShardLayout(**data) if data else None
+
+
+def write_layout(persist_dir: str, collection_name: str, layout: ShardLayout) -> None:
+    """Atomic: processes opened afterwards route through the new layout."""
+    os.makedirs(persist_dir, exist_ok=True)
+    safe_json_dump(layout_path(persist_dir, collection_name), layout.to_dict())
+
+
+class LongTermMemory(LongTermMemoryBase):
+    """
+    Chroma-backed semantic memory.
+    Stores:
+      - documents (raw or summarized memory text)
+      - embeddings
+      - metadata (user_id, ts, is_sensitive, expires_at, expires_at_ts, tags)
+    NOTE: Chroma metadata values must be scalar types (str/int/float/bool/None).
+
+    Expiry: expires_at_ts (epoch seconds) is filtered inside the Chroma `where`
+    clause, so queries never scan a user's memories in Python. Physical
+    deletion is done by sweep_expired() (see memory/expiry.py ExpirySweeper).
+    Records written before expires_at_ts existed are backfilled once per store,
+    before the first query (_ensure_expiry_metadata).
+
+    Keyword forgetting goes through a SQLite FTS5 index stored next to the
+    Chroma files (memory/keyword_index.py), kept in sync on every add/delete.
+
+    Sharding (ShardLayout): every per-user call is routed to the user's
+    collection by _col_for, so a user's queries, purges and wipes only touch
+    that collection. Existing stores are re-sharded with migration.reshard_ltm.
+
+    chromadb is imported and its clients opened on the first operation that
+    needs them, so constructing the store is cheap.
+    """
+
+    def __init__(
+        self,
+        persist_dir: str = "data/chroma",
+        collection_name: str = "ltm",
+        layout: Optional[ShardLayout] = None,
+    ) -> None:
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self.layout = layout or ShardLayout()
+        self._clients: Dict[str, Any] = {}
+        self._cols: Dict[str, Any] = {}
+        self._cols_lock = threading.RLock()
+        suffix = f"__{self.layout.tag}" if self.layout.tag else ""
+        super().__init__(os.path.join(persist_dir, f"keywords_{collection_name}{suffix}.sqlite3"))
+
+    # --- routing ---
+    @property
+    def client(self) -> Any:
+        return self._client(self.persist_dir)
+
+    def _client(self, path: str) -> Any:
+        with self._cols_lock:
+            client = self._clients.get(path)
+            if client is None:
+                import chromadb
+                from chromadb.config import Settings
+
+                client = self._clients[path] = chromadb.PersistentClient(
+                    path=path,
+                    settings=Settings(anonymized_telemetry=False),
+                )
+            return client
+
+    def _shard_prefix(self) -> str:
+        return f"{self.collection_name}__{'u' if self.layout.mode == 'user' else f'h{self.layout.count}_'}"
+
+    def _shard_name(self, user_id: str) -> str:
+        if self.layout.mode == "user":
+            return self._shard_prefix() + stable_hash_id(user_id)[:16]
+        return self._shard_prefix() + f"{int(stable_hash_id(user_id), 16) % self.layout.count:04d}"
+
+    def _shard_client(self, name: str) -> Any:
+        if not self.layout.separate_dirs:
+            return self.client
+        return self._client(os.path.join(self.persist_dir, "shards", name))
+
+    def _get_col(self, name: str, create: bool) -> Any:
+        with self._cols_lock:
+            col = self._cols.get(name)
+            if col is None:
+                client = self._shard_client(name)
+                if create:
+                    col = client.get_or_create_collection(name=name)
+                else:
+                    from chromadb.errors import NotFoundError
+
+                    try:
+                        col = client.get_collection(name=name)
+                    except (NotFoundError, ValueError):
+                        return None
+                self._cols[name] = col
+            return col
+
+    def _col_for(self, user_id: str, create: bool = False) -> Any:
+        """The user's collection; None when reading a shard that was never written."""
+        if self.layout.mode == "none":
+            return self._get_col(self.collection_name, create=True)
+        return self._get_col(self._shard_name(user_id), create)
+
+    def _all_cols(self) -> List[Any]:
+        if self.layout.mode == "none":
+            return [self._get_col(self.collection_name, create=True)]
+        if self.layout.mode == "hash":
+            names = [self._shard_prefix() + f"{i:04d}" for i in range(self.layout.count)]
+        elif self.layout.separate_dirs:
+            shard_dir = os.path.join(self.persist_dir, "shards")
+            names = os.listdir(shard_dir) if os.path.isdir(shard_dir) else []
+        else:
+            names = [getattr(c, "name", c) for c in self.client.list_collections()]
+        # exact shard names only: another model's collection ("ltm__u...") can share the prefix
+        suffix = "[0-9]{4}$" if self.layout.mode == "hash" else "[0-9a-f]{16}$"
+        shard = re.compile(re.escape(self._shard_prefix()) + suffix)
+        cols = [self._get_col(n, False) for n in sorted(names) if shard.match(n)]
+        return [c for c in cols if c is not None]
+
+    def _where(self, user_id: str, *clauses: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # a per-user collection needs no user filter; Chroma wants exactly one top-level operator
+        parts = list(clauses) if self.layout.mode == "user" else [{"user_id": user_id}, *clauses]
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else {"$and": parts}
+
+    # --- storage hooks ---
+    def _write(self, ids: List[str], docs: List[str], embs: List[Any], metas: List[Dict[str, Any]]) -> None:
+        by_user: Dict[str, List[int]] = {}
+        for i, m in enumerate(metas):
+            by_user.setdefault(m["user_id"], []).append(i)
+        # Chunks no larger than the client's max batch size.
+        step = self._max_batch_size()
+        for user_id, rows in by_user.items():
+            col = self._col_for(user_id, create=True)
+            for start in range(0, len(rows), step):
+                chunk = rows[start : start + step]
+                col.add(
+                    ids=[ids[i] for i in chunk],
+                    documents=[docs[i] for i in chunk],
+                    embeddings=[embs[i] for i in chunk],
+                    metadatas=[metas[i] for i in chunk],
+                )
+
+    def _max_batch_size(self) -> int:
+        try:
+            return int(self.client.get_max_batch_size())
+        except Exception:
+            return 5000
+
+    def _remove(self, ids: List[str], user_id: Optional[str] = None) -> None:
+        # without a user the owning shard is unknown; deleting absent ids is a no-op
+        cols = [self._col_for(user_id)] if user_id else self._all_cols()
+        for col in cols:
+            if col is not None:
+                col.delete(ids=ids)
+
+    def _update_metadata(self, ids: List[str], metas: List[Dict[str, Any]]) -> None:
+        by_user: Dict[str, List[int]] = {}
+        for i, m in enumerate(metas):
+            by_user.setdefault(m["user_id"], []).append(i)
+        for user_id, rows in by_user.items():
+            self._col_for(user_id, create=True).update(
+                ids=[ids[i] for i in rows], metadatas=[metas[i] for i in rows]
+            )
+
+    def _iter_pages(self, include: List[str], page_size: int = 1000, start: int = 0) -> Iterator[Dict[str, Any]]:
+        skip = start
+        for col in self._all_cols():
+            if skip:
+                n = col.count()
+                if skip >= n:
+                    skip -= n
+                    continue
+            offset, skip = skip, 0
+            while True:
+                res = col.get(include=include, limit=page_size, offset=offset)
+                ids = res.get("ids", [])
+                if not ids:
+                    break
+                yield res
+                offset += len(ids)
+
+    def _user_page(self, user_id: str, include: List[str]) -> Dict[str, Any]:
+        col = self._col_for(user_id)
+        if col is None:
+            return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        return col.get(where=self._where(user_id), include=include)
+
+    def _ids_for_user(self, user_id: str) -> List[str]:
+        col = self._col_for(user_id)
+        if col is None:
+            return []
+        return col.get(where=self._where(user_id), include=[]).get("ids", [])
+
+    def _user_vectors(self, user_id: str) -> Tuple[List[str], List[Dict[str, Any]], np.ndarray]:
+        col = self._col_for(user_id)
+        if col is None:
+            return [], [], np.zeros((0, 0), dtype=np.float32)
+        res = col.get(where=self._where(user_id), include=["embeddings", "metadatas"])
         ids = res.get("ids", [])
-        if ids:
-            self.col.delete(ids=ids)
-        return len(ids)
+        embs = res.get("embeddings")
+        mat = np.asarray(embs, dtype=np.float32) if ids else np.zeros((0, 0), dtype=np.float32)
+        return ids, [m or {} for m in res.get("metadatas", [])], mat
+
+    def wipe_user(self, user_id: str) -> int:
+        """With one collection per user this drops the collection instead of deleting record by record."""
+        if self.layout.mode != "user":
+            return super().wipe_user(user_id)
+        name = self._shard_name(user_id)
+        col = self._col_for(user_id)
+        if col is None:
+            return 0
+        n = col.count()
+        with self._writing([user_id]), self._cols_lock:
+            self._shard_client(name).delete_collection(name=name)
+            self._cols.pop(name, None)
+        self._bump(user_id)
+        self.keywords.delete_user(user_id)
+        self.lexical.delete_user(user_id)
+        self.profiles.invalidate(user_id)
+        return n
+
+    def drop_store(self) -> None:
+        """
+        Drops every collection of this layout and its keyword index (a shard
+        directory keeps its empty Chroma database, which the client holds
+        open). The layout file is removed only while it still names this
+        layout (after a re-shard it names the new one).
+        """
+        with self._cols_lock:
+            for col in self._all_cols():
+                name = col.name
+                self._shard_client(name).delete_collection(name=name)
+                self._cols.pop(name, None)
+        if read_layout(self.persist_dir, self.collection_name) == self.layout:
+            os.remove(layout_path(self.persist_dir, self.collection_name))
+        self._drop_keyword_index()
+
+    @timed("ltm.purge_expired")
+    def purge_expired(self, user_id: str) -> int:
+        """Deletes one user's expired memories; the expiry comparison runs inside Chroma."""
+        self._ensure_expiry_metadata()
+        col = self._col_for(user_id)
+        if col is None:
+            return 0
+        res = col.get(where=self._where(user_id, {"expires_at_ts": {"$lte": now_epoch()}}), include=[])
+        return self._delete_ids(res.get("ids", []), user_id)
 
+    def get_user_memories(self, user_id: str, limit: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        col = self._col_for(user_id)
+        if col is None:
+            return 0, []
+        total = len(self._ids_for_user(user_id))
+        res = col.get(where=self._where(user_id), include=["documents", "metadatas"], limit=limit)
+        items = [
+            _hit(mid, doc, meta or {}, None)
+            for mid, doc, meta in zip(res.get("ids", []), res.get("documents", []), res.get("metadatas", []))
+        ]
+        return total, items
+
+    def score_ids(
+        self,
+        user_id: str,
+        query_embedding: Any,
+        ids: List[str],
+        exclude_sensitive: bool = True,
+    ) -> List[Dict[str, Any]]:
+        col = self._col_for(user_id)
+        if not ids or col is None:
+            return []
+        res = col.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        now = now_epoch()
+        keep = [
+            i
+            for i, meta in enumerate(res.get("metadatas") or [])
+            if meta
+            and meta.get("user_id") == user_id
+            and meta.get("expires_at_ts", now + 1) > now
+            and not (exclude_sensitive and meta.get("is_sensitive"))
+        ]
+        if not keep:
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        mat = np.asarray([res["embeddings"][i] for i in keep], dtype=np.float32)
+        diff = mat - q
+        dists = np.einsum("ij,ij->i", diff, diff)
+        order = np.argsort(dists, kind="stable")
+        return [
+            _hit(res["ids"][keep[j]], res["documents"][keep[j]], res["metadatas"][keep[j]], float(dists[j]))
+            for j in order
+        ]
+
+    @timed("ltm.query")
     def query(
         self,
         user_id: str,
@@ -108,18 +879,20 @@ class LongTermMemory:
         Returns list of dicts with:
           id, text, distance, ts, tags (list), is_sensitive, expires_at
         """
-        self.purge_expired(user_id)
+        self._ensure_expiry_metadata()
+        now = now_epoch()
+        col = self._col_for(user_id)
+        if col is None:
+            return []
 
-        # Chroma requires exactly one top-level operator in `where`.
+        clauses: List[Dict[str, Any]] = [{"expires_at_ts": {"$gt": now}}]
         if exclude_sensitive:
-            where: Dict[str, Any] = {"$and": [{"user_id": user_id}, {"is_sensitive": False}]}
-        else:
-            where = {"user_id": user_id}
+            clauses.append({"is_sensitive": False})
 
-        res = self.col.query(
+        res = col.query(
             query_embeddings=[query_embedding],
             n_results=top_k,
-            where=where,
+            where=self._where(user_id, *clauses),
             include=["documents", "metadatas", "distances"],
         )
 
@@ -132,24 +905,107 @@ class LongTermMemory:
         for mid, doc, meta, dist in zip(ids, docs, metas, dists):
             if not meta:
                 continue
-            if "expires_at" in meta and is_expired(meta["expires_at"]):
+            if meta.get("expires_at_ts", now + 1) <= now:
                 continue
+            out.append(_hit(mid, doc, meta, dist))
 
-            raw_tags = meta.get("tags", "") or ""
-            tags_list = [t.strip() for t in raw_tags.split(",") if t.strip()]
+        return out
 
-            out.append(
-                {
-                    "id": mid,
-                    "text": doc,
-                    "distance": float(dist) if dist is not None else None,
-                    "ts": meta.get("ts"),
-                    "tags": tags_list,
-                    "is_sensitive": bool(meta.get("is_sensitive", False)),
-                    "expires_at": meta.get("expires_at"),
-                }
-            )
 
-        return out
+class AsyncLongTermMemory:
+    """
+    Awaitable facade over any LongTermMemoryBase: each call runs the
+    blocking backend operation on a worker thread, so an event loop can
+    overlap LTM I/O with other stages. `sync` is the wrapped backend.
+    """
+
+    def __init__(self, ltm: LongTermMemoryBase) -> None:
+        self.sync = ltm
+
+    async def add(self, **kwargs: Any) -> str:
+        return await asyncio.to_thread(lambda: self.sync.add(**kwargs))
+
+    async def add_many(self, records: List[Dict[str, Any]]) -> List[str]:
+        return await asyncio.to_thread(self.sync.add_many, records)
+
+    async def query(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(lambda: self.sync.query(**kwargs))
+
+    async def hybrid_query(self, **kwargs: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        return await asyncio.to_thread(lambda: self.sync.hybrid_query(**kwargs))
+
+    async def profile_centroids(self, user_id: str) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        return await asyncio.to_thread(self.sync.profile_centroids, user_id)
+
+    async def delete_by_id(self, memory_id: str) -> None:
+        await asyncio.to_thread(self.sync.delete_by_id, memory_id)
+
+    async def delete_by_keyword(self, user_id: str, keyword: str) -> int:
+        return await asyncio.to_thread(self.sync.delete_by_keyword, user_id, keyword)
+
+    async def wipe_user(self, user_id: str) -> int:
+        return await asyncio.to_thread(self.sync.wipe_user, user_id)
+
+    async def get_user_memories(self, user_id: str, limit: Optional[int] = None):
+        return await asyncio.to_thread(self.sync.get_user_memories, user_id, limit)
 
 
+LTM_BACKENDS = ("chroma", "numpy")
+
+
+def collection_name_for(embedding_model: str) -> str:
+    # Vectors from different embedding backends are not comparable (or even
+    # the same size), so each non-default backend gets its own collection.
+    return "ltm" if embedding_model == DEFAULT_EMBED_MODEL else f"ltm__{embedding_model}"
+
+
+def resolve_layout(
+    persist_dir: str, collection_name: str, shards: Optional[str] = None, shard_dirs: bool = False
+) -> ShardLayout:
+    """
+    The collection's persisted layout (none if it was never sharded). A
+    different requested layout is adopted only while the store is empty;
+    a store with data has to be moved first (migration.reshard_ltm).
+    """
+    current = read_layout(persist_dir, collection_name) or ShardLayout()
+    if shards is None:
+        return current
+    wanted = ShardLayout.parse(shards, shard_dirs)
+    if wanted == current:
+        return current
+    if any(col.count() for col in LongTermMemory(persist_dir, collection_name, current)._all_cols()):
+        raise ValueError(
+            f"LTM collection {collection_name} is sharded as {current.spec}"
+            f"{' (separate dirs)' if current.separate_dirs else ''}; "
+            f"run `python run.py reshard-ltm --ltm_shards {wanted.spec}` to move it"
+        )
+    write_layout(persist_dir, collection_name, wanted)
+    return wanted
+
+
+def open_long_term_memory(
+    backend: str = "chroma",
+    embedding_model: str = DEFAULT_EMBED_MODEL,
+    data_dir: str = "data",
+    shards: Optional[str] = None,
+    shard_dirs: bool = False,
+    **kwargs: Any,
+) -> LongTermMemoryBase:
+    """
+    backend:
+      chroma - persistent Chroma collection under <data_dir>/chroma, optionally
+               sharded (shards="user" | "hash:<N>", shard_dirs; see ShardLayout)
+      numpy  - per-user memory-mapped matrices under <data_dir>/vectors/<collection>
+               (kwargs: dtype="float32" | "float16", quantize=None | "int8", rerank=4)
+    """
+    collection = collection_name_for(embedding_model)
+    if backend == "numpy":
+        from .numpy_store import NumpyLongTermMemory
+
+        if shards not in (None, "none"):
+            raise ValueError("LTM sharding applies to the chroma backend; numpy already stores each user apart")
+        return NumpyLongTermMemory(os.path.join(data_dir, "vectors", collection), **kwargs)
+    if backend != "chroma":
+        raise ValueError(f"unknown LTM backend: {backend}")
+    persist_dir = os.path.join(data_dir, "chroma")
+    return LongTermMemory(persist_dir, collection, resolve_layout(persist_dir, collection, shards, shard_dirs))
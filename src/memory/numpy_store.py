@@ -0,0 +1,692 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..metrics import timed
+from ..utils import now_epoch
+from .long_term import LongTermMemoryBase, _hit, _with_expiry_ts
+from .quantization import QUANT_SCHEMES, QUANT_TRAIN_SIZE, ScalarQuantizer
+
+# Open shards kept per store. An open shard holds one or two memory maps
+# (vectors, codes), each pinning a file descriptor.
+MAX_OPEN_SHARDS = 256
+
+
+def _user_dir_name(user_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)[:40]
+    return f"{safe}-{hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:10]}"
+
+
+class _UserShard:
+    """
+    One user's memories.
+    Files (generation `g` is named in CURRENT, which is replaced atomically):
+      vectors.<g>.npy  - (capacity, dim) matrix, memory-mapped
+      norms.<g>.npy    - (capacity,) float32 squared norms, so opening a shard
+                         does not read the matrix
+      codes.<g>.npy    - (capacity, dim) int8 codes, memory-mapped; only with a quantizer
+      log.<g>.jsonl    - append-only ops: add / del / meta / coded; row i of the
+                         matrix belongs to the i-th add op
+    Deleted rows are tombstoned and dropped when the shard is compacted.
+    The log is opened per write, so an open shard only holds its memory maps;
+    close() releases them and marks the shard closed for good.
+    With a quantizer, search ranks on the codes and only reads the
+    full-precision rows of the over-fetched candidates. Rows [0, _coded) hold
+    codes of the quantizer with fingerprint _codes_fp: a "coded" op records a
+    bulk encode, and an add op carrying "q" extends that prefix by one row.
+    """
+
+    def __init__(self, path: str, user_id: str, dtype: np.dtype) -> None:
+        self.path = path
+        self.user_id = user_id
+        self.dtype = dtype
+        self.lock = threading.RLock()
+        self.gen = 0
+        self.n = 0
+        self.dead = 0
+        self.dim: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.ids: List[str] = []
+        self.docs: List[str] = []
+        self.metas: List[Dict[str, Any]] = []
+        self.row_of: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.sensitive = np.zeros(0, dtype=bool)
+        self.expires = np.zeros(0, dtype=np.float64)
+        self.sqnorm = np.zeros(0, dtype=np.float32)
+        self.quantizer: Optional[ScalarQuantizer] = None
+        self.rerank = 4
+        self.codes: Optional[np.ndarray] = None
+        self._coded = 0
+        self._codes_fp: Optional[str] = None
+        self.closed = False
+        self._load()
+
+    # --- files ---
+    def _vec_path(self, gen: int) -> str:
+        return os.path.join(self.path, f"vectors.{gen}.npy")
+
+    def _log_path(self, gen: int) -> str:
+        return os.path.join(self.path, f"log.{gen}.jsonl")
+
+    def _norms_path(self, gen: int) -> str:
+        return os.path.join(self.path, f"norms.{gen}.npy")
+
+    def _codes_path(self, gen: int) -> str:
+        return os.path.join(self.path, f"codes.{gen}.npy")
+
+    def _load(self) -> None:
+        cur = os.path.join(self.path, "CURRENT")
+        if not os.path.exists(cur):
+            return
+        with open(cur, "r", encoding="utf-8") as f:
+            self.gen = int(f.read().strip())
+        self.vectors = np.load(self._vec_path(self.gen), mmap_mode="r+")
+        self.dim = int(self.vectors.shape[1])
+        self._resize_state(self.vectors.shape[0])
+
+        with open(self._log_path(self.gen), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn final line from a crash; everything before it is intact
+                if op["op"] == "add":
+                    if op.get("q") is not None and op["q"] == self._codes_fp and self._coded == self.n:
+                        self._coded += 1
+                    self._append_row(op["id"], op["doc"], op["meta"])
+                elif op["op"] == "del":
+                    self._tombstone(op["ids"])
+                elif op["op"] == "meta":
+                    self._set_meta(op["id"], op["meta"])
+                elif op["op"] == "coded":
+                    self._codes_fp, self._coded = op["q"], int(op["n"])
+        if os.path.exists(self._norms_path(self.gen)):
+            self.sqnorm[: self.n] = np.load(self._norms_path(self.gen), mmap_mode="r")[: self.n]
+        else:
+            # generation written before norms were stored: compute them once
+            stored = self.vectors[: self.n].astype(np.float32)
+            self.sqnorm[: self.n] = np.einsum("ij,ij->i", stored, stored)
+            self._save_norms(self.gen, self.sqnorm)
+        if os.path.exists(self._codes_path(self.gen)):
+            self.codes = np.load(self._codes_path(self.gen), mmap_mode="r+")
+        else:
+            self._codes_fp, self._coded = None, 0
+
+    def _save_norms(self, gen: int, sqnorm: np.ndarray) -> None:
+        norms = np.lib.format.open_memmap(self._norms_path(gen), mode="w+", dtype=np.float32, shape=sqnorm.shape)
+        norms[:] = sqnorm
+        norms.flush()
+
+    def _write_norms(self, start: int, end: int) -> None:
+        norms = np.load(self._norms_path(self.gen), mmap_mode="r+")
+        norms[start:end] = self.sqnorm[start:end]
+        norms.flush()
+
+    def _write_log(self, ops: List[Dict[str, Any]]) -> None:
+        with open(self._log_path(self.gen), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+
+    def _rewrite(self, capacity: int) -> None:
+        """Compacts live rows into a new generation with the given capacity."""
+        assert self.dim is not None
+        live = np.flatnonzero(self.alive[: self.n])
+        gen = self.gen + 1
+        os.makedirs(self.path, exist_ok=True)
+
+        mat = np.lib.format.open_memmap(
+            self._vec_path(gen), mode="w+", dtype=self.dtype, shape=(capacity, self.dim)
+        )
+        if len(live) and self.vectors is not None:
+            mat[: len(live)] = self.vectors[live]
+        mat.flush()
+        sqnorm = np.zeros(capacity, dtype=np.float32)
+        sqnorm[: len(live)] = self.sqnorm[live]
+        self._save_norms(gen, sqnorm)
+        # live rows keep their order, so the coded prefix stays a prefix
+        coded = int(np.count_nonzero(live < self._coded)) if self.codes is not None else 0
+        codes = None
+        if coded:
+            codes = np.lib.format.open_memmap(
+                self._codes_path(gen), mode="w+", dtype=np.int8, shape=(capacity, self.dim)
+            )
+            codes[:coded] = self.codes[live[:coded]]
+            codes.flush()
+        with open(self._log_path(gen), "w", encoding="utf-8") as f:
+            for r in live:
+                op = {"op": "add", "id": self.ids[r], "doc": self.docs[r], "meta": self.metas[r]}
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            if coded:
+                f.write(json.dumps({"op": "coded", "q": self._codes_fp, "n": coded}) + "\n")
+
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(gen))
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+        ids, docs, metas = [self.ids[r] for r in live], [self.docs[r] for r in live], [self.metas[r] for r in live]
+        old = self.gen
+        self.gen, self.n, self.dead = gen, 0, 0
+        self.vectors, self.codes = mat, codes
+        for p in (self._vec_path(old), self._norms_path(old), self._codes_path(old), self._log_path(old)):
+            if os.path.exists(p):
+                os.remove(p)
+        self.ids, self.docs, self.metas, self.row_of = [], [], [], {}
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.sensitive = np.zeros(capacity, dtype=bool)
+        self.expires = np.zeros(capacity, dtype=np.float64)
+        self.sqnorm = sqnorm
+        for mid, doc, meta in zip(ids, docs, metas):
+            self._append_row(mid, doc, meta)
+        self._coded = coded
+        if not coded:
+            self._codes_fp = None
+
+    # --- in-memory state ---
+    def _resize_state(self, capacity: int) -> None:
+        def grow(a: np.ndarray) -> np.ndarray:
+            out = np.zeros(capacity, dtype=a.dtype)
+            out[: min(len(a), capacity)] = a[:capacity]
+            return out
+
+        self.alive, self.sensitive = grow(self.alive), grow(self.sensitive)
+        self.expires, self.sqnorm = grow(self.expires), grow(self.sqnorm)
+
+    def _append_row(self, mid: str, doc: str, meta: Dict[str, Any]) -> None:
+        r = self.n
+        self.ids.append(mid)
+        self.docs.append(doc)
+        self.metas.append(meta)
+        self.row_of[mid] = r
+        self.alive[r] = True
+        self._set_meta(mid, meta)
+        self.n += 1
+
+    def _set_meta(self, mid: str, meta: Dict[str, Any]) -> None:
+        r = self.row_of.get(mid)
+        if r is None:
+            return
+        self.metas[r] = meta
+        self.sensitive[r] = bool(meta.get("is_sensitive", False))
+        self.expires[r] = float(_with_expiry_ts(meta).get("expires_at_ts", np.inf))
+
+    def _tombstone(self, ids: List[str]) -> List[str]:
+        gone = []
+        for mid in ids:
+            r = self.row_of.pop(mid, None)
+            if r is not None and self.alive[r]:
+                self.alive[r] = False
+                self.dead += 1
+                gone.append(mid)
+        return gone
+
+    # --- operations ---
+    def add(self, ids: List[str], docs: List[str], embs: List[Any], metas: List[Dict[str, Any]]) -> None:
+        mat = np.asarray(embs, dtype=np.float32).reshape(len(ids), -1)
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(mat.shape[1])
+            if mat.shape[1] != self.dim:
+                raise ValueError(f"embedding dimension {mat.shape[1]} does not match store dimension {self.dim}")
+            capacity = 0 if self.vectors is None else self.vectors.shape[0]
+            if self.n + len(ids) > capacity:
+                self._rewrite(max(64, 2 * (self.n - self.dead + len(ids))))
+            assert self.vectors is not None
+            start, end = self.n, self.n + len(ids)
+            # Vectors, norms and codes land before the log line that makes them visible.
+            self.vectors[start:end] = mat.astype(self.dtype)
+            self.vectors.flush()
+            stored = self.vectors[start:end].astype(np.float32)
+            self.sqnorm[start:end] = np.einsum("ij,ij->i", stored, stored)
+            self._write_norms(start, end)
+            ops: List[Dict[str, Any]] = [
+                {"op": "add", "id": m, "doc": d, "meta": meta} for m, d, meta in zip(ids, docs, metas)
+            ]
+            q = self.quantizer
+            # extend the coded prefix; a shard with stale codes is re-encoded by _ensure_codes
+            coded = q is not None and q.fingerprint == self._codes_fp and self._coded == start
+            if coded:
+                assert q is not None
+                codes = self._open_codes()
+                codes[start:end] = q.encode(stored)
+                codes.flush()
+                for op in ops:
+                    op["q"] = q.fingerprint
+            self._write_log(ops)
+            for mid, doc, meta in zip(ids, docs, metas):
+                self._append_row(mid, doc, meta)
+            if coded:
+                self._coded = end
+
+    def remove(self, ids: List[str]) -> List[str]:
+        with self.lock:
+            gone = self._tombstone(ids)
+            if gone:
+                self._write_log([{"op": "del", "ids": gone}])
+                if self.dead > 64 and self.dead * 2 > self.n:
+                    self._rewrite(max(64, 2 * (self.n - self.dead)))
+            return gone
+
+    def update_meta(self, ids: List[str], metas: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            ops = []
+            for mid, meta in zip(ids, metas):
+                if mid in self.row_of:
+                    self._set_meta(mid, meta)
+                    ops.append({"op": "meta", "id": mid, "meta": meta})
+            if ops:
+                self._write_log(ops)
+
+    def set_quantizer(self, quantizer: Optional[ScalarQuantizer], rerank: int) -> None:
+        with self.lock:
+            self.quantizer, self.rerank = quantizer, rerank
+            if quantizer is None or quantizer.fingerprint != self._codes_fp:
+                self._codes_fp, self._coded = None, 0
+
+    def _open_codes(self) -> np.ndarray:
+        assert self.vectors is not None and self.dim is not None
+        if self.codes is None:
+            self.codes = np.lib.format.open_memmap(
+                self._codes_path(self.gen), mode="w+", dtype=np.int8, shape=(self.vectors.shape[0], self.dim)
+            )
+        return self.codes
+
+    def _ensure_codes(self) -> bool:
+        """
+        Encodes (and persists) rows not yet coded with the current quantizer;
+        after the first call this is a no-op, since add() encodes new rows.
+        False when the shard is not quantized.
+        """
+        if self.quantizer is None or self.vectors is None:
+            return False
+        if self._coded < self.n:
+            codes = self._open_codes()
+            for start in range(self._coded, self.n, 8192):
+                end = min(start + 8192, self.n)
+                codes[start:end] = self.quantizer.encode(self.vectors[start:end])
+            codes.flush()
+            self._write_log([{"op": "coded", "q": self.quantizer.fingerprint, "n": self.n}])
+            self._codes_fp, self._coded = self.quantizer.fingerprint, self.n
+        return True
+
+    def encode(self) -> None:
+        with self.lock:
+            self._ensure_codes()
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[: self.n])
+
+    def search(self, q: np.ndarray, top_k: int, exclude_sensitive: bool, now: float) -> List[Tuple[int, float]]:
+        """Exact top-k by squared L2: one matrix-vector product + argpartition."""
+        with self.lock:
+            n = self.n
+            if n == 0 or self.vectors is None or top_k <= 0:
+                return []
+            mask = self.alive[:n] & (self.expires[:n] > now)
+            if exclude_sensitive:
+                mask &= ~self.sensitive[:n]
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return []
+            k = min(top_k, len(rows))
+            if self._ensure_codes() and len(rows) > k * self.rerank:
+                # rank on the int8 codes, re-rank top_k * rerank candidates at full precision
+                assert self.quantizer is not None and self.codes is not None
+                codes = self.codes[:n] if len(rows) * 2 >= n else self.codes[rows]
+                approx = self.quantizer.dots(codes, q)
+                if len(rows) * 2 >= n:
+                    approx = approx[rows]
+                approx = self.sqnorm[rows] - 2.0 * approx
+                rows = rows[np.argpartition(approx, k * self.rerank - 1)[: k * self.rerank]]
+                dots = self._dots(rows, n, q)
+            else:
+                # Dense product when most rows qualify, gathered rows otherwise.
+                dots = self._dots(None, n, q)[rows] if len(rows) * 2 >= n else self._dots(rows, n, q)
+            dist = self.sqnorm[rows] + float(q @ q) - 2.0 * dots
+            part = np.argpartition(dist, k - 1)[:k]
+            order = part[np.argsort(dist[part], kind="stable")]
+            return [(int(rows[i]), float(max(dist[i], 0.0))) for i in order]
+
+    def score(self, q: np.ndarray, ids: List[str], exclude_sensitive: bool, now: float) -> List[Tuple[int, float]]:
+        """Exact squared L2 for the given ids only, nearest first."""
+        with self.lock:
+            if self.vectors is None:
+                return []
+            rows = np.asarray([r for r in (self.row_of.get(m) for m in ids) if r is not None], dtype=np.int64)
+            if len(rows):
+                mask = self.alive[rows] & (self.expires[rows] > now)
+                if exclude_sensitive:
+                    mask &= ~self.sensitive[rows]
+                rows = rows[mask]
+            if len(rows) == 0:
+                return []
+            dist = self.sqnorm[rows] + float(q @ q) - 2.0 * self._dots(rows, self.n, q)
+            order = np.argsort(dist, kind="stable")
+            return [(int(rows[i]), float(max(dist[i], 0.0))) for i in order]
+
+    def _dots(self, rows: Optional[np.ndarray], n: int, q: np.ndarray) -> np.ndarray:
+        assert self.vectors is not None
+        if self.dtype == np.float32:
+            return self.vectors[:n] @ q if rows is None else self.vectors[rows] @ q
+        # float16 storage: upcast in blocks so the float32 copy stays small
+        idx = np.arange(n) if rows is None else rows
+        out = np.empty(len(idx), dtype=np.float32)
+        for start in range(0, len(idx), 8192):
+            blk = idx[start : start + 8192]
+            out[start : start + len(blk)] = self.vectors[blk].astype(np.float32) @ q
+        return out
+
+    def close(self) -> None:
+        with self.lock:
+            self.vectors, self.codes = None, None
+            self.closed = True
+
+
+class NumpyLongTermMemory(LongTermMemoryBase):
+    """
+    In-process vector store with the same surface as the Chroma LongTermMemory.
+    Each user has a memory-mapped float32 (or float16) matrix; query is exact
+    brute-force top-k, which for per-user corpora of a few thousand memories
+    is faster than the ANN round-trip and has perfect recall.
+    Layout: <persist_dir>/<user dir>/{USER, CURRENT, vectors.<g>.npy, log.<g>.jsonl}
+    At most max_open_shards shards are open at a time (LRU); scans over all
+    users (paging, expiry, training) load shards at the cold end of the LRU,
+    so they do not push out the users being served. Reads for a user without
+    a directory return empty results and do not create one.
+
+    quantize="int8": queries scan memory-mapped int8 codes (a quarter of
+    float32) and re-rank the best top_k * rerank rows from the float matrix,
+    which is otherwise not read. The per-dimension ranges are trained once per
+    collection (<persist_dir>/quantizer.npz) by train_quantizer(), i.e.
+    `run.py quantize`, never inside a write; until then queries are exact.
+    """
+
+    def __init__(
+        self,
+        persist_dir: str = "data/vectors/ltm",
+        dtype: str = "float32",
+        quantize: Optional[str] = None,
+        rerank: int = 4,
+        max_open_shards: int = MAX_OPEN_SHARDS,
+    ) -> None:
+        if quantize is not None and quantize not in QUANT_SCHEMES:
+            raise ValueError(f"unknown quantization: {quantize}")
+        os.makedirs(persist_dir, exist_ok=True)
+        self.persist_dir = persist_dir
+        self.dtype = np.dtype(dtype)
+        self.quantize = quantize
+        self.rerank = max(1, rerank)
+        self.max_open_shards = max(1, max_open_shards)
+        self._quantizer_path = os.path.join(persist_dir, "quantizer.npz")
+        self.quantizer = ScalarQuantizer.load(self._quantizer_path) if quantize else None
+        self._shards: "OrderedDict[str, _UserShard]" = OrderedDict()
+        self._lock = threading.Lock()
+        super().__init__(os.path.join(persist_dir, "keywords.sqlite3"))
+
+    # --- shards ---
+    def _user_path(self, user_id: str) -> str:
+        return os.path.join(self.persist_dir, _user_dir_name(user_id))
+
+    def _shard(self, user_id: str, create: bool = False, touch: bool = True) -> Optional[_UserShard]:
+        """
+        The user's open shard, loaded on a miss. None when the user has no
+        directory and create is False. touch=False leaves a cached shard where
+        it is in the LRU and puts a loaded one at the cold end.
+        Must not be called while holding a shard lock (eviction takes them).
+        """
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                if touch:
+                    self._shards.move_to_end(user_id)
+                return shard
+            path = self._user_path(user_id)
+            if not os.path.isdir(path):
+                if not create:
+                    return None
+                os.makedirs(path, exist_ok=True)
+                with open(os.path.join(path, "USER"), "w", encoding="utf-8") as f:
+                    f.write(user_id)
+            self._evict(self.max_open_shards - 1)
+            shard = _UserShard(path, user_id, self.dtype)
+            shard.set_quantizer(self.quantizer, self.rerank)
+            self._shards[user_id] = shard
+            if not touch:
+                self._shards.move_to_end(user_id, last=False)
+            return shard
+
+    def _evict(self, keep: int) -> None:
+        """Closes least recently used shards until at most `keep` are open; busy shards are skipped."""
+        for user_id, shard in list(self._shards.items()):
+            if len(self._shards) <= keep:
+                return
+            if shard.lock.acquire(blocking=False):
+                try:
+                    shard.close()
+                    del self._shards[user_id]
+                finally:
+                    shard.lock.release()
+
+    @contextmanager
+    def _locked(self, user_id: str, create: bool = False, touch: bool = True) -> Iterator[Optional[_UserShard]]:
+        """The user's shard with its lock held (None as for _shard)."""
+        while True:
+            shard = self._shard(user_id, create, touch)
+            if shard is None:
+                yield None
+                return
+            with shard.lock:
+                if not shard.closed:
+                    yield shard
+                    return
+            # evicted between the lookup and the lock: load it again
+
+    # --- quantization ---
+    def train_quantizer(self, sample_size: int = QUANT_TRAIN_SIZE, seed: int = 0) -> Optional[ScalarQuantizer]:
+        """
+        Fits the int8 ranges on a random sample of the collection's vectors,
+        saves them and encodes every shard (codes are persisted next to the
+        vectors). None when the store is empty.
+        """
+        rng = np.random.default_rng(seed)
+        parts = []
+        users = self._all_user_ids()
+        for user_id in users:
+            with self._locked(user_id, touch=False) as shard:
+                if shard is None:
+                    continue
+                rows = shard.live_rows()
+                if shard.vectors is None or not len(rows):
+                    continue
+                take = rng.choice(rows, size=min(len(rows), sample_size), replace=False)
+                parts.append(shard.vectors[np.sort(take)].astype(np.float32))
+        if not parts:
+            return None
+        sample = np.concatenate(parts)
+        if len(sample) > sample_size:
+            sample = sample[rng.choice(len(sample), size=sample_size, replace=False)]
+        quantizer = ScalarQuantizer.train(sample)
+        quantizer.save(self._quantizer_path)
+        self.quantizer = quantizer
+        for user_id in users:
+            with self._locked(user_id, touch=False) as shard:
+                if shard is not None:
+                    shard.set_quantizer(quantizer, self.rerank)
+                    shard.encode()
+        return quantizer
+
+    def _all_user_ids(self) -> List[str]:
+        users = []
+        for name in sorted(os.listdir(self.persist_dir)):
+            marker = os.path.join(self.persist_dir, name, "USER")
+            if os.path.isfile(marker):
+                with open(marker, "r", encoding="utf-8") as f:
+                    users.append(f.read())
+        return users
+
+    # --- storage hooks ---
+    def _write(self, ids: List[str], docs: List[str], embs: List[Any], metas: List[Dict[str, Any]]) -> None:
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metas):
+            groups.setdefault(meta["user_id"], []).append(i)
+        for user_id, idx in groups.items():
+            with self._locked(user_id, create=True) as shard:
+                assert shard is not None
+                shard.add(
+                    [ids[i] for i in idx], [docs[i] for i in idx], [embs[i] for i in idx], [metas[i] for i in idx]
+                )
+
+    def _remove(self, ids: List[str], user_id: Optional[str] = None) -> None:
+        # _delete_ids resolves owners through the keyword index, so a missing user is a bug
+        if not user_id:
+            raise ValueError("NumpyLongTermMemory._remove needs the user_id of the ids")
+        with self._locked(user_id) as shard:
+            if shard is not None:
+                shard.remove(ids)
+
+    def _update_metadata(self, ids: List[str], metas: List[Dict[str, Any]]) -> None:
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metas):
+            groups.setdefault(meta["user_id"], []).append(i)
+        for user_id, idx in groups.items():
+            with self._locked(user_id) as shard:
+                if shard is not None:
+                    shard.update_meta([ids[i] for i in idx], [metas[i] for i in idx])
+
+    def _iter_pages(self, include: List[str], page_size: int = 1000, start: int = 0) -> Iterator[Dict[str, Any]]:
+        skip = start
+        for user_id in self._all_user_ids():
+            with self._locked(user_id, touch=False) as shard:
+                if shard is None:
+                    continue
+                rows = shard.live_rows()
+                if skip >= len(rows):
+                    skip -= len(rows)
+                    continue
+                rows, skip = rows[skip:], 0
+                ids = [shard.ids[r] for r in rows]
+                docs = [shard.docs[r] for r in rows]
+                metas = [shard.metas[r] for r in rows]
+            for start in range(0, len(ids), page_size):
+                end = start + page_size
+                yield {"ids": ids[start:end], "documents": docs[start:end], "metadatas": metas[start:end]}
+
+    def _user_page(self, user_id: str, include: List[str]) -> Dict[str, Any]:
+        with self._locked(user_id) as shard:
+            if shard is None:
+                return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            rows = shard.live_rows()
+            page: Dict[str, Any] = {
+                "ids": [shard.ids[r] for r in rows],
+                "documents": [shard.docs[r] for r in rows],
+                "metadatas": [shard.metas[r] for r in rows],
+            }
+            if "embeddings" in include:
+                vecs = shard.vectors[rows].astype(np.float32) if shard.vectors is not None else []
+                page["embeddings"] = list(vecs)
+            return page
+
+    def _ids_for_user(self, user_id: str) -> List[str]:
+        with self._locked(user_id) as shard:
+            return [] if shard is None else [shard.ids[r] for r in shard.live_rows()]
+
+    def _user_vectors(self, user_id: str) -> Tuple[List[str], List[Dict[str, Any]], np.ndarray]:
+        with self._locked(user_id) as shard:
+            rows = np.zeros(0, dtype=np.int64) if shard is None else shard.live_rows()
+            if shard is None or shard.vectors is None or not len(rows):
+                return [], [], np.zeros((0, 0), dtype=np.float32)
+            mat = shard.vectors[rows].astype(np.float32)
+            return [shard.ids[r] for r in rows], [dict(shard.metas[r]) for r in rows], mat
+
+    def list_users(self) -> List[str]:
+        return self._all_user_ids()
+
+    # --- operations ---
+    def wipe_user(self, user_id: str) -> int:
+        """Drops the user's directory outright."""
+        n = 0
+        with self._writing([user_id]), self._lock:
+            path = self._user_path(user_id)
+            shard = self._shards.pop(user_id, None)
+            if shard is None and os.path.isdir(path):
+                shard = _UserShard(path, user_id, self.dtype)
+            if shard is not None:
+                with shard.lock:
+                    n = len(shard.live_rows())
+                    shard.close()
+            shutil.rmtree(path, ignore_errors=True)
+        self._bump(user_id)
+        self.keywords.delete_user(user_id)
+        self.lexical.delete_user(user_id)
+        self.profiles.invalidate(user_id)
+        return n
+
+    def drop_store(self) -> None:
+        with self._lock:
+            for shard in self._shards.values():
+                shard.close()
+            self._shards.clear()
+        self._drop_keyword_index()
+        shutil.rmtree(self.persist_dir, ignore_errors=True)
+
+    @timed("ltm.purge_expired")
+    def purge_expired(self, user_id: str) -> int:
+        with self._locked(user_id) as shard:
+            if shard is None:
+                return 0
+            n = shard.n
+            rows = np.flatnonzero(shard.alive[:n] & (shard.expires[:n] <= now_epoch()))
+            ids = [shard.ids[r] for r in rows]
+        return self._delete_ids(ids, user_id)
+
+    @timed("ltm.query")
+    def query(
+        self,
+        user_id: str,
+        query_embedding: list[float],
+        top_k: int = 5,
+        exclude_sensitive: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Same result shape as LongTermMemory.query."""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        # rows are only meaningful under the lock: a compaction renumbers them
+        with self._locked(user_id) as shard:
+            if shard is None:
+                return []
+            if shard.dim is not None and q.shape[0] != shard.dim:
+                raise ValueError(f"query dimension {q.shape[0]} does not match store dimension {shard.dim}")
+            found = shard.search(q, top_k, exclude_sensitive, now_epoch())
+            return [_hit(shard.ids[r], shard.docs[r], shard.metas[r], d) for r, d in found]
+
+    def score_ids(
+        self,
+        user_id: str,
+        query_embedding: Any,
+        ids: List[str],
+        exclude_sensitive: bool = True,
+    ) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        with self._locked(user_id) as shard:
+            if shard is None:
+                return []
+            found = shard.score(np.asarray(query_embedding, dtype=np.float32), ids, exclude_sensitive, now_epoch())
+            return [_hit(shard.ids[r], shard.docs[r], shard.metas[r], d) for r, d in found]
+
+    def get_user_memories(self, user_id: str, limit: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        with self._locked(user_id) as shard:
+            if shard is None:
+                return 0, []
+            rows = shard.live_rows()
+            items = [_hit(shard.ids[r], shard.docs[r], shard.metas[r], None) for r in rows[:limit]]
+        return len(rows), items
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+
+# Centroids kept per user; a new one is opened only while below this.
+MAX_CENTROIDS = 8
+# A memory joins its nearest centroid at or above this cosine similarity.
+JOIN_THRESHOLD = 0.5
+
+
+class _UserCentroids:
+    __slots__ = ("sums", "counts")
+
+    def __init__(self, dim: int) -> None:
+        self.sums = np.zeros((0, dim), dtype=np.float32)  # per-centroid sum of unit vectors
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, vectors: np.ndarray, max_centroids: int, join: float) -> None:
+        for v in _unit(vectors):
+            if len(self.counts):
+                sims = _unit(self.sums) @ v
+                j = int(np.argmax(sims))
+                if sims[j] >= join or len(self.counts) >= max_centroids:
+                    self.sums[j] += v
+                    self.counts[j] += 1
+                    continue
+            self.sums = np.vstack([self.sums, v[None, :]])
+            self.counts = np.append(self.counts, 1)
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        mean = _unit(self.sums.sum(axis=0)) if len(self.counts) else None
+        return _unit(self.sums), self.counts.copy(), mean
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms == 0, 1.0, norms)
+
+
+class ProfileVectors:
+    """
+    Per-user centroids of the stored LTM embeddings: a running profile of what
+    each user has told us, used to skip LTM queries that are far from all of
+    it (retrieval.set_ltm_gate). Built from the store on first use (loader),
+    then updated incrementally on every add; a delete drops the user's entry
+    so it is rebuilt on the next use (the deleted vectors are not at hand).
+    Centroids are formed greedily: a memory joins its nearest centroid when
+    cosine >= join, otherwise opens a new one, up to max_centroids.
+    At most `max_users` users are kept (LRU).
+    """
+
+    def __init__(
+        self, max_users: int = 10_000, max_centroids: int = MAX_CENTROIDS, join: float = JOIN_THRESHOLD
+    ) -> None:
+        self.max_users = max_users
+        self.max_centroids = max_centroids
+        self.join = join
+        self._users: "OrderedDict[str, _UserCentroids]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        user_id: str,
+        loader: Callable[[], np.ndarray],
+        is_current: Callable[[], bool] = lambda: True,
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        (unit centroids k x d, member counts, unit mean of all members) for the
+        user; k == 0 and mean None when nothing is stored. A freshly loaded state is cached only if is_current() still
+        holds afterwards (no write landed during the load).
+        """
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None:
+                self._users.move_to_end(user_id)
+                return state.snapshot()
+        mat = np.asarray(loader(), dtype=np.float32)
+        state = _UserCentroids(mat.shape[1] if mat.ndim == 2 else 0)
+        if len(mat):
+            state.add(mat, self.max_centroids, self.join)
+        with self._lock:
+            if user_id not in self._users and is_current():
+                self._users[user_id] = state
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+        return state.snapshot()
+
+    def add(self, user_id: str, vectors: Any) -> None:
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                return
+            mat = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+            if not len(state.counts):
+                state.sums = np.zeros((0, mat.shape[1]), dtype=np.float32)
+            elif state.sums.shape[1] != mat.shape[1]:
+                del self._users[user_id]
+                return
+            state.add(mat, self.max_centroids, self.join)
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Forget one user's centroids (None: every user's)."""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
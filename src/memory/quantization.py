@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Optional
+
+import numpy as np
+
+# Vectors sampled from a collection to fit the per-dimension ranges.
+QUANT_TRAIN_SIZE = 4096
+QUANT_SCHEMES = ("int8",)
+
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantization with per-dimension ranges fitted on a sample of
+    the collection: x ~= offset + scale * code, code in [-128, 127].
+    Ranges are the 0.1/99.9 percentiles of the sample, so a few outliers do
+    not waste the 256 levels; values outside are clipped (the full-precision
+    re-rank absorbs that error).
+    """
+
+    def __init__(self, offset: np.ndarray, scale: np.ndarray) -> None:
+        self.offset = offset.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @property
+    def dim(self) -> int:
+        return int(self.offset.shape[0])
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the ranges; stored codes are only valid for the quantizer that wrote them."""
+        return hashlib.sha1(self.offset.tobytes() + self.scale.tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def train(cls, sample: np.ndarray, clip: float = 0.001) -> "ScalarQuantizer":
+        sample = np.asarray(sample, dtype=np.float32)
+        lo = np.quantile(sample, clip, axis=0)
+        hi = np.quantile(sample, 1.0 - clip, axis=0)
+        # a constant dimension still needs a non-zero step
+        scale = np.maximum(hi - lo, 1e-6) / 255.0
+        return cls(lo + 128.0 * scale, scale)
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(x, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.offset + codes.astype(np.float32) * self.scale
+
+    def dots(self, codes: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """Approximate q . x for every row of codes."""
+        qs = (q * self.scale).astype(np.float32)
+        out = np.empty(len(codes), dtype=np.float32)
+        # upcast through one small reused buffer (~1 MB) so it stays in cache
+        block = max(64, (1 << 18) // max(1, codes.shape[1]))
+        buf = np.empty((min(block, len(codes)), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), block):
+            end = min(start + block, len(codes))
+            b = buf[: end - start]
+            np.copyto(b, codes[start:end], casting="unsafe")
+            np.dot(b, qs, out=out[start:end])
+        return out + float(q @ self.offset)
+
+    # --- persistence ---
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, offset=self.offset, scale=self.scale)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ScalarQuantizer"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as f:
+            return cls(f["offset"], f["scale"])
@@ -1,18 +1,214 @@
 from __future__ import annotations
 
-from typing import List, Dict
-from ..utils import now_iso
+import atexit
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import weakref
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..utils import now_iso, redact_sensitive, truncate
+
+# Spill buffer is written out at this many messages or characters, whichever comes first.
+SPILL_FLUSH_MESSAGES = 32
+SPILL_FLUSH_CHARS = 1 << 16
+
+# Default for SessionMemory(spill=None); off, since the spill file is the conversation on disk.
+_SPILL = False
+_SPILL_ROOT: Optional[str] = None
+_SPILL_ROOT_LOCK = threading.Lock()
+
+
+def set_session_spill(enabled: bool) -> bool:
+    """
+    Sets the spill default. Called from the main thread, enabling it also
+    removes the spill directory on SIGTERM (atexit covers normal exits and Ctrl-C).
+    """
+    global _SPILL
+    _SPILL = bool(enabled)
+    if _SPILL and threading.current_thread() is threading.main_thread():
+        if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, _on_sigterm)
+    return _SPILL
+
+
+def spill_root() -> str:
+    """This process's spill directory: private (0700), created on first use, removed at exit."""
+    global _SPILL_ROOT
+    with _SPILL_ROOT_LOCK:
+        if _SPILL_ROOT is None:
+            _SPILL_ROOT = tempfile.mkdtemp(prefix=f"ds_sessions_{os.getpid()}_")
+            atexit.register(_remove_spill_root)
+        return _SPILL_ROOT
+
+
+def _remove_spill_root() -> None:
+    global _SPILL_ROOT
+    with _SPILL_ROOT_LOCK:
+        if _SPILL_ROOT is not None:
+            shutil.rmtree(_SPILL_ROOT, ignore_errors=True)
+            _SPILL_ROOT = None
+
+
+def _on_sigterm(signum: int, frame: Any) -> None:
+    _remove_spill_root()
+    # then die of the signal as before
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _summarize(messages: List[Dict], max_chars: int) -> Dict:
+    """Extractive summary of a compacted range: its size, time span and the start of each user message."""
+    said = "; ".join(truncate(m["content"].replace("\n", " "), 80) for m in messages if m["role"] == "user")
+    return {
+        "role": "summary",
+        "count": len(messages),
+        "from_ts": messages[0]["ts"],
+        "to_ts": messages[-1]["ts"],
+        "content": truncate(f"User said: {said}" if said else "", max_chars),
+    }
+
+
+def _merge_summaries(a: Dict, b: Dict, max_chars: int) -> Dict:
+    content = " ".join(c for c in (a["content"], b["content"]) if c)
+    return {
+        "role": "summary",
+        "count": a["count"] + b["count"],
+        "from_ts": a["from_ts"],
+        "to_ts": b["to_ts"],
+        "content": truncate(content, max_chars),
+    }
 
 
 class SessionMemory:
-    def __init__(self) -> None:
-        self._messages: List[Dict] = []
+    """
+    Messages of one conversation, in memory bounded by the settings, not by its length:
+      - the last `hot_size` messages are kept (get()), content capped at max_chars
+        (assistant replies echo the whole system prompt)
+      - older messages are compacted `compact_every` at a time into extractive
+        summaries (summaries()); past max_summaries the two oldest are merged
+      - with spill=True (default: set_session_spill) every message is also
+        appended, redacted, to a 0600 file in this process's 0700 spill_root();
+        history() streams it back. The file is deleted by clear(), close() or
+        garbage collection, and the directory at exit, so the session still
+        ends with the process
+    """
+
+    def __init__(
+        self,
+        hot_size: int = 50,
+        compact_every: int = 20,
+        max_summaries: int = 10,
+        max_chars: int = 2000,
+        summary_chars: int = 600,
+        spill: Optional[bool] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        self.hot_size = hot_size
+        self.compact_every = compact_every
+        self.max_summaries = max_summaries
+        self.max_chars = max_chars
+        self.summary_chars = summary_chars
+        self.spill = _SPILL if spill is None else spill
+        self.spill_dir = spill_dir
+        self._hot: deque = deque()
+        self._pending: List[Dict] = []  # left the hot window, not yet compacted
+        self._summaries: deque = deque()
+        self._spill_path: Optional[str] = None
+        self._spill_buf: List[str] = []
+        self._spill_chars = 0
+        self._finalizer: Optional[weakref.finalize] = None
+        self.total = 0
 
-    def add(self, role: str, content: str) -> None:
-        self._messages.append({"role": role, "content": content, "ts": now_iso()})
+    def add(self, role: str, content: str, redacted: Optional[str] = None) -> None:
+        """
+        redacted: the text to spill (e.g. redact_if_needed under the user's
+        privacy settings); without it the content is redacted with the default
+        keywords. Only redacted text reaches the disk.
+        """
+        ts = now_iso()
+        self.total += 1
+        if self.spill:
+            text = redacted if redacted is not None else redact_sensitive(content)
+            line = json.dumps({"role": role, "content": text, "ts": ts}, ensure_ascii=False)
+            self._spill_buf.append(line)
+            self._spill_chars += len(line)
+            if len(self._spill_buf) >= SPILL_FLUSH_MESSAGES or self._spill_chars >= SPILL_FLUSH_CHARS:
+                self.flush()
+
+        self._hot.append({"role": role, "content": truncate(content, self.max_chars), "ts": ts})
+        if len(self._hot) > self.hot_size:
+            self._pending.append(self._hot.popleft())
+            if len(self._pending) >= self.compact_every:
+                self._summaries.append(_summarize(self._pending, self.summary_chars))
+                self._pending = []
+                if len(self._summaries) > self.max_summaries:
+                    oldest = self._summaries.popleft()
+                    self._summaries[0] = _merge_summaries(oldest, self._summaries[0], self.summary_chars)
 
     def get(self) -> List[Dict]:
-        return list(self._messages)
+        """The hot window, oldest first."""
+        return list(self._hot)
+
+    def summaries(self) -> List[Dict]:
+        """Summaries of everything older than the hot window, oldest first."""
+        out = list(self._summaries)
+        if self._pending:
+            out.append(_summarize(self._pending, self.summary_chars))
+        return out
+
+    def history(self) -> Iterator[Dict]:
+        """
+        Every message of the session in order, read lazily from the spill file
+        (redacted). Without spill, only the messages still held in memory (pending + hot).
+        """
+        if not self.spill:
+            yield from list(self._pending) + list(self._hot)
+            return
+        self.flush()
+        if self._spill_path is None:
+            return
+        with open(self._spill_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def flush(self) -> None:
+        if not self._spill_buf:
+            return
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(
+                prefix="session_", suffix=".jsonl", dir=self.spill_dir or spill_root()
+            )
+            os.close(fd)
+            self._finalizer = weakref.finalize(self, _remove_file, self._spill_path)
+        with open(self._spill_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._spill_buf) + "\n")
+        self._spill_buf = []
+        self._spill_chars = 0
 
     def clear(self) -> None:
-        self._messages = []
+        self._hot.clear()
+        self._pending = []
+        self._summaries.clear()
+        self._spill_buf = []
+        self._spill_chars = 0
+        self.total = 0
+        self.close()
+
+    def close(self) -> None:
+        """Deletes the spill file."""
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+        self._spill_path = None
@@ -1,39 +1,150 @@
 from __future__ import annotations
 
-from typing import List, Dict, Callable, Optional
-from ..utils import now_iso, iso_in_minutes, is_expired
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Union
+
+
+class STMItem:
+    """
+    One short-term memory. `created` is wall-clock epoch seconds (for display),
+    `expires` is a time.monotonic() deadline (for decay, immune to clock changes).
+    Supports item["text"] / item.get("summary") so callers can treat it like the old dicts.
+    """
+
+    __slots__ = ("text", "summary", "tags", "created", "expires")
+
+    _KEYS = ("text", "summary", "tags", "ts", "expires_at")
+
+    def __init__(self, text: str, summary: str, tags: List[str], created: float, expires: float) -> None:
+        self.text = text
+        self.summary = summary
+        self.tags = tags
+        self.created = created
+        self.expires = expires
+
+    @property
+    def ts(self) -> str:
+        return datetime.fromtimestamp(self.created, timezone.utc).isoformat()
+
+    @property
+    def expires_at(self) -> str:
+        wall = time.time() + (self.expires - time.monotonic())
+        return datetime.fromtimestamp(wall, timezone.utc).isoformat()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self._KEYS else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self._KEYS}
+
+    def __repr__(self) -> str:
+        return f"STMItem({self.to_dict()!r})"
+
+
+class RecentView(Sequence):
+    """Read-only, newest-first view over the STM buffer. It is live: it reflects later adds/deletes."""
+
+    __slots__ = ("_buf",)
+
+    def __init__(self, buf: deque) -> None:
+        self._buf = buf
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            if (i.start or 0) >= 0 and (i.stop is None or i.stop >= 0) and (i.step or 1) > 0:
+                return list(islice(self._buf, i.start, i.stop, i.step))
+            return list(self._buf)[i]
+        return self._buf[i]
+
+    def __iter__(self) -> Iterator[STMItem]:
+        return iter(self._buf)
 
 
 class ShortTermMemory:
+    """
+    Fixed-size ring buffer of recent turns, newest on the left.
+    Every item shares the same TTL, so the oldest item always expires first:
+    decay() pops expired items off the right end and stops at the first live one.
+    """
+
     def __init__(self, max_items: int = 20, ttl_minutes: int = 240) -> None:
         self.max_items = max_items
         self.ttl_minutes = ttl_minutes
-        self._items: List[Dict] = []
-
-    def add(self, text: str, summary: str, tags: Optional[list[str]] = None) -> Dict:
-        item = {
-            "text": text,
-            "summary": summary,
-            "tags": tags or [],
-            "ts": now_iso(),
-            "expires_at": iso_in_minutes(self.ttl_minutes),
-        }
-        self._items.insert(0, item)
-        self._items = self._items[: self.max_items]
-        self.decay()
+        self._ttl = ttl_minutes * 60.0
+        self._items: deque[STMItem] = deque(maxlen=max_items)
+        self._view = RecentView(self._items)
+        # bumped on every change, so callers can cache work derived from the contents
+        self.version = 0
+
+    def add(self, text: str, summary: str, tags: Optional[list[str]] = None) -> STMItem:
+        now = time.monotonic()
+        item = STMItem(text, summary, tags or [], time.time(), now + self._ttl)
+        self._items.appendleft(item)
+        self.version += 1
+        self._decay(now)
         return item
 
+    def _decay(self, now: float) -> None:
+        items = self._items
+        while items and items[-1].expires <= now:
+            items.pop()
+            self.version += 1
+
     def decay(self) -> None:
-        self._items = [x for x in self._items if not is_expired(x["expires_at"])]
+        self._decay(time.monotonic())
 
-    def get_recent(self) -> List[Dict]:
+    def get_recent(self) -> Sequence[STMItem]:
         self.decay()
-        return list(self._items)
+        return self._view
 
-    def delete(self, predicate: Callable[[Dict], bool]) -> int:
-        before = len(self._items)
-        self._items = [x for x in self._items if not predicate(x)]
-        return before - len(self._items)
+    def delete(self, predicate: Callable[[STMItem], bool]) -> int:
+        kept = [x for x in self._items if not predicate(x)]
+        removed = len(self._items) - len(kept)
+        if removed:
+            self._items.clear()
+            self._items.extend(kept)
+            self.version += 1
+        return removed
+
+    def delete_latest(self) -> Optional[STMItem]:
+        self.decay()
+        if not self._items:
+            return None
+        self.version += 1
+        return self._items.popleft()
+
+    def delete_by_keyword(self, keyword: str) -> int:
+        kw = keyword.lower()
+        return self.delete(lambda x: kw in x.text.lower() or kw in x.summary.lower())
 
     def clear(self) -> None:
-        self._items = []
+        if self._items:
+            self._items.clear()
+            self.version += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# (max_items, ttl_minutes) per memory mode
+STM_SETTINGS = {
+    "no_memory": (0, 1),
+    "stm": (20, 240),
+    "stm_ltm": (20, 240),
+}
+
+
+def short_term_for_mode(memory_mode: str) -> ShortTermMemory:
+    max_items, ttl_minutes = STM_SETTINGS[memory_mode]
+    return ShortTermMemory(max_items=max_items, ttl_minutes=ttl_minutes)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Upper bounds in seconds; the last bucket is +Inf.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_enabled = os.getenv("DS_METRICS", "1").strip().lower() not in ("0", "false", "off", "no")
+# Per-turn span collector (see collect_spans); a ContextVar so it follows asyncio tasks and to_thread.
+_current: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("ds_spans", default=None)
+
+
+def metrics_enabled() -> bool:
+    return _enabled
+
+
+def set_metrics_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = bool(enabled)
+
+
+# Samples kept per histogram for quantiles; exact up to this many observations.
+RESERVOIR_SIZE = 2048
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram (Prometheus style), plus a bounded
+    uniform sample of the observations (reservoir sampling) that quantile()
+    reads: bucket bounds are 2-2.5x apart, so tail quantiles estimated from
+    the buckets land near a bucket's upper bound. Thread-safe.
+    """
+
+    def __init__(
+        self, name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, reservoir_size: int = RESERVOIR_SIZE
+    ) -> None:
+        self.name = name
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.reservoir_size = reservoir_size
+        self._samples: List[float] = []
+        self._rng = random.Random(0)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+            if len(self._samples) < self.reservoir_size:
+                self._samples.append(seconds)
+            else:
+                j = self._rng.randrange(self.count)
+                if j < self.reservoir_size:
+                    self._samples[j] = seconds
+
+    def snapshot(self) -> Tuple[List[int], int, float, float]:
+        with self._lock:
+            return list(self._counts), self.count, self.sum, self.max
+
+    def quantile(self, q: float) -> float:
+        """
+        In seconds, from the sample (linear between the closest ranks); exact
+        while count <= reservoir_size, a uniform-sample estimate after that.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        pos = q * (len(samples) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(samples) - 1)
+        return samples[lo] + (samples[hi] - samples[lo]) * (pos - lo)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        h = self._histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self._histograms.setdefault(name, Histogram(name))
+        return h
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.histogram(name).observe(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: count, mean/p50/p95/p99/max in milliseconds."""
+        out: Dict[str, Dict[str, float]] = {}
+        for name, h in sorted(self._histograms.items()):
+            _, count, total, mx = h.snapshot()
+            out[name] = {
+                "count": count,
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "p50_ms": round(h.quantile(0.50) * 1000, 3),
+                "p95_ms": round(h.quantile(0.95) * 1000, 3),
+                "p99_ms": round(h.quantile(0.99) * 1000, 3),
+                "max_ms": round(mx * 1000, 3),
+            }
+        return out
+
+    def prometheus_text(self, metric: str = "digital_self_stage_duration_seconds") -> str:
+        lines = [
+            f"# HELP {metric} Wall time per pipeline stage.",
+            f"# TYPE {metric} histogram",
+        ]
+        for name, h in sorted(self._histograms.items()):
+            counts, count, total, _ = h.snapshot()
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            cumulative = 0
+            for upper, c in zip(h.buckets, counts):
+                cumulative += c
+                lines.append(f'{metric}_bucket{{stage="{label}",le="{upper:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{label}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{label}"}} {total:.9f}')
+            lines.append(f'{metric}_count{{stage="{label}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        REGISTRY.observe(self.name, elapsed)
+        spans = _current.get()
+        if spans is not None:
+            spans[self.name] = round(spans.get(self.name, 0.0) + elapsed * 1000, 3)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str) -> Any:
+    """
+    Times a block into the histogram `name` and into the current turn's
+    collector (if any). A shared no-op object when metrics are disabled.
+    """
+    return _Span(name) if _enabled else _NOOP
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator form of span()."""
+
+    def wrap(fn: F) -> F:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+
+        return inner  # type: ignore[return-value]
+
+    return wrap
+
+
+@contextmanager
+def collect_spans() -> Iterator[Dict[str, float]]:
+    """
+    Collects every span finished inside the block (ms, summed per name) into
+    the yielded dict; used for the per-turn timings in retrieval_log.
+    """
+    spans: Dict[str, float] = {}
+    token = _current.set(spans)
+    try:
+        yield spans
+    finally:
+        _current.reset(token)
+
+
+def metrics_summary() -> Dict[str, Dict[str, float]]:
+    return REGISTRY.summary()
+
+
+def prometheus_text() -> str:
+    return REGISTRY.prometheus_text()
@@ -0,0 +1,553 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .memory.long_term import (
+    LongTermMemory,
+    LongTermMemoryBase,
+    ShardLayout,
+    _with_expiry_ts,
+    layout_path,
+    write_layout,
+)
+from .utils import (
+    EmbeddingBackend,
+    get_embedding_backend,
+    make_embedding_backend,
+    now_epoch,
+    safe_json_dump,
+    safe_json_load,
+    set_embedding_backend,
+)
+
+# Written by a finished migration; run.py uses it as the default --embed_backend.
+ACTIVE_EMBEDDING_FILE = "active_embedding"
+
+
+def read_active_embedding(data_dir: str = "data") -> Optional[str]:
+    try:
+        with open(os.path.join(data_dir, ACTIVE_EMBEDDING_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def set_active_embedding(spec: str, data_dir: str = "data") -> None:
+    """Atomically switches the embedding backend spec new processes start with."""
+    path = os.path.join(data_dir, ACTIVE_EMBEDDING_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(spec + "\n")
+    os.replace(tmp, path)
+
+
+# fence path -> how deep the current thread is inside it (see WriteFence)
+_FENCES_HELD = threading.local()
+
+
+def _fences_held() -> Dict[str, int]:
+    if not hasattr(_FENCES_HELD, "depth"):
+        _FENCES_HELD.depth = {}
+    return _FENCES_HELD.depth
+
+
+class WriteFence:
+    """
+    Cross-process fence around LTM writes: flocks on <data_dir>/migrations/fence.
+    Every write to a store with a fence (LongTermMemoryBase.fence) holds it
+    shared (shared()); a migration's final catch-up and switch hold it
+    exclusively (exclusive()), so no process writes to the source in between.
+    A second lock (fence.gate) is passed through on the way in and held by
+    the exclusive side, so a steady stream of writes cannot starve it. Every
+    holder opens its own file, so threads do not share a lock, and a crashed
+    holder's lock is released by the kernel. A thread already inside the
+    fence (a turn, which holds it for its whole duration) passes through.
+
+    While a migration runs it keeps a change journal (<data_dir>/migrations/
+    changes): writers append the users they touched, under the shared fence,
+    so the migration only has to re-sync those users, not rescan the store.
+    """
+
+    def __init__(self, data_dir: str = "data") -> None:
+        self.path = os.path.abspath(os.path.join(data_dir, "migrations", "fence"))
+        self.journal = os.path.join(os.path.dirname(self.path), "changes")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def _lock(self, path: str, mode: int) -> int:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, mode)
+        return fd
+
+    @contextmanager
+    def _held(self) -> Iterator[None]:
+        held = _fences_held()
+        held[self.path] = held.get(self.path, 0) + 1
+        try:
+            yield
+        finally:
+            held[self.path] -= 1
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        if _fences_held().get(self.path):
+            with self._held():
+                yield
+            return
+        gate = self._lock(self.path + ".gate", fcntl.LOCK_SH)
+        try:
+            fd = self._lock(self.path, fcntl.LOCK_SH)
+        finally:
+            os.close(gate)
+        try:
+            with self._held():
+                yield
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        gate = self._lock(self.path + ".gate", fcntl.LOCK_EX)
+        try:
+            fd = self._lock(self.path, fcntl.LOCK_EX)
+            try:
+                with self._held():
+                    yield
+            finally:
+                os.close(fd)
+        finally:
+            os.close(gate)
+
+    # --- change journal ---
+    @contextmanager
+    def journaling(self) -> Iterator[None]:
+        open(self.journal, "a", encoding="utf-8").close()
+        try:
+            yield
+        finally:
+            if os.path.exists(self.journal):
+                os.remove(self.journal)
+
+    def record(self, user_ids: Iterable[str]) -> None:
+        """Journals the users a write touched; a no-op unless a migration is running. Call inside shared()."""
+        lines = "".join(json.dumps(u) + "\n" for u in set(user_ids))
+        if not lines:
+            return
+        try:
+            # never created here, so a write racing the end of a migration cannot leave a journal behind
+            fd = os.open(self.journal, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            return
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(lines)
+
+    def changes_since(self, pos: int) -> Tuple[Set[str], int]:
+        """Users journaled after byte offset `pos`, and the offset to continue from."""
+        try:
+            with open(self.journal, "rb") as f:
+                f.seek(pos)
+                data = f.read()
+        except FileNotFoundError:
+            return set(), pos
+        end = data.rfind(b"\n") + 1  # a line still being appended is read next time
+        return {json.loads(line) for line in data[:end].splitlines() if line}, pos + end
+
+
+class Cutover:
+    """
+    Lets a long-running process (serve, chat) follow migrate-embeddings and
+    reshard-ltm without a restart. Turns run inside turn(), which holds the
+    write fence shared and yields the LTM store to use. Both commands take
+    the fence exclusively for their final catch-up and the switch (rewriting
+    active_embedding or the layout file); the first turn after a switch sees
+    the file change, swaps in the new embedding backend and reopens the
+    store, so no turn writes to the old store after the final catch-up.
+    on_switch callbacks repoint background workers (sweeper, consolidator).
+    """
+
+    def __init__(
+        self,
+        ltm: LongTermMemoryBase,
+        reopen: Callable[[EmbeddingBackend], LongTermMemoryBase],
+        data_dir: str = "data",
+    ) -> None:
+        self.ltm = ltm
+        self.reopen = reopen
+        self.data_dir = data_dir
+        self.fence = WriteFence(data_dir)
+        # only a spec written after startup switches the backend, so an explicit --embed_backend stays in force
+        self._active = read_active_embedding(data_dir)
+        self._signature = self._files_signature()
+        self._listeners: List[Callable[[LongTermMemoryBase], None]] = []
+        self._lock = threading.Lock()
+
+    def _files_signature(self) -> Tuple[int, ...]:
+        paths = [os.path.join(self.data_dir, ACTIVE_EMBEDDING_FILE)]
+        if isinstance(self.ltm, LongTermMemory):
+            paths.append(layout_path(self.ltm.persist_dir, self.ltm.collection_name))
+        sig = []
+        for path in paths:
+            try:
+                sig.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                sig.append(0)
+        return tuple(sig)
+
+    def on_switch(self, fn: Callable[[LongTermMemoryBase], None]) -> None:
+        self._listeners.append(fn)
+
+    def poll(self) -> LongTermMemoryBase:
+        """The current store, switched first if a migration has cut over since the last call."""
+        if self._files_signature() == self._signature:
+            return self.ltm
+        with self._lock:
+            if self._files_signature() != self._signature:
+                backend = get_embedding_backend()
+                active = read_active_embedding(self.data_dir)
+                if active and active != self._active:
+                    backend = set_embedding_backend(make_embedding_backend(active))
+                    self._active = active
+                self.ltm = self.reopen(backend)
+                self._signature = self._files_signature()
+                for fn in self._listeners:
+                    fn(self.ltm)
+            return self.ltm
+
+    @contextmanager
+    def turn(self) -> Iterator[LongTermMemoryBase]:
+        with self.fence.shared():
+            yield self.poll()
+
+
+def checkpoint_path(source_model: str, target_model: str, data_dir: str = "data") -> str:
+    safe = lambda s: "".join(c if c.isalnum() or c in "-_." else "_" for c in s)  # noqa: E731
+    return os.path.join(data_dir, "migrations", f"{safe(source_model)}__to__{safe(target_model)}.json")
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads: at most `rate` texts per second (None = unlimited)."""
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self.rate = rate if rate and rate > 0 else None
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int) -> None:
+        if self.rate is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def _embed_with_retry(backend: EmbeddingBackend, texts: List[str], limiter: RateLimiter, retries: int) -> List[Any]:
+    for attempt in range(retries + 1):
+        limiter.acquire(len(texts))
+        try:
+            return backend.embed_batch(texts)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(min(30.0, 2.0**attempt))
+    return []
+
+
+def _copyable(doc: Optional[str], meta: Optional[Dict[str, Any]], now: float, need_text: bool) -> bool:
+    """What a copy carries over, and so what its verification expects: unexpired records, with text if re-embedded."""
+    return bool(meta) and bool(doc or not need_text) and (meta.get("expires_at_ts") or now + 1) > now
+
+
+def _copy_records(
+    source: LongTermMemoryBase,
+    target: LongTermMemoryBase,
+    state: Dict[str, Any],
+    checkpoint: str,
+    page_size: int,
+    include: List[str],
+    vectors: Callable[[List[Tuple[str, str, Dict[str, Any], Any]]], List[Any]],
+    on_page: Optional[Callable[[Dict[str, Any]], None]],
+    fence: Optional[WriteFence] = None,
+    on_cutover: Optional[Callable[[], None]] = None,
+    verify: Optional[Callable[[Optional[Set[str]]], Set[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Copy loop shared by migrate_embeddings and reshard_ltm: pages `include` of
+    the source, asks `vectors` for the embeddings of each page's
+    (id, doc, meta, stored embedding) records that the target lacks, and
+    writes them with import_records, checkpointing the offset after each page.
+    Records without text are copied only when `include` has the stored
+    embeddings (nothing to re-embed otherwise).
+    With a fence, the fence's change journal is kept from the start of the
+    copy: after one full catch-up pass, only the journaled users are re-synced,
+    a few times without the fence and once more under fence.exclusive(),
+    followed by on_cutover. Writers are therefore only held off for as long
+    as it takes to sync the users written to during the last pass.
+    verify(users) returns the users (None: all) whose copy differs from the
+    source; the full check runs before the fence and only the users written
+    to since are checked again under it. Any difference raises RuntimeError
+    before on_cutover.
+    """
+    if state.get("completed"):
+        return state
+    os.makedirs(os.path.dirname(checkpoint) or ".", exist_ok=True)
+    target._ensure_keyword_index()
+    with fence.journaling() if fence is not None else nullcontext():
+        need_text = "embeddings" not in include
+
+        def copy_page(page: Dict[str, Any]) -> int:
+            now = now_epoch()
+            present = target.keywords.existing(page["ids"])
+            embs = page.get("embeddings")
+            if embs is None:
+                embs = [None] * len(page["ids"])
+            todo = [
+                (mid, doc or "", meta, emb)
+                for mid, doc, meta, emb in zip(page["ids"], page.get("documents", []), page.get("metadatas", []), embs)
+                if mid not in present and _copyable(doc, meta, now, need_text)
+            ]
+            state["skipped_expired"] += sum(
+                1 for meta in page.get("metadatas", []) if meta and (meta.get("expires_at_ts") or now + 1) <= now
+            )
+            if not todo:
+                return 0
+            return target.import_records(
+                [mid for mid, _, _, _ in todo],
+                [doc for _, doc, _, _ in todo],
+                vectors(todo),
+                [meta for _, _, meta, _ in todo],
+            )
+
+        if state["phase"] == "copy":
+            for page in source._iter_pages(include, page_size, start=state["offset"]):
+                state["migrated"] += copy_page(page)
+                state["offset"] += len(page["ids"])
+                safe_json_dump(checkpoint, state)
+                if on_page:
+                    on_page(state)
+            state["phase"] = "catch_up"
+            safe_json_dump(checkpoint, state)
+
+        def catch_up() -> bool:
+            """One id-level pass: copies what the target lacks, drops what the source no longer has."""
+            source_ids: set = set()
+            added = 0
+            for page in source._iter_pages(include, page_size):
+                source_ids.update(page["ids"])
+                added += copy_page(page)
+            stale = [mid for page in target._iter_pages([], page_size) for mid in page["ids"] if mid not in source_ids]
+            target._delete_ids(stale)
+            state["migrated"] += added
+            return bool(added or stale)
+
+        def sync_users(users: Iterable[str]) -> None:
+            """Makes the target match the source for these users: new records, deletions and metadata changes."""
+            for user_id in users:
+                page = source._user_page(user_id, include)
+                live = {mid: meta for mid, meta in zip(page["ids"], page.get("metadatas", [])) if meta}
+                old = target._user_page(user_id, ["metadatas"])
+                target._delete_ids([mid for mid in old["ids"] if mid not in live], user_id)
+                changed = [
+                    (mid, _with_expiry_ts(live[mid]))
+                    for mid, meta in zip(old["ids"], old.get("metadatas", []))
+                    if mid in live and _with_expiry_ts(live[mid]) != (meta or {})
+                ]
+                if changed:
+                    target._update_metadata([mid for mid, _ in changed], [meta for _, meta in changed])
+                state["migrated"] += copy_page(page)
+
+        if fence is None:
+            # offsets shift when the source deletes during the copy: full id-level passes close the gap
+            for _ in range(3):
+                if not catch_up():
+                    break
+            catch_up()
+        else:
+            # one full pass for records the offset paging skipped, then only what writers journaled
+            catch_up()
+            pos = 0
+            for _ in range(3):
+                users, pos = fence.changes_since(pos)
+                if not users:
+                    break
+                sync_users(users)
+
+        failed: Set[str] = set()
+        if verify is not None and fence is not None:
+            failed = verify(None)
+        with fence.exclusive() if fence is not None else nullcontext():
+            if fence is not None:
+                users = fence.changes_since(pos)[0]
+                sync_users(users)
+                if verify is not None:
+                    # a user written to during the full check may have differed only for the moment
+                    failed = (failed - users) | verify(users)
+            elif verify is not None:
+                failed = verify(None)
+            if failed:
+                raise RuntimeError(
+                    f"copy verification failed for {len(failed)} users: {', '.join(sorted(failed)[:5])}"
+                )
+            target.keywords.mark_built()
+            if on_cutover:
+                on_cutover()
+            state["completed"] = True
+            state["completed_at"] = time.time()
+            safe_json_dump(checkpoint, state)
+        return state
+
+
+def _load_state(checkpoint: str, target: str) -> Dict[str, Any]:
+    state: Dict[str, Any] = safe_json_load(checkpoint, default=None) or {}
+    if state.get("target") != target:
+        state = {"target": target, "offset": 0, "migrated": 0, "skipped_expired": 0, "phase": "copy"}
+    return state
+
+
+def migrate_embeddings(
+    source: LongTermMemoryBase,
+    target: LongTermMemoryBase,
+    backend: EmbeddingBackend,
+    checkpoint: str,
+    page_size: int = 1024,
+    batch_size: int = 256,
+    workers: int = 4,
+    rate: Optional[float] = None,
+    retries: int = 3,
+    on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+    fence: Optional[WriteFence] = None,
+    on_cutover: Optional[Callable[[], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Re-embeds every unexpired LTM record of `source` with `backend` into `target`,
+    keeping ids and metadata.
+      - source is streamed in pages; each page is split into batch_size
+        batches embedded concurrently by `workers` threads, throttled to
+        `rate` texts/second overall
+      - after each page the source offset is saved to `checkpoint`, so a
+        rerun resumes there; target writes skip ids it already has
+      - catch-up passes then copy records written to the source while the
+        migration ran and drop target records deleted from the source; the
+        last one runs under the write fence, followed by on_cutover (the
+        switch, e.g. set_active_embedding), so running processes that turn
+        through Cutover move to the target with nothing left behind
+    Returns the checkpoint state ("completed": True once done). The source
+    is left in place; drop it (source.drop_store()) once no process reads it.
+    """
+    limiter = RateLimiter(rate)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="reembed") as pool:
+
+        def embed(todo: List[Tuple[str, str, Dict[str, Any], Any]]) -> List[Any]:
+            batches = [[doc for _, doc, _, _ in todo[i : i + batch_size]] for i in range(0, len(todo), batch_size)]
+            out: List[Any] = []
+            for vecs in pool.map(lambda texts: _embed_with_retry(backend, texts, limiter, retries), batches):
+                out.extend(np.asarray(v, dtype=np.float32) for v in vecs)
+            return out
+
+        return _copy_records(
+            source,
+            target,
+            _load_state(checkpoint, backend.name),
+            checkpoint,
+            page_size,
+            ["documents", "metadatas"],
+            embed,
+            on_page,
+            fence,
+            on_cutover,
+        )
+
+
+def _layout_key(layout: ShardLayout) -> str:
+    return layout.spec + (" dirs" if layout.separate_dirs else "")
+
+
+def finished_reshards(collection: str, layout: ShardLayout, data_dir: str = "data") -> List[Tuple[str, ShardLayout]]:
+    """(checkpoint, source layout) of every completed re-shard of `collection` into `layout`."""
+    found = []
+    folder = os.path.join(data_dir, "migrations")
+    for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(folder, name)
+        state = safe_json_load(path, default=None) or {}
+        source = state.get("source") or {}
+        if not state.get("completed") or state.get("target") != _layout_key(layout):
+            continue
+        if source.get("collection") == collection:
+            found.append((path, ShardLayout(**source["layout"])))
+    return found
+
+
+def reshard_ltm(
+    source: LongTermMemory,
+    target: LongTermMemory,
+    checkpoint: str,
+    page_size: int = 1024,
+    on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+    fence: Optional[WriteFence] = None,
+) -> Dict[str, Any]:
+    """
+    Copies a Chroma LTM store into the same collection under another shard
+    layout, stored vectors included (nothing is re-embedded), with the same
+    checkpoint/resume and catch-up passes as migrate_embeddings. The source
+    keeps serving meanwhile. The copy is verified (every unexpired source id
+    is in the target, and the target has nothing else): in full before the
+    write fence, and for the users written to since under it. Then the new
+    layout is written, so processes that turn through Cutover, and processes
+    opened afterwards, route through it. A failed verification raises before
+    the switch. Once this returns, the source collections can be dropped
+    (source.drop_store()).
+    """
+
+    def pages(store: LongTermMemory, users: Optional[Set[str]]) -> Iterable[Dict[str, Any]]:
+        if users is None:
+            return store._iter_pages(["metadatas"], page_size)
+        return (store._user_page(u, ["metadatas"]) for u in users)
+
+    def verify(users: Optional[Set[str]]) -> Set[str]:
+        now = now_epoch()
+        known: Set[str] = set()
+        expected: Dict[str, str] = {}  # id -> user, for the records the copy carries over
+        for page in pages(source, users):
+            for mid, meta in zip(page["ids"], page.get("metadatas", [])):
+                known.add(mid)
+                if _copyable(None, meta, now, need_text=False):
+                    expected[mid] = meta["user_id"]
+        failed: Set[str] = set()
+        for page in pages(target, users):
+            for mid, meta in zip(page["ids"], page.get("metadatas", [])):
+                if mid not in known:
+                    failed.add((meta or {}).get("user_id", "?"))
+                expected.pop(mid, None)
+        return failed | set(expected.values())
+
+    def switch() -> None:
+        write_layout(target.persist_dir, target.collection_name, target.layout)
+
+    state = _load_state(checkpoint, _layout_key(target.layout))
+    # what reshard-ltm --drop_source deletes once every process has switched (see finished_reshards)
+    state.setdefault("source", {"collection": source.collection_name, "layout": source.layout.to_dict()})
+    return _copy_records(
+        source,
+        target,
+        state,
+        checkpoint,
+        page_size,
+        ["documents", "metadatas", "embeddings"],
+        lambda todo: [np.asarray(emb, dtype=np.float32) for _, _, _, emb in todo],
+        on_page,
+        fence,
+        switch,
+        verify,
+    )
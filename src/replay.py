@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .ingest import iter_jsonl
+
+# Set in each worker process by _init_worker.
+_WORKER: Dict[str, Any] = {}
+
+
+def user_bucket(user_id: str, buckets: int) -> int:
+    """Stable across processes and runs (unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest(), "big") % buckets
+
+
+def _turn_text(rec: Dict[str, Any]) -> str:
+    return str(rec.get("text") or rec.get("turn") or rec.get("content") or "").strip()
+
+
+def partition_turns(input_path: str, out_dir: str, buckets: int) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Streams the input once into `buckets` JSONL files by user, keeping each
+    user's turns in input order. Memory stays flat whatever the input size.
+    """
+    paths = [os.path.join(out_dir, f"bucket_{i:04d}.jsonl") for i in range(buckets)]
+    files = [open(p, "w", encoding="utf-8") for p in paths]
+    stats = {"read": 0, "skipped_invalid": 0}
+    try:
+        for rec in iter_jsonl(input_path):
+            stats["read"] += 1
+            user_id = str(rec.get("user_id") or "").strip()
+            text = _turn_text(rec)
+            if not user_id or not text:
+                stats["skipped_invalid"] += 1
+                continue
+            line = json.dumps({"user_id": user_id, "text": text}, ensure_ascii=False)
+            files[user_bucket(user_id, buckets)].write(line + "\n")
+    finally:
+        for f in files:
+            f.close()
+    return paths, stats
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    from .memory.long_term import open_long_term_memory
+    from .retrieval import set_ltm_gate, set_retrieval_mode
+    from .utils import configure_embedding_cache, set_embedding_backend
+
+    backend = set_embedding_backend(config["embed_backend"])
+    # spawned workers start from module defaults; carry over the parent's retrieval settings
+    set_retrieval_mode(config["retrieval_mode"])
+    set_ltm_gate(config["ltm_gate"])
+    # memory-only: several processes writing one SQLite cache would contend on its lock
+    configure_embedding_cache(path=None)
+    ltm = None
+    if config["memory_mode"] == "stm_ltm":
+        data_dir = os.path.join(config["scratch_dir"], f"worker_{os.getpid()}")
+        ltm = open_long_term_memory(config["ltm_backend"], embedding_model=backend.name, data_dir=data_dir)
+    store = None
+    if config.get("ds_db"):
+        from .digital_self_store import DigitalSelfStore
+
+        store = DigitalSelfStore(config["ds_db"], legacy_dir=None)  # read-only here; the parent writes
+    _WORKER.update(config=config, ltm=ltm, store=store)
+
+
+def _replay_bucket(paths: Tuple[str, str, str]) -> Dict[str, int]:
+    """Replays one bucket file user by user; writes turn records and final profiles to two files."""
+    from .agent import handle_turn
+    from .digital_self import DigitalSelf
+    from .memory.session import SessionMemory
+    from .memory.short_term import short_term_for_mode
+
+    bucket_path, out_path, profiles_path = paths
+    config, ltm, store = _WORKER["config"], _WORKER["ltm"], _WORKER["store"]
+    by_user: "OrderedDict[str, List[str]]" = OrderedDict()
+    with open(bucket_path, "r", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            by_user.setdefault(rec["user_id"], []).append(rec["text"])
+
+    stats = {"users": 0, "turns": 0}
+    with open(out_path, "w", encoding="utf-8") as out, open(profiles_path, "w", encoding="utf-8") as prof:
+        for user_id, turns in by_user.items():
+            ds = (store.get(user_id) if store is not None else None) or DigitalSelf(user_id=user_id)
+            # nothing reads a replayed session's full history back
+            session, stm = SessionMemory(spill=False), short_term_for_mode(config["memory_mode"])
+            for i, text in enumerate(turns):
+                res = handle_turn(text, ds, session, stm, ltm)
+                ds = res.get("digital_self", ds)
+                record = {
+                    "type": "turn",
+                    "user_id": user_id,
+                    "turn_index": i,
+                    "text": text,
+                    "handled_control": res.get("handled_control"),
+                    "control_output": res.get("control_output"),
+                    "reply": res.get("reply"),
+                    "stored_long_term_id": res.get("stored_long_term_id"),
+                    "sensitive": res.get("sensitive"),
+                    "retrieval_log": res.get("retrieval_log"),
+                }
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            profile = {"type": "profile", "user_id": user_id, "digital_self": ds.model_dump(mode="json")}
+            prof.write(json.dumps(profile, ensure_ascii=False) + "\n")
+            stats["users"] += 1
+            stats["turns"] += len(turns)
+    os.remove(bucket_path)
+    return stats
+
+
+def replay_transcripts(
+    input_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    embed_backend: str = "local",
+    memory_mode: str = "stm_ltm",
+    ltm_backend: str = "numpy",
+    profiles_from: Optional[str] = None,
+    on_profile: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_bucket: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Batch handle_turn over a JSONL of {"user_id", "text"} records on a process pool.
+      - users are hashed into workers * 8 buckets, so one user's turns stay in
+        order on one worker, and each bucket is replayed user by user
+      - each worker has its own LTM store in a scratch directory (discarded
+        afterwards; the live store is never written) and starts users from
+        a blank DigitalSelf, or from the profiles in `profiles_from` (a
+        DigitalSelfStore path, read-only)
+      - finished buckets are appended to output_path in bucket order: every
+        turn's output and retrieval log ("type": "turn"), then one final
+        profile per user of the bucket ("type": "profile")
+      - on_profile receives each final profile record in the parent process
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    scratch = tempfile.mkdtemp(prefix="replay_", dir=os.path.dirname(os.path.abspath(output_path)))
+    from .retrieval import get_ltm_gate, get_retrieval_mode
+
+    t0 = time.perf_counter()
+    try:
+        buckets, stats = partition_turns(input_path, scratch, workers * 8)
+        jobs = [(p, p[: -len(".jsonl")] + ".turns.jsonl", p[: -len(".jsonl")] + ".profiles.jsonl") for p in buckets]
+        config = {
+            "embed_backend": embed_backend,
+            "memory_mode": memory_mode,
+            "ltm_backend": ltm_backend,
+            "scratch_dir": scratch,
+            "ds_db": profiles_from,
+            "retrieval_mode": get_retrieval_mode(),
+            "ltm_gate": get_ltm_gate(),
+        }
+        stats.update(users=0, turns=0)
+        with open(output_path, "w", encoding="utf-8") as out:
+            with mp.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+                for (_, turns, profiles), bucket_stats in zip(jobs, pool.imap(_replay_bucket, jobs)):
+                    with open(turns, "r", encoding="utf-8") as f:
+                        shutil.copyfileobj(f, out)
+                    with open(profiles, "r", encoding="utf-8") as f:
+                        for line in f:
+                            out.write(line)
+                            if on_profile is not None:
+                                on_profile(json.loads(line))
+                    os.remove(turns)
+                    os.remove(profiles)
+                    stats["users"] += bucket_stats["users"]
+                    stats["turns"] += bucket_stats["turns"]
+                    if on_bucket is not None:
+                        on_bucket(stats)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    wall = time.perf_counter() - t0
+    stats.update(workers=workers, wall_s=round(wall, 3), turns_per_s=round(stats["turns"] / wall, 1) if wall else 0.0)
+    return stats
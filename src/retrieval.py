@@ -1,40 +1,249 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List, Optional
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 
-from .digital_self import DigitalSelf
-from .utils import embed_text, truncate
-from .memory.short_term import ShortTermMemory
-from .memory.long_term import LongTermMemory
+import numpy as np
+
+from .context import context_builder_for
+from .metrics import span
+from .digital_self import DigitalSelf, mark_changed
+from .utils import embed_text, aembed_text, now_epoch, iso_to_epoch
+from .memory.short_term import ShortTermMemory, STMItem
+from .memory.long_term import LongTermMemoryBase, AsyncLongTermMemory
 from .memory.session import SessionMemory
 
 
-MAX_DS_CHARS = 800
-MAX_STM_CHARS = 800
-MAX_LTM_CHARS = 1200
+# vector: ANN/exact search over all of the user's memories (LongTermMemoryBase.query)
+# hybrid: BM25 candidates, exact vector scoring of those only, rank fusion (hybrid_query)
+RETRIEVAL_MODES = ("vector", "hybrid")
+_RETRIEVAL_MODE = "vector"
+
+
+def set_retrieval_mode(mode: str) -> str:
+    global _RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"unknown retrieval mode: {mode}")
+    _RETRIEVAL_MODE = mode
+    return mode
+
+
+def get_retrieval_mode() -> str:
+    return _RETRIEVAL_MODE
+
+
+# Cosine similarity between the query and the user's nearest profile centroid
+# below which the LTM search is skipped; None always searches.
+_LTM_GATE: Optional[float] = None
+# ds.profile.embedding is rewritten only once the store's mean has drifted below this cosine from it,
+# so a turn that adds one memory does not dirty the profile section
+PROFILE_REFRESH_SIMILARITY = 0.995
+
+
+def set_ltm_gate(threshold: Optional[float]) -> Optional[float]:
+    global _LTM_GATE
+    if threshold is not None and not -1.0 <= threshold <= 1.0:
+        raise ValueError(f"LTM gate threshold must be a cosine similarity in [-1, 1]: {threshold}")
+    _LTM_GATE = threshold
+    return threshold
+
+
+def get_ltm_gate() -> Optional[float]:
+    return _LTM_GATE
+
+
+def _gate_ltm(
+    ds: DigitalSelf, centroids: np.ndarray, counts: np.ndarray, mean: Optional[np.ndarray], q_emb: Any
+) -> Dict[str, Any]:
+    """
+    Only called while the gate is enabled. Mirrors the store's profile vector
+    onto ds.profile once it has drifted (PROFILE_REFRESH_SIMILARITY), then
+    decides whether the LTM search can be skipped: the user has no memories,
+    or the query is less similar than the gate threshold to every centroid of them.
+    """
+    if _profile_drifted(ds.profile.embedding, mean):
+        ds.profile.embedding = [round(float(x), 5) for x in mean] if mean is not None else None
+        ds.profile.embedding_count = int(counts.sum())
+        mark_changed(ds, "profile.embedding")
+
+    log: Dict[str, Any] = {"enabled": True, "threshold": _LTM_GATE, "centroids": len(counts)}
+    q = np.asarray(q_emb, dtype=np.float32)
+    if len(counts) and centroids.shape[1] == q.shape[0]:
+        norm = float(np.linalg.norm(q))
+        log["max_similarity"] = round(float((centroids @ q).max()) / norm, 4) if norm else 0.0
+    if not len(counts):
+        log["skipped"], log["reason"] = True, "no stored memories"
+    else:
+        log["skipped"] = log.get("max_similarity", 1.0) < _LTM_GATE
+        if log["skipped"]:
+            log["reason"] = "query far from every profile centroid"
+    return log
+
+
+def _profile_drifted(stored: Optional[List[float]], mean: Optional[np.ndarray]) -> bool:
+    if stored is None or mean is None:
+        return (stored is None) != (mean is None)
+    old = np.asarray(stored, dtype=np.float32)
+    if old.shape != mean.shape:
+        return True
+    norm = float(np.linalg.norm(old))
+    return not norm or float(old @ mean) / norm < PROFILE_REFRESH_SIMILARITY
+
+
+class RetrievalCache:
+    """
+    Per-user cache of LTM query results, keyed by (quantized query embedding,
+    top_k, exclude_sensitive, retrieval mode). Each entry remembers the store
+    version it was computed at (LongTermMemoryBase.store_version); any write for the user
+    (add, delete, forget, wipe, expiry sweep) changes the version, so a
+    forgotten memory is never served from cache. Entries also lapse when the
+    earliest-expiring hit expires, before the sweeper has deleted it.
+    """
+
+    def __init__(self, max_users: int = 10_000, per_user: int = 16, quantum: float = 1e-3) -> None:
+        self.max_users = max_users
+        self.per_user = per_user
+        self.quantum = quantum
+        self._users: "OrderedDict[str, OrderedDict[Tuple, Tuple[Tuple[int, int], float, List[dict]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, query_embedding: Any, top_k: int, exclude_sensitive: bool, mode: str = "vector") -> Tuple:
+        # near-identical embeddings (resends, retries) round to the same bucket
+        q = np.rint(np.asarray(query_embedding, dtype=np.float32) / self.quantum).astype(np.int32)
+        return hashlib.blake2b(q.tobytes(), digest_size=16).digest(), top_k, exclude_sensitive, mode
+
+    def get(self, user_id: str, key: Tuple, version: Tuple[int, int]) -> Optional[List[dict]]:
+        with self._lock:
+            entries = self._users.get(user_id)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None or entry[0] != version or entry[1] <= now_epoch():
+                if entry is not None:
+                    del entries[key]
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return list(entry[2])
+
+    def put(self, user_id: str, key: Tuple, version: Tuple[int, int], hits: List[dict]) -> None:
+        valid_until = min(
+            (iso_to_epoch(h["expires_at"]) for h in hits if h.get("expires_at")),
+            default=float("inf"),
+        )
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                entries = self._users[user_id] = OrderedDict()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            # entries from older versions can never hit again
+            for k in [k for k, e in entries.items() if e[0] != version]:
+                del entries[k]
+            entries[key] = (version, valid_until, list(hits))
+            while len(entries) > self.per_user:
+                entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "users": len(self._users),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+_RETRIEVAL_CACHES: "weakref.WeakKeyDictionary[LongTermMemoryBase, RetrievalCache]" = weakref.WeakKeyDictionary()
+_CACHES_LOCK = threading.Lock()
+
+
+def retrieval_cache_for(ltm: LongTermMemoryBase) -> RetrievalCache:
+    """One cache per LTM store."""
+    with _CACHES_LOCK:
+        cache = _RETRIEVAL_CACHES.get(ltm)
+        if cache is None:
+            cache = _RETRIEVAL_CACHES[ltm] = RetrievalCache()
+        return cache
 
 
-def _format_digital_self(ds: DigitalSelf) -> str:
-    stable = ds.stable.model_dump()
-    dynamic = ds.dynamic.model_dump()
-    return f"STABLE: {stable}\nDYNAMIC: {dynamic}\n"
+def _cache_lookup(
+    cache: Optional[RetrievalCache],
+    ltm: LongTermMemoryBase,
+    user_id: str,
+    q_emb: Any,
+    top_k: int,
+    mode: str,
+) -> Tuple[Optional[Tuple], Optional[Tuple[int, int]], Optional[List[dict]]]:
+    if cache is None:
+        return None, None, None
+    key = cache.key(q_emb, top_k, True, mode)
+    # read the version before querying: a write that lands mid-query makes this entry stale
+    version = ltm.store_version(user_id)
+    return key, version, cache.get(user_id, key, version)
 
 
-def _format_short_term(items: List[dict]) -> str:
-    lines = []
-    for it in items[:8]:
-        summ = it.get("summary") or ""
-        tags = it.get("tags") or []
-        lines.append(f"- {summ} (tags={tags})")
-    return "\n".join(lines)
+def _cache_log(cache: Optional[RetrievalCache], hit: Optional[bool]) -> Dict[str, Any]:
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "hit": hit, **cache.stats()}
 
 
-def _format_long_term(memories: List[dict]) -> str:
-    lines = []
-    for m in memories:
-        preview = truncate(m["text"], 220)
-        lines.append(f"- {preview} (dist={m.get('distance')}, ts={m.get('ts')}, tags={m.get('tags')})")
-    return "\n".join(lines)
+# The sync and async builders share every step but the store calls:
+# _ltm_lookup (cache) -> LTM query if it returned no hits -> _ltm_fill -> _assemble_package.
+
+
+def _ltm_lookup(
+    ds: DigitalSelf,
+    ltm: Optional[LongTermMemoryBase],
+    gate_log: Dict[str, Any],
+    q_emb: Any,
+    top_k: int,
+    mode: str,
+    use_cache: bool,
+) -> Tuple[Optional[RetrievalCache], Optional[Tuple], Optional[Tuple[int, int]], Optional[List[dict]], Optional[bool]]:
+    """
+    (cache, key, version, hits, cache_hit). hits is None when the store has to
+    be queried; without LTM, or when the gate skipped it, it is [].
+    """
+    cache = retrieval_cache_for(ltm) if ltm is not None and use_cache else None
+    if ltm is None or gate_log["skipped"]:
+        return cache, None, None, [], None
+    with span("retrieval.cache"):
+        key, version, cached = _cache_lookup(cache, ltm, ds.user_id, q_emb, top_k, mode)
+    return cache, key, version, cached, cached is not None if cache is not None else None
+
+
+def _search_kwargs(ds: DigitalSelf, user_query: str, q_emb: Any, top_k: int, mode: str) -> Dict[str, Any]:
+    """Arguments of ltm.query, or of ltm.hybrid_query in hybrid mode."""
+    kwargs: Dict[str, Any] = dict(user_id=ds.user_id, query_embedding=q_emb, top_k=top_k, exclude_sensitive=True)
+    if mode == "hybrid":
+        kwargs["query_text"] = user_query
+    return kwargs
+
+
+def _ltm_fill(
+    cache: Optional[RetrievalCache],
+    user_id: str,
+    key: Optional[Tuple],
+    version: Optional[Tuple[int, int]],
+    mode: str,
+    result: Any,
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """(hits, search log) from the store's answer, which is cached."""
+    hits, ltm_log = result if mode == "hybrid" else (result, {"mode": mode})
+    if cache is not None:
+        cache.put(user_id, key, version, hits)
+    return hits, ltm_log
 
 
 def build_context_package(
@@ -42,39 +251,112 @@ def build_context_package(
     ds: DigitalSelf,
     session: SessionMemory,
     stm: ShortTermMemory,
-    ltm: Optional[LongTermMemory],
+    ltm: Optional[LongTermMemoryBase],
     top_k: int = 5,
     exclude_ltm_ids: Optional[List[str]] = None,
+    query_embedding: Optional[Any] = None,
+    use_cache: bool = True,
+    retrieval_mode: Optional[str] = None,
 ) -> Dict[str, Any]:
-    q_emb = embed_text(user_query).tolist()
+    """
+    retrieval_mode: "vector" | "hybrid"; defaults to set_retrieval_mode().
+    Pass query_embedding when the caller already has the embedding of user_query.
+    Without LTM the query is not embedded (query_embedding in the result is then None).
+    """
+    mode = retrieval_mode or _RETRIEVAL_MODE
+    q_emb = query_embedding
+    if q_emb is None and ltm is not None:
+        with span("retrieval.embed_query"):
+            q_emb = embed_text(user_query)
 
     recent_stm = stm.get_recent()
 
-    ltm_hits: List[dict] = []
-    if ltm is not None:
-        ltm_hits = ltm.query(
-            user_id=ds.user_id,
-            query_embedding=q_emb,
-            top_k=top_k,
-            exclude_sensitive=True,
-        )
+    gate_log: Dict[str, Any] = {"enabled": False, "skipped": False}
+    if ltm is not None and _LTM_GATE is not None:
+        with span("retrieval.gate"):
+            gate_log = _gate_ltm(ds, *ltm.profile_centroids(ds.user_id), q_emb)
+    cache, key, version, ltm_hits, cache_hit = _ltm_lookup(ds, ltm, gate_log, q_emb, top_k, mode, use_cache)
+    ltm_log: Dict[str, Any] = {"mode": mode}
+    if ltm_hits is None:
+        kwargs = _search_kwargs(ds, user_query, q_emb, top_k, mode)
+        result = ltm.hybrid_query(**kwargs) if mode == "hybrid" else ltm.query(**kwargs)
+        ltm_hits, ltm_log = _ltm_fill(cache, ds.user_id, key, version, mode, result)
+
+    return _assemble_package(
+        ds, stm, recent_stm, ltm_hits, q_emb, exclude_ltm_ids, _cache_log(cache, cache_hit), ltm_log, gate_log
+    )
+
+
+async def abuild_context_package(
+    user_query: str,
+    ds: DigitalSelf,
+    session: SessionMemory,
+    stm: ShortTermMemory,
+    ltm: Optional[AsyncLongTermMemory],
+    top_k: int = 5,
+    exclude_ltm_ids: Optional[List[str]] = None,
+    query_embedding: Optional[Any] = None,
+    use_cache: bool = True,
+    retrieval_mode: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Async build_context_package. Pass query_embedding when the caller already
+    has (or is concurrently computing) the embedding of user_query.
+    """
+    mode = retrieval_mode or _RETRIEVAL_MODE
+    q_emb = query_embedding
+    if q_emb is None and ltm is not None:
+        q_emb = await aembed_text(user_query)
 
+    recent_stm = stm.get_recent()
+
+    gate_log: Dict[str, Any] = {"enabled": False, "skipped": False}
+    if ltm is not None and _LTM_GATE is not None:
+        with span("retrieval.gate"):
+            gate_log = _gate_ltm(ds, *await ltm.profile_centroids(ds.user_id), q_emb)
+    sync_ltm = ltm.sync if ltm is not None else None
+    cache, key, version, ltm_hits, cache_hit = _ltm_lookup(ds, sync_ltm, gate_log, q_emb, top_k, mode, use_cache)
+    ltm_log: Dict[str, Any] = {"mode": mode}
+    if ltm_hits is None:
+        kwargs = _search_kwargs(ds, user_query, q_emb, top_k, mode)
+        result = await (ltm.hybrid_query(**kwargs) if mode == "hybrid" else ltm.query(**kwargs))
+        ltm_hits, ltm_log = _ltm_fill(cache, ds.user_id, key, version, mode, result)
+
+    return _assemble_package(
+        ds, stm, recent_stm, ltm_hits, q_emb, exclude_ltm_ids, _cache_log(cache, cache_hit), ltm_log, gate_log
+    )
+
+
+def _assemble_package(
+    ds: DigitalSelf,
+    stm: ShortTermMemory,
+    recent_stm: Sequence[STMItem],
+    ltm_hits: List[dict],
+    q_emb: Any,
+    exclude_ltm_ids: Optional[List[str]],
+    cache_log: Optional[Dict[str, Any]] = None,
+    ltm_log: Optional[Dict[str, Any]] = None,
+    gate_log: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     if exclude_ltm_ids:
         exclude_set = set([x for x in exclude_ltm_ids if x])
         ltm_hits = [m for m in ltm_hits if m.get("id") not in exclude_set]
 
-    ds_block = truncate(_format_digital_self(ds), MAX_DS_CHARS)
-    stm_block = truncate(_format_short_term(recent_stm), MAX_STM_CHARS)
-    ltm_block = truncate(_format_long_term(ltm_hits), MAX_LTM_CHARS)
+    with span("retrieval.assemble"):
+        context_text, budget = context_builder_for(ds).context(ds, stm, recent_stm, ltm_hits)
 
     ltm_explanations = []
     for m in ltm_hits:
         tags = m.get("tags") or []
+        if "fused_score" in m:
+            reason = f"Selected by fused keyword (bm25={m.get('lexical_score')}) and semantic rank. tags={tags}"
+        else:
+            reason = f"Selected by semantic similarity to query. tags={tags}"
         ltm_explanations.append(
             {
                 "id": m.get("id"),
                 "distance": m.get("distance"),
-                "reason": f"Selected by semantic similarity to query. tags={tags}",
+                "reason": reason,
                 "ts": m.get("ts"),
             }
         )
@@ -85,18 +367,12 @@ def build_context_package(
         "ltm_top_distances": [m.get("distance") for m in ltm_hits],
         "ltm_explanations": ltm_explanations,
         "stm_count": len(recent_stm),
-        "limits": {"ds": MAX_DS_CHARS, "stm": MAX_STM_CHARS, "ltm": MAX_LTM_CHARS},
+        "ltm_cache": cache_log or {"enabled": False},
+        "ltm_search": ltm_log or {"mode": "vector"},
+        "ltm_gate": gate_log or {"enabled": False, "skipped": False},
+        "limits": budget,
     }
 
-    context_text = (
-        "=== DIGITAL SELF ===\n"
-        f"{ds_block}\n\n"
-        "=== SHORT-TERM MEMORY ===\n"
-        f"{stm_block}\n\n"
-        "=== LONG-TERM MEMORY ===\n"
-        f"{ltm_block}\n"
-    )
-
     return {
         "context_text": context_text,
         "retrieval_log": retrieval_log,
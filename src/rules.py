@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .utils import trie_pattern
+
+
+class TurnSignals(NamedTuple):
+    """Everything the heuristic rules extract from one user message."""
+
+    topic: str  # best topic label, "general" if no topic rule fired
+    tone: Optional[str]  # "concise" | "detailed" | None
+    interest: Optional[str]  # snippet after "i like ", original casing
+    dislike: Optional[str]  # snippet after "i hate " / "i don't like ", lowercased
+    store_ltm: bool  # a store-to-long-term trigger phrase was present
+
+
+class _Rule(NamedTuple):
+    kind: str  # topic | tone | interest | dislike | store
+    value: str
+    priority: int
+    order: int
+
+
+# kinds whose value is taken from the text following the trigger phrase
+_SNIPPET_KINDS = ("interest", "dislike")
+
+# Built-in topic rules, highest priority (lowest number) first.
+DEFAULT_TOPIC_RULES: List[Tuple[str, int, List[str]]] = [
+    ("memory", 10, ["memory", "remember", "recall", "store this"]),
+    ("privacy", 20, ["privacy", "password", "sensitive", "data retention", "delete this"]),
+    ("devops", 30, ["devops", "kubernetes", "terraform", "docker", "ci/cd"]),
+    ("python", 40, ["python"]),
+]
+
+DEFAULT_TONE_RULES: List[Tuple[str, int, List[str]]] = [
+    (
+        "concise",
+        10,
+        [
+            "be concise",
+            "keep it short",
+            "concise answers",
+            "prefer concise",
+            "i prefer concise",
+            "i prefer concise answers",
+            "no fluff",
+            "avoid fluff",
+        ],
+    ),
+    ("detailed", 20, ["be detailed", "step by step", "walk me through", "in detail"]),
+]
+
+DEFAULT_STORE_TRIGGERS = [
+    "remember that",
+    "remember this",
+    "i prefer",
+    "i like",
+    "i hate",
+    "my goal is",
+    "i am working on",
+    "i'm working on",
+]
+
+
+class RuleEngine:
+    """
+    All trigger phrases (topics, tone, interest/dislike markers, store-to-LTM
+    triggers) compiled into one prefix-trie regex. scan() lowercases the text
+    once and walks it once; a zero-width lookahead finds the longest phrase
+    starting at each position, and every shorter phrase that is a prefix of it
+    is credited too, so overlapping triggers ("i prefer", "i prefer concise")
+    all fire. Cost per message grows with text length, not with the number of
+    rules, so large custom topic taxonomies stay cheap.
+    """
+
+    def __init__(self) -> None:
+        self._rules: Dict[str, List[_Rule]] = {}
+        self._order = 0
+        self._lock = threading.Lock()
+        self._compiled: Optional[re.Pattern[str]] = None
+        self._expanded: Dict[str, List[_Rule]] = {}
+
+    # --- registration ---
+    def add_rule(self, kind: str, phrase: str, value: str = "", priority: int = 100) -> None:
+        phrase = phrase.lower()
+        if not phrase.strip():
+            return
+        with self._lock:
+            self._order += 1
+            self._rules.setdefault(phrase, []).append(_Rule(kind, value, priority, self._order))
+            self._compiled = None
+
+    def add_topic_rule(self, label: str, phrases: Iterable[str], priority: int = 100) -> None:
+        """Register a topic label. When several topics fire, the lowest priority number wins."""
+        label = label.strip().lower()
+        for p in phrases:
+            self.add_rule("topic", p, label, priority)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._rules.values())
+
+    def _compile(self) -> Tuple[re.Pattern[str], Dict[str, List[_Rule]]]:
+        with self._lock:
+            if self._compiled is None:
+                phrases = sorted(self._rules)
+                # each phrase also credits the rules of every phrase that is a prefix of it
+                expanded: Dict[str, List[_Rule]] = {}
+                for p in phrases:
+                    rules: List[_Rule] = []
+                    for i in range(1, len(p) + 1):
+                        rules.extend(self._rules.get(p[:i], ()))
+                    expanded[p] = rules
+                self._expanded = expanded
+                body = trie_pattern(phrases)
+                self._compiled = re.compile(f"(?=({body}))" if body else r"(?!)")
+            return self._compiled, self._expanded
+
+    # --- matching ---
+    def scan(self, text: str) -> TurnSignals:
+        t = text.lower()
+        # slice snippets from the original text only when lowercasing kept offsets aligned
+        src = text if len(t) == len(text) else t
+        pattern, expanded = self._compile()
+
+        topic: Optional[_Rule] = None
+        tone: Optional[_Rule] = None
+        snippets: Dict[str, Tuple[int, int, int]] = {}  # kind -> (priority, order, offset)
+        store = False
+        for m in pattern.finditer(t):
+            pos = m.start()
+            for r in expanded[m.group(1)]:
+                if r.kind == "topic":
+                    if topic is None or (r.priority, r.order) < (topic.priority, topic.order):
+                        topic = r
+                elif r.kind == "tone":
+                    if tone is None or (r.priority, r.order) < (tone.priority, tone.order):
+                        tone = r
+                elif r.kind == "store":
+                    store = True
+                elif r.kind in _SNIPPET_KINDS:
+                    key = (r.priority, r.order, pos + len(r.value))
+                    if r.kind not in snippets or key < snippets[r.kind]:
+                        snippets[r.kind] = key
+
+        def snippet(kind: str, source: str) -> Optional[str]:
+            if kind not in snippets:
+                return None
+            return source[snippets[kind][2] :].split(".")[0].strip() or None
+
+        return TurnSignals(
+            topic=topic.value if topic else "general",
+            tone=tone.value if tone else None,
+            interest=snippet("interest", src),
+            dislike=snippet("dislike", t),
+            store_ltm=store,
+        )
+
+
+def default_rule_engine() -> RuleEngine:
+    engine = RuleEngine()
+    for label, priority, phrases in DEFAULT_TOPIC_RULES:
+        engine.add_topic_rule(label, phrases, priority)
+    for tone, priority, phrases in DEFAULT_TONE_RULES:
+        for p in phrases:
+            engine.add_rule("tone", p, tone, priority)
+    # snippet rules carry the marker as value so scan() knows where the snippet starts
+    engine.add_rule("interest", "i like ", "i like ", 10)
+    engine.add_rule("dislike", "i hate ", "i hate ", 10)
+    engine.add_rule("dislike", "i don't like ", "i don't like ", 20)
+    for p in DEFAULT_STORE_TRIGGERS:
+        engine.add_rule("store", p)
+    return engine
+
+
+_ENGINE: Optional[RuleEngine] = None
+
+
+def get_rule_engine() -> RuleEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = default_rule_engine()
+    return _ENGINE
+
+
+def set_rule_engine(engine: RuleEngine) -> RuleEngine:
+    global _ENGINE
+    _ENGINE = engine
+    return engine
+
+
+def scan_turn(text: str) -> TurnSignals:
+    return get_rule_engine().scan(text)
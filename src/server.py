@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from .agent import handle_turn
+from .digital_self import DigitalSelf
+from .memory.long_term import LongTermMemoryBase
+from .memory.session import SessionMemory
+from .memory.short_term import ShortTermMemory
+from .metrics import prometheus_text
+
+if TYPE_CHECKING:
+    from .migration import Cutover
+
+log = logging.getLogger(__name__)
+
+
+class UserState:
+    """Everything one user needs between turns. `lock` serializes that user's turns."""
+
+    __slots__ = ("user_id", "ds", "session", "stm", "lock", "last_used", "in_use", "loaded")
+
+    def __init__(self, user_id: str, ds: Optional[DigitalSelf], stm: ShortTermMemory) -> None:
+        self.user_id = user_id
+        self.ds = ds
+        self.session = SessionMemory()
+        self.stm = stm
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        # set once ds is loaded (or the load failed and ds stays None)
+        self.loaded = threading.Event()
+
+
+class SessionRegistry:
+    """
+    Bounded LRU of per-user state.
+    - at most max_users states are held; the least recently used idle one is evicted
+    - states idle for idle_seconds are evicted by evict_idle()
+    - a state is never evicted while a turn holds it (in_use > 0)
+    Eviction saves the Digital Self; session (and its spill file) and STM are dropped, as when the CLI exits.
+    The Digital Self is loaded outside the registry lock: the first caller
+    for a user loads it, concurrent callers for that user wait on the
+    state's `loaded` latch, and other users are not held up.
+    """
+
+    def __init__(
+        self,
+        load_ds: Callable[[str], DigitalSelf],
+        save_ds: Callable[[DigitalSelf], None],
+        make_stm: Callable[[], ShortTermMemory],
+        max_users: int = 1000,
+        idle_seconds: float = 1800.0,
+    ) -> None:
+        self.load_ds = load_ds
+        self.save_ds = save_ds
+        self.make_stm = make_stm
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self._states: "OrderedDict[str, UserState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id: str) -> UserState:
+        with self._lock:
+            state = self._states.get(user_id)
+            loader = state is None
+            if loader:
+                state = UserState(user_id, None, self.make_stm())
+                self._states[user_id] = state
+            self._states.move_to_end(user_id)
+            state.in_use += 1
+            state.last_used = time.monotonic()
+            evicted = self._evict_over_capacity()
+        self._retire(evicted)
+        if loader:
+            try:
+                state.ds = self.load_ds(user_id)
+            finally:
+                if state.ds is None:
+                    with self._lock:
+                        if self._states.get(user_id) is state:
+                            del self._states[user_id]
+                state.loaded.set()
+        else:
+            state.loaded.wait()
+        if state.ds is None:
+            self.release(state)
+            raise RuntimeError(f"could not load the Digital Self of {user_id}")
+        return state
+
+    def release(self, state: UserState) -> None:
+        with self._lock:
+            state.in_use -= 1
+            state.last_used = time.monotonic()
+
+    def _evict_over_capacity(self) -> list:
+        evicted = []
+        for uid in list(self._states):
+            if len(self._states) <= self.max_users:
+                break
+            st = self._states[uid]
+            if st.in_use == 0 and st.ds is not None:
+                evicted.append(self._states.pop(uid))
+        return evicted
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            evicted = [
+                self._states.pop(uid)
+                for uid, st in list(self._states.items())
+                if st.in_use == 0 and st.ds is not None and st.last_used < cutoff
+            ]
+        self._retire(evicted)
+        return len(evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            evicted = list(self._states.values())
+            self._states.clear()
+        self._retire(evicted)
+
+    def _retire(self, states: list) -> None:
+        for st in states:
+            with st.lock:
+                if st.ds is not None:
+                    self.save_ds(st.ds)
+                st.session.close()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+class TurnService:
+    """
+    Runs turns for many users against one shared LTM backend.
+    Turns for the same user run one at a time; different users run in parallel.
+    With a cutover, every turn runs inside cutover.turn() and uses the store
+    it yields, so the service follows migrations without a restart.
+    """
+
+    def __init__(
+        self,
+        registry: SessionRegistry,
+        ltm: Optional[LongTermMemoryBase],
+        save_ds: Callable[[DigitalSelf], None],
+        cutover: Optional["Cutover"] = None,
+    ) -> None:
+        self.registry = registry
+        self.ltm = ltm
+        self.save_ds = save_ds
+        self.cutover = cutover
+
+    def turn(self, user_id: str, text: str) -> Dict[str, Any]:
+        state = self.registry.acquire(user_id)
+        try:
+            with state.lock, (self.cutover.turn() if self.cutover is not None else nullcontext(self.ltm)) as ltm:
+                out = handle_turn(text, state.ds, state.session, state.stm, ltm)
+                if "digital_self" in out:
+                    state.ds = out["digital_self"]
+                    self.save_ds(state.ds)
+        finally:
+            self.registry.release(state)
+        return {k: v for k, v in out.items() if k != "digital_self"}
+
+
+def _make_handler(service: TurnService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, code: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self._send_bytes(code, body, "application/json")
+
+        def _send_bytes(self, code: int, body: bytes, content_type: str) -> None:
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "active_users": len(service.registry)})
+            elif self.path == "/metrics":
+                self._send_bytes(200, prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            if self.path != "/turn":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                req = json.loads(self.rfile.read(length) or b"{}")
+                user_id = str(req["user_id"]).strip()
+                text = str(req["text"]).strip()
+            except (ValueError, KeyError, TypeError):
+                self._send(400, {"error": "expected JSON body {\"user_id\": ..., \"text\": ...}"})
+                return
+            if not user_id or not text:
+                self._send(400, {"error": "user_id and text must be non-empty"})
+                return
+            try:
+                out = service.turn(user_id, text)
+            except Exception:
+                # the connection stays usable; the traceback goes to the server log only
+                log.exception("turn failed for user %s", user_id)
+                self._send(500, {"error": "internal error"})
+                return
+            self._send(200, {"user_id": user_id, **out})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def serve(
+    service: TurnService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    on_ready: Optional[Callable[[str, int], None]] = None,
+) -> None:
+    """
+    HTTP API:
+      POST /turn    {"user_id": "...", "text": "..."} -> handle_turn output (minus the DigitalSelf object)
+      GET  /health
+      GET  /metrics  stage latency histograms, Prometheus text format
+    Blocks until interrupted; idle users are evicted once a minute.
+    """
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    httpd.daemon_threads = True
+    stop = threading.Event()
+
+    def reaper() -> None:
+        while not stop.wait(60.0):
+            service.registry.evict_idle()
+
+    threading.Thread(target=reaper, name="session-reaper", daemon=True).start()
+    if on_ready:
+        on_ready(host, httpd.server_address[1])
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        httpd.server_close()
+        service.registry.close()
@@ -1,38 +1,462 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import re
 import os
 import hashlib
+import hmac
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timezone, timedelta
-from typing import Any, List, Optional
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 import numpy as np
-from openai import OpenAI
 
-# ---------- Embeddings (OpenAI) ----------
-_openai_client: Optional[OpenAI] = None
-_EMBED_MODEL = "text-embedding-3-small"
+from .metrics import span
 
+# ---------- Embedding backends ----------
+DEFAULT_EMBED_MODEL = "text-embedding-3-small"
 
-def _get_openai_client() -> OpenAI:
-    global _openai_client
-    if _openai_client is None:
-        _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    return _openai_client
 
+class EmbeddingBackend:
+    """
+    Minimal embedding backend interface.
+    `name` identifies the vector space (it is the cache key namespace and what
+    Profile.embedding_model records), so two backends with the same name must
+    produce comparable vectors.
+    """
 
-def embed_text(text: str) -> np.ndarray:
-    c = _get_openai_client()
-    r = c.embeddings.create(model=_EMBED_MODEL, input=text)
-    vec = r.data[0].embedding
-    return np.array(vec, dtype=np.float32)
+    name: str = ""
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        raise NotImplementedError
+
+    async def aembed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        # Default: run the blocking call on a worker thread.
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model: str = DEFAULT_EMBED_MODEL) -> None:
+        self.name = model
+        # clients (and the openai package, ~1s to import) are created on the first call
+        self._client: Any = None
+        self._async_client: Any = None
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        r = self._client.embeddings.create(model=self.name, input=texts)
+        return [np.array(d.embedding, dtype=np.float32) for d in r.data]
+
+    async def aembed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        r = await self._async_client.embeddings.create(model=self.name, input=texts)
+        return [np.array(d.embedding, dtype=np.float32) for d in r.data]
+
+
+class LazyConsole:
+    """Stands in for rich.console.Console; rich is imported on the first print, not at startup."""
 
+    def __init__(self) -> None:
+        self._console: Any = None
 
-def embed_texts(texts: List[str]) -> List[np.ndarray]:
-    c = _get_openai_client()
-    r = c.embeddings.create(model=_EMBED_MODEL, input=texts)
-    return [np.array(d.embedding, dtype=np.float32) for d in r.data]
+    def __getattr__(self, name: str) -> Any:
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console()
+        return getattr(self._console, name)
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Offline, deterministic CPU embedder (signed feature hashing).
+    Features: lowercase word unigrams + bigrams, hashed into `dim` buckets
+    with a sign bit, accumulated for the whole batch in one bincount and
+    L2-normalised. Token hashes are memoised, so steady-state cost is one
+    regex pass per text plus a few vectorised NumPy ops per batch.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = int(dim)
+        self.name = f"local-hash-{self.dim}"
+        self._memo: Dict[str, int] = {}
+
+    def _feature(self, token: str) -> int:
+        f = self._memo.get(token)
+        if f is None:
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            # low bits pick the bucket, bit 63 picks the sign (encoded as negative index)
+            f = (h % self.dim) + 1
+            if h >> 63:
+                f = -f
+            if len(self._memo) < 500_000:
+                self._memo[token] = f
+        return f
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        n = len(texts)
+        rows: List[int] = []
+        feats: List[int] = []
+        for i, text in enumerate(texts):
+            toks = _TOKEN_RE.findall(text.lower())
+            grams = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+            feats.extend(self._feature(g) for g in grams)
+            rows.extend([i] * len(grams))
+
+        f = np.asarray(feats, dtype=np.int64)
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + (np.abs(f) - 1)
+        mat = np.bincount(flat, weights=np.sign(f), minlength=n * self.dim)
+        mat = mat.reshape(n, self.dim).astype(np.float32)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        mat /= np.where(norms > 0, norms, 1.0)
+        return list(mat)
+
+
+def make_embedding_backend(spec: str) -> EmbeddingBackend:
+    """
+    spec examples:
+      openai | openai:<model> | <openai model name>
+      local | local:<dim> | local-hash-<dim>
+    """
+    spec = (spec or "openai").strip()
+    if spec == "local":
+        return HashingEmbeddingBackend()
+    if spec.startswith("local:"):
+        return HashingEmbeddingBackend(int(spec.split(":", 1)[1]))
+    if spec.startswith("local-hash-"):
+        return HashingEmbeddingBackend(int(spec.rsplit("-", 1)[1]))
+    if spec == "openai":
+        return OpenAIEmbeddingBackend()
+    if spec.startswith("openai:"):
+        return OpenAIEmbeddingBackend(spec.split(":", 1)[1])
+    return OpenAIEmbeddingBackend(spec)
+
+
+_embedding_backend: Optional[EmbeddingBackend] = None
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    global _embedding_backend
+    if _embedding_backend is None:
+        _embedding_backend = make_embedding_backend(os.getenv("EMBED_BACKEND", "openai"))
+    return _embedding_backend
+
+
+def set_embedding_backend(backend: "EmbeddingBackend | str") -> EmbeddingBackend:
+    global _embedding_backend
+    _embedding_backend = make_embedding_backend(backend) if isinstance(backend, str) else backend
+    return _embedding_backend
+
+
+def embedding_model_name() -> str:
+    return get_embedding_backend().name
+
+
+def embed_text(text: str, persist: bool = True) -> np.ndarray:
+    return embed_texts([text], persist)[0]
+
+
+def _cache_lookup(texts: List[str]):
+    backend = get_embedding_backend()
+    cache = get_embedding_cache()
+    out = cache.get_many(backend.name, texts)
+    pending: Dict[str, List[int]] = {}
+    for i, vec in enumerate(out):
+        if vec is None:
+            pending.setdefault(normalize_embedding_text(texts[i]), []).append(i)
+    return backend, cache, out, pending
+
+
+def _cache_fill(backend, cache, texts, out, pending, vecs, persist) -> List[np.ndarray]:
+    firsts = [texts[idxs[0]] for idxs in pending.values()]
+    cache.put_many(backend.name, firsts, vecs, persist)
+    for idxs, vec in zip(pending.values(), vecs):
+        for i in idxs:
+            out[i] = vec
+    return out
+
+
+def embed_texts(texts: List[str], persist: bool = True) -> List[np.ndarray]:
+    """
+    Embeds texts with the active backend, through the embedding cache.
+    Only cache misses reach the API, in a single batched request
+    (duplicates within the batch are sent once).
+    persist=False keeps new vectors out of the on-disk tier (sensitive text).
+    """
+    if not texts:
+        return []
+    with span("embed.cache"):
+        backend, cache, out, pending = _cache_lookup(texts)
+    if pending:
+        with span("embed.backend"):
+            vecs = backend.embed_batch([texts[idxs[0]] for idxs in pending.values()])
+        _cache_fill(backend, cache, texts, out, pending, vecs, persist)
+    return out
+
+
+async def aembed_texts(texts: List[str], persist: bool = True) -> List[np.ndarray]:
+    """Async embed_texts: same cache, misses go through backend.aembed_batch."""
+    if not texts:
+        return []
+    with span("embed.cache"):
+        backend, cache, out, pending = _cache_lookup(texts)
+    if pending:
+        with span("embed.backend"):
+            vecs = await backend.aembed_batch([texts[idxs[0]] for idxs in pending.values()])
+        _cache_fill(backend, cache, texts, out, pending, vecs, persist)
+    return out
+
+
+async def aembed_text(text: str, persist: bool = True) -> np.ndarray:
+    return (await aembed_texts([text], persist))[0]
+
+
+# ---------- Embedding cache ----------
+# The on-disk tier is opt-in: it outlives :forget and wipes, which cannot map
+# a user or keyword back to hashed rows.
+_EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or None
+
+
+def normalize_embedding_text(text: str) -> str:
+    # Whitespace-only differences should not cost another embedding call.
+    return " ".join(text.split())
+
+
+def embedding_cache_key(model: str, text: str, secret: bytes) -> str:
+    # Keyed hash: without the secret a guessed text cannot be tested against the file.
+    norm = normalize_embedding_text(text)
+    return hmac.new(secret, f"{model}\x00{norm}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _load_cache_secret(key_path: str) -> Tuple[bytes, bool]:
+    """(secret, created): reads the key file, or creates it readable by the owner only."""
+    try:
+        with open(key_path, "rb") as f:
+            return bytes.fromhex(f.read().decode("ascii").strip()), False
+    except FileNotFoundError:
+        pass
+    secret = os.urandom(32)
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(secret.hex())
+    return secret, True
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by an HMAC of (model, normalized text).
+    Tiers:
+      - in-process LRU (max_memory_items)
+      - on-disk SQLite table (max_disk_items, least recently used rows evicted)
+    path=None (the default unless EMBED_CACHE_PATH is set) keeps the cache in
+    memory only. The HMAC secret lives in key_path (default: <path>.key, mode
+    0600), not in the database; a memory-only cache uses a per-process secret.
+    Vectors put with persist=False stay in memory only.
+    Returned vectors are read-only because they are shared between callers.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = _EMBED_CACHE_PATH,
+        max_memory_items: int = 4096,
+        max_disk_items: int = 200_000,
+        key_path: Optional[str] = None,
+    ) -> None:
+        self.path = path or None
+        self.key_path = (key_path or f"{self.path}.key") if self.path else None
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_count = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        self._secret = os.urandom(32)
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            os.makedirs(os.path.dirname(self.key_path) or ".", exist_ok=True)
+            self._secret, new_secret = _load_cache_secret(self.key_path)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            if new_secret:
+                # rows written under another (or no) secret can never be looked up again
+                self._db.execute("DELETE FROM embeddings")
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # --- LRU tier ---
+    def _lru_get(self, key: str) -> Optional[np.ndarray]:
+        vec = self._lru.get(key)
+        if vec is not None:
+            self._lru.move_to_end(key)
+        return vec
+
+    def _lru_put(self, key: str, vec: np.ndarray) -> None:
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_items:
+            self._lru.popitem(last=False)
+
+    # --- public API ---
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [embedding_cache_key(model, t, self._secret) for t in texts]
+        out: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            disk_lookup: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vec = self._lru_get(key)
+                if vec is not None:
+                    out[i] = vec
+                    self.hits_memory += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._db is not None:
+                found = self._disk_get(list(disk_lookup))
+                for key, vec in found.items():
+                    self._lru_put(key, vec)
+                    for i in disk_lookup.pop(key):
+                        out[i] = vec
+                        self.hits_disk += 1
+
+            self.misses += sum(len(v) for v in disk_lookup.values())
+        return out
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], vecs: List[np.ndarray], persist: bool = True) -> None:
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vecs):
+                vec = np.asarray(vec, dtype=np.float32)
+                vec.setflags(write=False)
+                key = embedding_cache_key(model, text, self._secret)
+                self._lru_put(key, vec)
+                rows.append((key, model, vec.tobytes()))
+            if self._db is not None and rows and persist:
+                self._disk_put(rows)
+
+    def put(self, model: str, text: str, vec: np.ndarray, persist: bool = True) -> None:
+        self.put_many(model, [text], [vec], persist)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._lru),
+            "disk_items": self._disk_count,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._disk_count = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- disk tier (caller holds the lock) ---
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        assert self._db is not None
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            for key, blob in self._db.execute(
+                f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk
+            ):
+                vec = np.frombuffer(blob, dtype=np.float32)
+                vec.setflags(write=False)
+                found[key] = vec
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+            )
+        return found
+
+    def _disk_put(self, rows: List[tuple]) -> None:
+        assert self._db is not None
+        now = time.time()
+        self._db.execute("BEGIN")
+        try:
+            for key, model, blob in rows:
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO embeddings(key, model, vec, last_used) VALUES (?, ?, ?, ?)",
+                    (key, model, blob, now),
+                )
+                self._disk_count += cur.rowcount
+            if self._disk_count > self.max_disk_items:
+                # Evict down to 90% so eviction is amortised over many inserts.
+                excess = self._disk_count - int(self.max_disk_items * 0.9)
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._disk_count -= excess
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def configure_embedding_cache(
+    path: Optional[str] = _EMBED_CACHE_PATH,
+    max_memory_items: int = 4096,
+    max_disk_items: int = 200_000,
+    key_path: Optional[str] = None,
+) -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is not None:
+        _embedding_cache.close()
+    _embedding_cache = EmbeddingCache(path, max_memory_items, max_disk_items, key_path)
+    return _embedding_cache
+
+
+def embedding_cache_stats() -> Dict[str, Any]:
+    return get_embedding_cache().stats()
 
 
 # ---------- Time / ids / json ----------
@@ -56,6 +480,21 @@ def is_expired(expires_at_iso: str) -> bool:
     return datetime.now(timezone.utc) >= parse_iso(expires_at_iso)
 
 
+def now_epoch() -> float:
+    return time.time()
+
+
+def epoch_in_days(days: int) -> float:
+    return time.time() + days * 86400.0
+
+
+def iso_to_epoch(dt_str: str) -> float:
+    dt = parse_iso(dt_str)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
 def stable_hash_id(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
 
@@ -75,37 +514,135 @@ def safe_json_load(path: str, default: Any) -> Any:
 
 
 def safe_json_dump(path: str, obj: Any) -> None:
-    with open(path, "w", encoding="utf-8") as f:
+    # write-then-rename so a crash mid-write never leaves a truncated file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(obj, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
 
 
 # ---------- Sensitivity detection ----------
-_EMAIL_RE = re.compile(r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", re.I)
-_PHONE_RE = re.compile(r"\b(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{2,4}\)?[\s-]?)?\d{3,4}[\s-]?\d{3,4}\b")
-_PASSWORD_HINT_RE = re.compile(r"\b(my password is|password:|passcode:)\b", re.I)
-_CARD_RE = re.compile(r"\b(?:\d[ -]*?){13,16}\b")
+_EMAIL_PAT = r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b"
+_PHONE_PAT = r"\b(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{2,4}\)?[\s-]?)?\d{3,4}[\s-]?\d{3,4}\b"
+_PASSWORD_HINT_PAT = r"\b(?:my password is|password:|passcode:)\b"
+# separators and digits are disjoint, so this cannot backtrack on long digit runs
+_CARD_PAT = r"\b\d(?:[ -]*\d){12,15}\b"
+
+_EMAIL_RE = re.compile(_EMAIL_PAT, re.I)
+_PHONE_RE = re.compile(_PHONE_PAT)
+_PASSWORD_HINT_RE = re.compile(_PASSWORD_HINT_PAT, re.I)
+_CARD_RE = re.compile(_CARD_PAT)
+_DIGIT_RE = re.compile(r"\d")
+
+# kinds replaced by redaction; password hints and keywords only mark text as sensitive
+REDACTION_LABELS = {
+    "email": "[REDACTED_EMAIL]",
+    "card": "[REDACTED_CARD]",
+    "phone": "[REDACTED_PHONE]",
+}
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex alternation for a set of literal words, factored into a prefix trie
+    ("bank|banking|band" -> "ban(?:k(?:ing)?|d)"), so matching costs one
+    pass over the text rather than one attempt per word.
+    """
+    trie: Dict[str, Any] = {}
+    for w in words:
+        if not w:
+            continue
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        end = "" in node
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end:
+            body = (body if len(alts) == 1 and len(alts[0]) == 1 else f"(?:{body})") + "?"
+        return body
+
+    return build(trie)
+
+
+class SensitiveSpan(NamedTuple):
+    kind: str  # email | password | card | phone | keyword
+    start: int
+    end: int
+
+
+class SensitivityScanner:
+    """
+    One combined pattern for all sensitivity checks: the built-in detectors plus
+    a trie of the user's sensitive keywords (case-insensitive substrings).
+    scan() makes a single left-to-right pass and returns non-overlapping typed
+    spans; redact() reuses those spans instead of re-running the regexes.
+    Get instances through sensitivity_scanner(), which caches one per keyword set.
+    """
+
+    def __init__(self, keywords: Tuple[str, ...] = ()) -> None:
+        self.keywords = keywords
+        self._kw = trie_pattern(sorted({k.lower() for k in keywords if k.strip()}))
+        # Emails need an "@" and cards/phones need a digit; most pasted text lacks
+        # one or the other, so a variant without those branches is compiled per case.
+        self._variants = {(at, digit): self._compile(at, digit) for at in (False, True) for digit in (False, True)}
+
+    def _compile(self, has_at: bool, has_digit: bool) -> "re.Pattern[str]":
+        builtin = [f"(?P<email>{_EMAIL_PAT})"] if has_at else []
+        builtin.append(f"(?P<password>{_PASSWORD_HINT_PAT})")
+        if has_digit:
+            # phone regex can false-positive, but fine for a prototype
+            builtin.append(f"(?=[\\d+(])(?:(?P<card>{_CARD_PAT})|(?P<phone>{_PHONE_PAT}))")
+        # cheap lookahead skips positions where no built-in detector can start
+        pattern = f"(?=[\\w+(])(?:{'|'.join(builtin)})"
+        if self._kw:
+            pattern += f"|(?P<keyword>{self._kw})"
+        return re.compile(pattern, re.I)
+
+    def _pattern(self, text: str) -> "re.Pattern[str]":
+        return self._variants[("@" in text, _DIGIT_RE.search(text) is not None)]
+
+    def search(self, text: str) -> bool:
+        return self._pattern(text).search(text) is not None
+
+    def scan(self, text: str) -> List[SensitiveSpan]:
+        return [SensitiveSpan(m.lastgroup, m.start(), m.end()) for m in self._pattern(text).finditer(text)]
+
+    def redact(self, text: str, spans: Optional[List[SensitiveSpan]] = None) -> str:
+        if spans is None:
+            spans = self.scan(text)
+        out = []
+        pos = 0
+        for sp in spans:
+            label = REDACTION_LABELS.get(sp.kind)
+            if label is None:
+                continue
+            out.append(text[pos : sp.start])
+            out.append(label)
+            pos = sp.end
+        if pos == 0:
+            return text
+        out.append(text[pos:])
+        return "".join(out)
+
+
+@lru_cache(maxsize=1024)
+def _scanner_for(keywords: Tuple[str, ...]) -> SensitivityScanner:
+    return SensitivityScanner(keywords)
+
+
+def sensitivity_scanner(keywords: Optional[Iterable[str]] = None) -> SensitivityScanner:
+    return _scanner_for(tuple(keywords or ()))
 
 
 def contains_sensitive(text: str, extra_keywords: Optional[list[str]] = None) -> bool:
-    if _EMAIL_RE.search(text):
-        return True
-    if _PASSWORD_HINT_RE.search(text):
-        return True
-    if _CARD_RE.search(text):
-        return True
-    # phone regex can false-positive, but fine for a prototype
-    if _PHONE_RE.search(text):
-        return True
-    if extra_keywords:
-        low = text.lower()
-        for kw in extra_keywords:
-            if kw.lower() in low:
-                return True
-    return False
-
-
-def redact_sensitive(text: str) -> str:
-    text = _EMAIL_RE.sub("[REDACTED_EMAIL]", text)
-    text = _CARD_RE.sub("[REDACTED_CARD]", text)
-    text = _PHONE_RE.sub("[REDACTED_PHONE]", text)
-    return text
+    return sensitivity_scanner(extra_keywords).search(text)
+
+
+def redact_sensitive(text: str, spans: Optional[List[SensitiveSpan]] = None) -> str:
+    return sensitivity_scanner().redact(text, spans)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.metrics import metrics_enabled, set_metrics_enabled  # noqa: E402
+from src.utils import configure_embedding_cache, set_embedding_backend  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def offline_embeddings():
+    """Every test runs on the offline embedder with a fresh memory-only cache."""
+    metrics = metrics_enabled()
+    backend = set_embedding_backend("local:64")
+    configure_embedding_cache(path=None)
+    yield backend
+    configure_embedding_cache(path=None)
+    set_metrics_enabled(metrics)
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import src.agent
+import src.retrieval
+from src.agent import ahandle_turn, handle_turn
+from src.digital_self import DigitalSelf
+from src.memory.numpy_store import NumpyLongTermMemory
+from src.memory.session import SessionMemory
+from src.memory.short_term import ShortTermMemory
+
+
+@pytest.fixture
+def turn(tmp_path):
+    ltm = NumpyLongTermMemory(str(tmp_path / "vectors"))
+    ds, session, stm = DigitalSelf(user_id="u"), SessionMemory(), ShortTermMemory()
+
+    def run(text):
+        return handle_turn(text, ds, session, stm, ltm)
+
+    run.ltm, run.stm = ltm, stm
+    return run
+
+
+def test_store_trigger_writes_long_term_and_sensitive_text_never_does(turn):
+    assert turn("remember that I like green tea")["stored_long_term_id"]
+    assert turn("how are you?")["stored_long_term_id"] is None
+    out = turn("remember that my password is hunter2")
+    assert out["sensitive"] and out["stored_long_term_id"] is None
+    out = turn("remember that my email is me@example.com")
+    assert out["sensitive"] and out["stored_long_term_id"] is None
+    assert [m["text"] for m in turn.ltm.get_user_memories("u")[1]] == ["remember that I like green tea"]
+    assert turn.stm.get_recent()[0].text == "remember that my email is [REDACTED_EMAIL]"
+
+
+def test_forget_keyword_last_and_all(turn):
+    turn("remember that I like green tea")
+    turn("remember that my dog is called Rex")
+    turn("I like coffee in the morning")
+    other = turn.ltm.add(user_id="v", text="I like green tea too", embedding=[0.1] * 64)
+
+    assert turn(":forget tea")["handled_control"]
+    assert {m["text"] for m in turn.ltm.get_user_memories("u")[1]} == {
+        "remember that my dog is called Rex",
+        "I like coffee in the morning",
+    }
+    assert all("tea" not in it.text for it in turn.stm.get_recent())
+
+    n = len(turn.stm)
+    turn(":forget last")
+    assert len(turn.stm) == n - 1
+
+    turn(":forget all")
+    assert len(turn.stm) == 0 and turn.ltm.get_user_memories("u")[0] == 0
+    assert [m["id"] for m in turn.ltm.get_user_memories("v")[1]] == [other]
+
+
+def test_turns_without_ltm_embed_nothing(monkeypatch):
+    def fail(*args, **kwargs):
+        pytest.fail("query embedded without LTM")
+
+    for module in (src.agent, src.retrieval):
+        monkeypatch.setattr(module, "embed_text", fail)
+        monkeypatch.setattr(module, "aembed_text", fail)
+    ds, session, stm = DigitalSelf(user_id="u"), SessionMemory(), ShortTermMemory()
+    assert handle_turn("remember that I like green tea", ds, session, stm, None)["reply"]
+    out = asyncio.run(ahandle_turn("what tea do I like?", ds, session, stm, None))
+    assert out["reply"] and out["retrieval_log"]["ltm_retrieved_count"] == 0
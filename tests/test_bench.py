@@ -0,0 +1,26 @@
+from src.bench import SEED_CONVERSATIONS, run_mode, scale_conversations
+
+
+def test_async_mode_matches_sync_results():
+    convs = scale_conversations(SEED_CONVERSATIONS, users=6, turns_per_user=4)
+    sync = run_mode("stm_ltm", convs)
+    asynchronous = run_mode("stm_ltm_async", convs)
+    assert sync["turns"] == asynchronous["turns"] > 0
+    assert sync["ltm_stored"] == asynchronous["ltm_stored"] > 0
+    assert "ltm_write_and_retrieval" in asynchronous["latency_ms"]
+
+
+def test_every_user_gets_the_requested_turns():
+    convs = scale_conversations(SEED_CONVERSATIONS, users=5, turns_per_user=7)
+    assert [len(c["turns"]) for c in convs] == [7] * 5
+    assert convs[0]["turns"][:3] == SEED_CONVERSATIONS[0]["turns"]
+    assert convs == scale_conversations(SEED_CONVERSATIONS, users=5, turns_per_user=7)
+
+
+def test_no_metrics_reports_turn_totals_only():
+    from src.metrics import metrics_enabled
+
+    convs = scale_conversations(SEED_CONVERSATIONS, users=3, turns_per_user=3)
+    out = run_mode("stm", convs, metrics=False)
+    assert list(out["latency_ms"]) == ["total"]
+    assert not metrics_enabled()
@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.memory.consolidation import _merged_meta, consolidate_user, find_duplicate_groups
+from src.memory.numpy_store import NumpyLongTermMemory
+
+
+def _chain(n, step_deg):
+    """Unit vectors step_deg apart on a circle: neighbours similar, ends not."""
+    angles = np.radians(np.arange(n) * step_deg)
+    return np.stack([np.cos(angles), np.sin(angles)], axis=1).astype(np.float32)
+
+
+def test_chains_are_not_merged_end_to_end():
+    vecs = _chain(6, 10.0)  # cos(10deg)=0.985, cos(20deg)=0.94
+    groups = find_duplicate_groups(vecs, threshold=0.95)
+    for g in groups:
+        sims = vecs[g] @ vecs[g].T
+        assert (sims >= 0.95 - 1e-6).all()
+    assert sorted(map(sorted, groups)) == [[0, 1], [2, 3], [4, 5]]
+
+
+def test_incremental_mode_only_returns_groups_with_new_rows():
+    vecs = np.array([[1, 0], [1, 0.01], [0, 1], [0.01, 1]], dtype=np.float32)
+    assert find_duplicate_groups(vecs, 0.95, rows=[3]) == [[2, 3]]
+    assert find_duplicate_groups(vecs, 0.95, groups=["a", "a", "a", "b"], rows=[3]) == []
+
+
+def test_merged_meta_keeps_latest_expiry_and_union_of_tags():
+    metas = [
+        {"expires_at_ts": 300.0, "expires_at": "c", "tags": "tea", "ts": "1"},
+        {"expires_at_ts": 100.0, "expires_at": "a", "tags": "tea, drinks", "ts": "2"},
+        {"tags": "", "ts": "3"},
+    ]
+    out = _merged_meta(metas, keep=2)
+    assert (out["expires_at_ts"], out["expires_at"]) == (300.0, "c")
+    assert out["tags"] == "tea, drinks" and out["merged_count"] == 3 and out["ts"] == "3"
+
+
+def test_consolidate_user_merges_into_newest_and_deletes_the_rest(tmp_path):
+    ltm = NumpyLongTermMemory(str(tmp_path / "v"))
+    emb = np.ones(8, dtype=np.float32)
+    ids = [ltm.add(user_id="u", text=f"I like tea ({i})", embedding=emb, retention_days=28 + i) for i in range(3)]
+    last_expiry = ltm.get_user_memories("u")[1][-1]["expires_at"]
+    other = ltm.add(user_id="u", text="unrelated", embedding=-emb)
+
+    stats = consolidate_user(ltm, "u", new_ids=[ids[-1]])
+    assert stats == {"memories": 4, "clusters": 1, "removed": 2}
+    total, items = ltm.get_user_memories("u")
+    assert total == 2
+    kept = next(m for m in items if m["id"] != other)
+    assert kept["id"] == ids[-1] and kept["expires_at"] == last_expiry
+    assert ltm.keywords.search("u", "tea") == [ids[-1]]
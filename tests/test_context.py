@@ -0,0 +1,47 @@
+from src.context import ContextBuilder, allocate_budget, estimate_tokens
+from src.digital_self import DigitalSelf, update_dynamic
+from src.memory.short_term import ShortTermMemory
+
+
+def test_allocate_budget_passes_surplus_on():
+    assert allocate_budget({"ds": 50, "stm": 500, "ltm": 500}, 700) == {"ds": 50, "stm": 325, "ltm": 325}
+    assert allocate_budget({"ds": 10, "stm": 20, "ltm": 30}, 700) == {"ds": 10, "stm": 20, "ltm": 30}
+    alloc = allocate_budget({"ds": 400, "stm": 400, "ltm": 400}, 700)
+    assert sum(alloc.values()) == 700 and max(alloc.values()) - min(alloc.values()) <= 1
+
+
+def test_blocks_are_rebuilt_only_when_their_inputs_change():
+    ds, stm = DigitalSelf(user_id="u"), ShortTermMemory()
+    builder = ContextBuilder(token_budget=100)
+    stm.add("hello", "said hello")
+    hits = [{"id": "a", "text": "I like tea " * 200, "distance": 0.1}]
+
+    text, log = builder.context(ds, stm, stm.get_recent(), hits)
+    assert estimate_tokens(text) <= 100 + 30  # block headers are outside the budget
+    assert sum(log["allocated"].values()) <= 100
+    again, _ = builder.context(ds, stm, stm.get_recent(), hits)
+    assert again is text
+    assert builder.rebuilt == {"stable": 1, "dynamic": 1, "stm": 1, "ltm": 1}
+
+    stm.add("tea", "talked about tea")
+    update_dynamic(ds, "python question")
+    text, _ = builder.context(ds, stm, stm.get_recent(), hits)
+    assert "talked about tea" in text
+    assert builder.rebuilt == {"stable": 1, "dynamic": 2, "stm": 2, "ltm": 1}
+
+
+def test_per_turn_timestamps_and_rewritten_tags():
+    ds, stm = DigitalSelf(user_id="u"), ShortTermMemory()
+    builder = ContextBuilder()
+    hits = [{"id": "a", "text": "I like tea", "distance": 0.1, "tags": ["food"]}]
+    update_dynamic(ds, "hello there")
+    text, _ = builder.context(ds, stm, stm.get_recent(), hits)
+
+    # a turn that only moves last_updated reuses the whole context
+    update_dynamic(ds, "hello there")
+    again, _ = builder.context(ds, stm, stm.get_recent(), hits)
+    assert again is text and builder.rebuilt["dynamic"] == 1
+
+    # consolidation rewrote the tags of a memory that is hit again at the same distance
+    text, _ = builder.context(ds, stm, stm.get_recent(), [{**hits[0], "tags": ["food", "drinks"]}])
+    assert "'drinks'" in text and builder.rebuilt["ltm"] == 2
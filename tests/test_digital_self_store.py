@@ -0,0 +1,73 @@
+import threading
+import time
+
+from src.digital_self import mark_changed
+from src.digital_self_store import DigitalSelfStore
+
+
+def _store(tmp_path, **kw):
+    return DigitalSelfStore(str(tmp_path / "ds.sqlite3"), legacy_dir=None, **kw)
+
+
+def test_only_dirty_sections_are_rewritten(tmp_path):
+    store = _store(tmp_path)
+    ds = store.get_or_create("u")
+    assert store.flush() == 1
+    assert store.flush() == 0
+    ds.stable.tone = "concise"
+    mark_changed(ds, "stable.tone")
+    store.put(ds)
+    assert store.flush() == 1
+    store.close()
+    assert _store(tmp_path).get("u").stable.tone == "concise"
+
+
+def test_concurrent_turns_never_lose_a_change(tmp_path):
+    store = _store(tmp_path, flush_interval=0.001).start()
+    ds = store.get_or_create("u")
+    done = threading.Event()
+
+    def turns():
+        for i in range(2000):
+            ds.stable.interests.append(f"topic {i}")
+            mark_changed(ds, "stable.interests")
+            store.put(ds)
+        done.set()
+
+    t = threading.Thread(target=turns)
+    t.start()
+    while not done.is_set():
+        store.flush()
+    t.join()
+    store.close()
+    assert len(_store(tmp_path).get("u").stable.interests) == 2000
+
+
+def test_flusher_survives_unexpected_errors(tmp_path):
+    store = _store(tmp_path, flush_interval=0.01)
+
+    class FlakyConnection:
+        """Fails the first row write with a non-sqlite error."""
+
+        def __init__(self, db):
+            self.db, self.failed = db, False
+
+        def execute(self, sql, *args):
+            if sql.startswith("INSERT OR REPLACE") and not self.failed:
+                self.failed = True
+                raise ValueError("not a sqlite error")
+            return self.db.execute(sql, *args)
+
+        def close(self):
+            self.db.close()
+
+    store._db = FlakyConnection(store._db)
+    store.get_or_create("u")
+    store.start()
+    deadline = time.monotonic() + 5
+    while store.flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store._db.failed and store._thread.is_alive()
+    assert store.flushes == 1
+    store.close()
+    assert _store(tmp_path).get("u") is not None
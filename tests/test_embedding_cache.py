@@ -0,0 +1,81 @@
+import hashlib
+import os
+import sqlite3
+import stat
+
+import numpy as np
+
+from src.utils import EmbeddingCache, HashingEmbeddingBackend, configure_embedding_cache, embed_texts, set_embedding_backend
+
+
+class CountingBackend(HashingEmbeddingBackend):
+    def __init__(self) -> None:
+        super().__init__(16)
+        self.calls = []
+
+    def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_batch(texts)
+
+
+def _rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_misses_are_batched_and_deduplicated():
+    backend = set_embedding_backend(CountingBackend())
+    embed_texts(["I like tea", "I  like tea", "hello"])
+    embed_texts(["hello", "I like tea"])
+    assert backend.calls == [["I like tea", "hello"]]
+
+
+def test_disk_tier_is_keyed_by_secret_outside_the_db(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put("m", "I like tea", np.ones(4))
+    cache.close()
+
+    assert stat.S_IMODE(os.stat(path + ".key").st_mode) == 0o600
+    with sqlite3.connect(path) as db:
+        (key,) = db.execute("SELECT key FROM embeddings").fetchone()
+    assert key != hashlib.sha256(b"m\x00I like tea").hexdigest()
+
+    reopened = EmbeddingCache(path)
+    assert reopened.get("m", "I like tea") is not None
+    reopened.close()
+
+    # a lost key makes every row unreachable, so they are dropped
+    os.remove(path + ".key")
+    EmbeddingCache(path).close()
+    assert _rows(path) == 0
+
+
+def test_persist_false_stays_in_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = configure_embedding_cache(path)
+    embed_texts(["my password is hunter2"], persist=False)
+    embed_texts(["I like tea"])
+    assert cache.stats()["memory_items"] == 2
+    assert _rows(path) == 1
+
+
+def test_default_cache_is_memory_only():
+    assert EmbeddingCache().path is None
+
+
+def test_sensitive_turn_is_not_persisted(tmp_path):
+    from src.agent import handle_turn
+    from src.digital_self import DigitalSelf
+    from src.memory.numpy_store import NumpyLongTermMemory
+    from src.memory.session import SessionMemory
+    from src.memory.short_term import ShortTermMemory
+
+    path = str(tmp_path / "cache.sqlite3")
+    configure_embedding_cache(path)
+    ds, ltm = DigitalSelf(user_id="u"), NumpyLongTermMemory(str(tmp_path / "vectors"))
+    out = handle_turn("my bank card pin is 1234", ds, SessionMemory(), ShortTermMemory(), ltm)
+    assert out["sensitive"]
+    assert _rows(path) == 0
+    handle_turn("I enjoy hiking on weekends", ds, SessionMemory(), ShortTermMemory(), ltm)
+    assert _rows(path) == 1
@@ -0,0 +1,36 @@
+import json
+
+from src.digital_self import PrivacyConfig
+from src.ingest import ingest_records, iter_jsonl
+from src.memory.numpy_store import NumpyLongTermMemory
+
+
+def test_ingest_skips_sensitive_and_invalid_records(tmp_path):
+    path = tmp_path / "memories.jsonl"
+    lines = [json.dumps({"user_id": "u", "text": f"note {i}", "tags": ["bulk"]}) for i in range(5)] + [
+        json.dumps({"user_id": "u", "text": "mail me at me@example.com"}),
+        json.dumps({"user_id": "v", "text": "my therapist said hi"}),
+        json.dumps({"user_id": "u", "text": "my therapist said hi"}),
+        json.dumps({"text": "no user"}),
+        "not json",
+        "",
+        "[1, 2]",
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+    def privacy_for(user_id):
+        privacy = PrivacyConfig()
+        if user_id == "v":
+            privacy.sensitive_keywords.append("therapist")
+        return privacy
+
+    ltm = NumpyLongTermMemory(str(tmp_path / "vectors"))
+    batches = []
+    stats = ingest_records(iter_jsonl(str(path)), ltm, privacy_for, batch_size=2,
+                           on_batch=lambda s: batches.append(s["stored"]))
+    assert stats == {"read": 11, "stored": 6, "skipped_sensitive": 2, "skipped_invalid": 3}
+    assert batches == [2, 4, 6]
+    total, items = ltm.get_user_memories("u")
+    assert total == 6 and ltm.get_user_memories("v")[0] == 0
+    assert {m["text"] for m in items if m["tags"] == ["bulk"]} == {f"note {i}" for i in range(5)}
+    assert all("example.com" not in m["text"] for m in items)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from src.memory.keyword_index import KeywordIndex
+from src.memory.long_term import LongTermMemory
+from src.utils import embed_text
+
+
+@pytest.fixture
+def chroma(tmp_path):
+    return LongTermMemory(str(tmp_path / "chroma"), "ltm")
+
+
+def test_search_is_a_per_user_case_insensitive_substring(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    index.add([("1", "u", "I like Green Tea"), ("2", "u", "greenhouse"), ("3", "v", "green"), ("4", "u", "go")])
+    assert sorted(index.search("u", "GREEN")) == ["1", "2"]
+    assert index.search("u", "go") == ["4"]  # too short for a trigram: scanned per user
+    assert index.search("u", '"quoted"') == [] and index.search("u", "  ") == []
+
+    index.delete(["1"])
+    assert index.search("u", "green") == ["2"]
+    index.delete_user("u")
+    assert index.search("u", "green") == [] and index.search("v", "green") == ["3"]
+    assert index.owners(["2", "3"]) == {"3": "v"}
+
+
+def test_forget_by_keyword_and_wipe(chroma):
+    for text in ("I like green tea", "my dog is called Rex", "tea with lemon"):
+        chroma.add(user_id="u", text=text, embedding=embed_text(text))
+    chroma.add(user_id="v", text="I like tea too", embedding=embed_text("I like tea too"))
+
+    assert chroma.delete_by_keyword("u", "tea") == 2
+    assert [m["text"] for m in chroma.get_user_memories("u")[1]] == ["my dog is called Rex"]
+    assert chroma.wipe_user("u") == 1
+    assert chroma.get_user_memories("u")[0] == 0
+    assert chroma.get_user_memories("v")[0] == 1
+    assert chroma.query("v", np.asarray(embed_text("tea")), top_k=5)[0]["text"] == "I like tea too"
@@ -0,0 +1,21 @@
+import pytest
+
+from src.memory.long_term import LongTermMemory
+from src.utils import embed_text, iso_in_days, now_iso
+
+
+def test_legacy_records_without_expires_at_ts_are_visible(tmp_path):
+    ltm = LongTermMemory(str(tmp_path / "chroma"), "ltm")
+    meta = {"user_id": "u", "ts": now_iso(), "memory_type": "long_term", "is_sensitive": False,
+            "expires_at": iso_in_days(30), "tags": ""}
+    ltm._write(["old"], ["I like green tea"], [embed_text("I like green tea")], [meta])
+
+    hits = ltm.query("u", embed_text("green tea"), top_k=3)
+    assert [h["id"] for h in hits] == ["old"]
+    assert ltm.keywords.is_marked("expiry_ts")
+
+    # a second process does not scan again
+    reopened = LongTermMemory(str(tmp_path / "chroma"), "ltm")
+    reopened.migrate_expiry_metadata = lambda *a, **k: pytest.fail("backfilled twice")
+    assert len(reopened.query("u", embed_text("green tea"), top_k=3)) == 1
+
@@ -0,0 +1,27 @@
+import numpy as np
+
+from src.metrics import Histogram
+
+
+def test_tail_quantiles_do_not_snap_to_bucket_bounds():
+    h = Histogram("t")
+    samples = np.linspace(0.0011, 0.0024, 100)  # all inside the (1ms, 2.5ms] bucket
+    for x in samples:
+        h.observe(float(x))
+    for q in (0.5, 0.95, 0.99):
+        assert abs(h.quantile(q) - np.quantile(samples, q)) < 1e-9
+
+
+def test_reservoir_stays_bounded_and_close():
+    h = Histogram("t", reservoir_size=512)
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(-6, 1, 20_000)
+    for x in samples:
+        h.observe(float(x))
+    assert len(h._samples) == 512 and h.count == 20_000
+    assert abs(h.quantile(0.5) / np.quantile(samples, 0.5) - 1) < 0.15
+    assert abs(h.quantile(0.95) / np.quantile(samples, 0.95) - 1) < 0.3
+
+
+def test_empty_histogram():
+    assert Histogram("t").quantile(0.99) == 0.0
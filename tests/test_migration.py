@@ -0,0 +1,132 @@
+import os
+import threading
+
+import pytest
+
+from src.memory.long_term import LongTermMemory
+from src.memory.numpy_store import NumpyLongTermMemory
+from src.migration import Cutover, WriteFence, migrate_embeddings, set_active_embedding
+from src.utils import embed_text, embedding_model_name, make_embedding_backend
+
+
+def _add(ltm, user_id, texts):
+    return ltm.add_many([{"user_id": user_id, "text": t, "embedding": embed_text(t)} for t in texts])
+
+
+def _ids(ltm):
+    return {mid for page in ltm._iter_pages([]) for mid in page["ids"]}
+
+
+def test_migration_copies_writes_and_deletes_made_meanwhile(tmp_path):
+    source = NumpyLongTermMemory(str(tmp_path / "src"))
+    target = NumpyLongTermMemory(str(tmp_path / "dst"))
+    ids = _add(source, "u", [f"memory {i}" for i in range(40)])
+    fence = WriteFence(str(tmp_path))
+    late = []
+
+    def on_page(state):
+        if not late:
+            source.delete_by_id(ids[-1])  # not copied yet: must not reappear
+            source.delete_by_id(ids[0])  # already copied: catch-up drops it
+            late.extend(_add(source, "u", ["written during the migration"]))
+
+    entered = threading.Event()
+
+    def writer():
+        with fence.shared():
+            entered.set()
+
+    def on_cutover():
+        # the final pass and the switch run with every writer fenced off
+        threading.Thread(target=writer, daemon=True).start()
+        assert not entered.wait(0.2)
+
+    state = migrate_embeddings(
+        source, target, make_embedding_backend("local:32"), str(tmp_path / "ckpt.json"),
+        page_size=10, on_page=on_page, fence=fence, on_cutover=on_cutover,
+    )
+    assert state["completed"]
+    assert _ids(target) == _ids(source) == (set(ids[1:-1]) | set(late))
+    assert entered.wait(2)
+
+    source.drop_store()
+    assert not os.path.exists(source.persist_dir)
+
+
+def test_fenced_writes_wait_for_the_exclusive_fence(tmp_path):
+    fence = WriteFence(str(tmp_path))
+    ltm = NumpyLongTermMemory(str(tmp_path / "ltm"))
+    ltm.fence = fence
+    with fence.shared():
+        _add(ltm, "u", ["a write inside a turn passes through"])
+    done = threading.Event()
+    with fence.exclusive():
+        threading.Thread(target=lambda: (_add(ltm, "u", ["blocked"]), done.set()), daemon=True).start()
+        assert not done.wait(0.2)
+    assert done.wait(2)
+    assert ltm.get_user_memories("u")[0] == 2
+
+
+def test_fenced_pass_syncs_only_journaled_users(tmp_path):
+    fence = WriteFence(str(tmp_path))
+    source = NumpyLongTermMemory(str(tmp_path / "src"))
+    target = NumpyLongTermMemory(str(tmp_path / "dst"))
+    for user in ("a", "b", "c"):
+        _add(source, user, [f"{user} memory {i}" for i in range(5)])
+    source.fence = fence
+    source._ensure_keyword_index()
+    kept = source._user_page("a", ["metadatas"])
+    scans = []
+    iter_pages = source._iter_pages
+
+    def counting(include, page_size=1000, start=0):
+        scans.append(start)
+        yield from iter_pages(include, page_size, start)
+        if len(scans) == 2:
+            # after the full catch-up pass: only the journal can carry these
+            _add(source, "a", ["written after the full pass"])
+            source.delete_by_id(kept["ids"][1])
+            source.merge_memories("a", kept["ids"][0], {**kept["metadatas"][0], "tags": "moved"}, [])
+
+    source._iter_pages = counting
+    migrate_embeddings(
+        source, target, make_embedding_backend("local:32"), str(tmp_path / "ckpt.json"), page_size=4, fence=fence
+    )
+    assert len(scans) == 2
+    assert _ids(target) == _ids(source)
+    metas = dict(zip(*(target._user_page("a", ["metadatas"])[k] for k in ("ids", "metadatas"))))
+    assert metas[kept["ids"][0]]["tags"] == "moved"
+    assert not os.path.exists(fence.journal)
+
+
+def test_cutover_switches_backend_and_store(tmp_path):
+    data_dir = str(tmp_path)
+    source = NumpyLongTermMemory(os.path.join(data_dir, "a"))
+    opened = []
+
+    def reopen(backend):
+        opened.append(backend.name)
+        return NumpyLongTermMemory(os.path.join(data_dir, backend.name))
+
+    cutover = Cutover(source, reopen, data_dir=data_dir)
+    switched = []
+    cutover.on_switch(switched.append)
+    with cutover.turn() as ltm:
+        assert ltm is source and not opened
+
+    set_active_embedding("local:32", data_dir)
+    with cutover.turn() as ltm:
+        assert ltm is not source and switched == [ltm]
+    assert embedding_model_name() == opened[0] == make_embedding_backend("local:32").name
+    with cutover.turn() as again:
+        assert again is ltm and len(opened) == 1
+
+
+def test_chroma_drop_store(tmp_path):
+    pytest.importorskip("chromadb")
+    ltm = LongTermMemory(str(tmp_path / "chroma"), "ltm__old")
+    _add(ltm, "u", ["I like tea", "I like coffee"])
+    ltm.drop_store()
+    assert not os.path.exists(ltm.keywords.path)
+    reopened = LongTermMemory(str(tmp_path / "chroma"), "ltm__old")
+    assert reopened.get_user_memories("u")[0] == 0
@@ -0,0 +1,220 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from src.memory.expiry import ExpirySweeper
+from src.memory.numpy_store import NumpyLongTermMemory
+from src.utils import embed_text
+
+
+def _add(ltm, user_id, texts):
+    return ltm.add_many([{"user_id": user_id, "text": t, "embedding": embed_text(t)} for t in texts])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyLongTermMemory(str(tmp_path / "vectors"))
+
+
+def test_tombstones_survive_reopen(tmp_path, store):
+    ids = _add(store, "u", [f"memory number {i}" for i in range(10)])
+    store.delete_by_id(ids[3])
+    store.delete_by_keyword("u", "number 7")
+
+    reopened = NumpyLongTermMemory(str(tmp_path / "vectors"))
+    total, items = reopened.get_user_memories("u")
+    assert total == 8
+    assert {ids[3], ids[7]}.isdisjoint(m["id"] for m in items)
+
+
+def test_compaction_keeps_live_rows_and_drops_files(store):
+    ids = _add(store, "u", [f"fact {i} about tea" for i in range(200)])
+    shard = store._shard("u")
+    gen = shard.gen
+    store._delete_ids(ids[:150], "u")
+    assert shard.gen > gen and shard.dead == 0 and shard.n == 50
+    assert sorted(os.listdir(shard.path)) == [
+        "CURRENT", "USER", f"log.{shard.gen}.jsonl", f"norms.{shard.gen}.npy", f"vectors.{shard.gen}.npy"
+    ]
+    hits = store.query("u", embed_text("fact 160 about tea"), top_k=1)
+    assert hits[0]["id"] == ids[160]
+
+
+def test_delete_by_id_touches_only_the_owner(store):
+    a = _add(store, "a", ["I like tea"])
+    _add(store, "b", ["I like coffee"])
+    store._ensure_keyword_index()  # one-time backfill for stores older than the index
+    store._shards.pop("b")  # not loaded: a delete must not need to open it
+    store.delete_by_id(a[0])
+    assert "b" not in store._shards
+    assert store.get_user_memories("a")[0] == 0
+    with pytest.raises(ValueError):
+        store._remove(a, None)
+
+
+def test_query_is_consistent_during_compaction(store):
+    texts = [f"note {i}" for i in range(300)]
+    ids = _add(store, "u", texts)
+    by_id = dict(zip(ids, texts))
+    errors = []
+
+    def churn():
+        for i in range(0, 300, 10):
+            store._delete_ids(ids[i : i + 10], "u")
+            store.import_records(ids[i : i + 10], texts[i : i + 10], [embed_text(t) for t in texts[i : i + 10]],
+                                 [{"user_id": "u", "expires_at_ts": 4e9} for _ in range(10)])
+
+    t = threading.Thread(target=churn)
+    t.start()
+    q = np.asarray(embed_text("note 5"))
+    while t.is_alive():
+        for h in store.query("u", q, top_k=5):
+            if by_id[h["id"]] != h["text"]:
+                errors.append(h)
+    t.join()
+    assert not errors
+
+
+def test_writes_never_train_the_quantizer(tmp_path, monkeypatch):
+    import src.memory.numpy_store as numpy_store
+
+    monkeypatch.setattr(numpy_store, "QUANT_TRAIN_SIZE", 8)
+    store = NumpyLongTermMemory(str(tmp_path / "vectors"), quantize="int8")
+    _add(store, "u", [f"memory {i}" for i in range(50)])
+    assert store.quantizer is None
+    assert not os.path.exists(os.path.join(store.persist_dir, "quantizer.npz"))
+
+
+def test_codes_are_persisted_and_reused(tmp_path, monkeypatch):
+    path = str(tmp_path / "vectors")
+    store = NumpyLongTermMemory(path, quantize="int8", rerank=2)
+    texts = [f"memory {i} about topic {i % 7}" for i in range(300)]
+    ids = _add(store, "u", texts)
+    store.train_quantizer()
+    _add(store, "u", ["one more after training"])  # encoded on write
+    shard = store._shard("u")
+    assert shard._coded == shard.n == 301
+    assert os.path.exists(shard._codes_path(shard.gen))
+    q = embed_text("memory 42 about topic 0")
+    expected = [h["id"] for h in store.query("u", q, top_k=3)]
+
+    reopened = NumpyLongTermMemory(path, quantize="int8", rerank=2)
+    shard = reopened._shard("u")
+    assert shard._coded == 301 and isinstance(shard.codes, np.memmap)
+    monkeypatch.setattr(shard.quantizer, "encode", lambda x: pytest.fail("codes were re-encoded"))
+    assert [h["id"] for h in reopened.query("u", q, top_k=3)] == expected
+    assert expected[0] == ids[42]
+
+
+def test_compaction_keeps_codes(tmp_path):
+    store = NumpyLongTermMemory(str(tmp_path / "vectors"), quantize="int8")
+    ids = _add(store, "u", [f"fact {i} about tea" for i in range(200)])
+    store.train_quantizer()
+    shard = store._shard("u")
+    before = {mid: shard.codes[shard.row_of[mid]].copy() for mid in ids[150:]}
+    store._delete_ids(ids[:150], "u")
+    assert shard._coded == shard.n == 50
+    for mid, code in before.items():
+        assert np.array_equal(shard.codes[shard.row_of[mid]], code)
+
+    reopened = NumpyLongTermMemory(str(tmp_path / "vectors"), quantize="int8")
+    assert reopened._shard("u")._coded == 50
+
+
+def test_forget_and_wipe_leave_other_users_alone(tmp_path, store):
+    _add(store, "u", ["I like green tea", "my dog is called Rex", "Tea with lemon"])
+    _add(store, "v", ["I like tea too"])
+    assert store.delete_by_keyword("u", "tea") == 2
+    assert [m["text"] for m in store.get_user_memories("u")[1]] == ["my dog is called Rex"]
+    assert store.wipe_user("u") == 1
+    assert store.get_user_memories("u")[0] == 0
+    assert store.query("u", embed_text("dog"), top_k=5) == []
+
+    reopened = NumpyLongTermMemory(str(tmp_path / "vectors"))
+    assert reopened.get_user_memories("u")[0] == 0
+    assert reopened.query("v", embed_text("tea"), top_k=5)[0]["text"] == "I like tea too"
+
+
+def test_hybrid_query_scores_only_lexical_candidates(store, monkeypatch):
+    _add(store, "u", [f"note about topic {i}" for i in range(50)] + ["kubernetes operator rollout plan"])
+    scored = []
+    score_ids = store.score_ids
+
+    def spy(user_id, embedding, ids, *args):
+        scored.append(len(ids))
+        return score_ids(user_id, embedding, ids, *args)
+
+    monkeypatch.setattr(store, "score_ids", spy)
+
+    q = "kubernetes rollout"
+    hits, log = store.hybrid_query("u", q, embed_text(q), top_k=1, candidates=5)
+    assert hits[0]["text"] == "kubernetes operator rollout plan"
+    assert hits[0]["lexical_score"] > 0 and hits[0]["fused_score"] > 0
+    assert log["lexical_candidates"] == 1 and scored == [1] and log["store_size"] == 51
+    assert not log["fallback_vector_query"]
+
+    # no shared terms: the vector query fills in
+    hits, log = store.hybrid_query("u", "zzz", embed_text("zzz"), top_k=3)
+    assert log["fallback_vector_query"] and len(hits) == 3
+
+    store.delete_by_keyword("u", "kubernetes")
+    hits, log = store.hybrid_query("u", q, embed_text(q), top_k=1)
+    assert log["lexical_candidates"] == 0 and hits[0]["lexical_score"] is None
+
+
+def test_open_shards_are_bounded(tmp_path):
+    store = NumpyLongTermMemory(str(tmp_path / "vectors"), max_open_shards=4)
+    fds = len(os.listdir("/proc/self/fd"))
+    for i in range(40):
+        _add(store, f"user{i}", [f"note {i}", f"other note {i}"])
+    assert len(store._shards) <= 4
+    assert len(os.listdir("/proc/self/fd")) - fds <= 2 * 4 + 2
+
+    # evicted shards reload from disk and keep taking writes
+    _add(store, "user0", ["a third note"])
+    assert store.get_user_memories("user0")[0] == 3
+    assert store.query("user1", embed_text("note 1"), top_k=1)[0]["text"] == "note 1"
+
+    # a scan over every user does not push out the hot shards
+    hot = list(store._shards)[-2:]
+    assert sum(len(page["ids"]) for page in store._iter_pages([])) == 81
+    assert store.sweep_expired() == 0
+    assert set(hot) <= set(store._shards) and len(store._shards) <= 4
+
+
+def test_reads_for_unknown_users_touch_nothing(tmp_path, store):
+    before = sorted(os.listdir(store.persist_dir))
+    assert store.query("ghost", embed_text("x")) == []
+    assert store.get_user_memories("ghost") == (0, [])
+    assert store.score_ids("ghost", embed_text("x"), ["a"]) == []
+    assert store.purge_expired("ghost") == 0
+    assert store.wipe_user("ghost") == 0
+    assert sorted(os.listdir(store.persist_dir)) == before and "ghost" not in store._shards
+
+
+def test_sweeper_builds_the_expiry_heap_in_the_background(store):
+    store.add_many([{"user_id": "u", "text": "old", "embedding": embed_text("old"), "retention_days": -1}])
+    scanning, release = threading.Event(), threading.Event()
+    pages = store._iter_metadata_pages
+
+    def slow_pages(*args):
+        scanning.set()
+        release.wait(5)
+        yield from pages(*args)
+
+    store._iter_metadata_pages = slow_pages
+    sweeper = ExpirySweeper(store, interval_seconds=0.05).start()
+    try:
+        assert scanning.wait(2)
+        # the store keeps taking writes while the heap loads, and they are swept too
+        store.add_many([{"user_id": "u", "text": "new", "embedding": embed_text("new"), "retention_days": -1}])
+        release.set()
+        for _ in range(100):
+            if sweeper.swept_total >= 2:
+                break
+            threading.Event().wait(0.05)
+    finally:
+        sweeper.stop()
+    assert sweeper.swept_total == 2 and store.get_user_memories("u")[0] == 0
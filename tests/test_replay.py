@@ -0,0 +1,51 @@
+import json
+
+from src.replay import partition_turns, replay_transcripts, user_bucket
+
+
+def _write_turns(path, turns):
+    path.write_text("".join(json.dumps(t) + "\n" for t in turns))
+
+
+def test_partition_keeps_each_users_turns_together_and_in_order(tmp_path):
+    turns = [{"user_id": f"user{i % 5}", "text": f"turn {i}"} for i in range(40)] + [{"user_id": "x"}]
+    _write_turns(tmp_path / "in.jsonl", turns)
+    paths, stats = partition_turns(str(tmp_path / "in.jsonl"), str(tmp_path), 3)
+    assert stats == {"read": 41, "skipped_invalid": 1}
+
+    seen = {}
+    for i, p in enumerate(paths):
+        with open(p) as f:
+            for line in f:
+                rec = json.loads(line)
+                assert user_bucket(rec["user_id"], 3) == i
+                seen.setdefault(rec["user_id"], []).append(rec["text"])
+    assert seen == {f"user{u}": [f"turn {i}" for i in range(u, 40, 5)] for u in range(5)}
+
+
+def test_replay_runs_every_turn_and_emits_final_profiles(tmp_path):
+    turns = []
+    for i in range(3):
+        turns += [
+            {"user_id": f"user{i}", "text": "remember that I like green tea"},
+            {"user_id": f"user{i}", "text": "please be concise"},
+            {"user_id": f"user{i}", "text": "what tea do I like?"},
+        ]
+    _write_turns(tmp_path / "in.jsonl", turns)
+    profiles = []
+    stats = replay_transcripts(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), workers=1,
+                               embed_backend="local:64", on_profile=profiles.append)
+    assert stats["users"] == 3 and stats["turns"] == 9
+
+    with open(tmp_path / "out.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    by_user = {}
+    for r in records:
+        by_user.setdefault(r["user_id"], []).append(r)
+    for user_id, recs in by_user.items():
+        assert [r["type"] for r in recs] == ["turn", "turn", "turn", "profile"]
+        assert [r["turn_index"] for r in recs[:3]] == [0, 1, 2]
+        assert recs[0]["stored_long_term_id"] and recs[2]["retrieval_log"]["ltm_retrieved_count"] == 1
+        assert recs[3]["digital_self"]["stable"]["tone"] == "concise"
+    assert sorted(p["user_id"] for p in profiles) == ["user0", "user1", "user2"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in.jsonl", "out.jsonl"]  # scratch removed
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from src.digital_self import DigitalSelf, dirty_fields
+from src.memory.long_term import AsyncLongTermMemory
+from src.memory.numpy_store import NumpyLongTermMemory
+from src.memory.session import SessionMemory
+from src.memory.short_term import short_term_for_mode
+from src.retrieval import abuild_context_package, build_context_package, set_ltm_gate
+from src.utils import embed_text
+
+
+@pytest.fixture
+def ltm(tmp_path):
+    return NumpyLongTermMemory(str(tmp_path / "vectors"))
+
+
+@pytest.fixture
+def gate():
+    yield set_ltm_gate
+    set_ltm_gate(None)
+
+
+def _retrieve(ltm, ds, text="what tea do I like?"):
+    out = build_context_package(text, ds, SessionMemory(), short_term_for_mode("stm_ltm"), ltm)
+    return out["retrieval_log"]
+
+
+def _add(ltm, user_id, texts):
+    return ltm.add_many([{"user_id": user_id, "text": t, "embedding": embed_text(t)} for t in texts])
+
+
+def test_gate_off_computes_no_centroids(ltm, monkeypatch):
+    ds = DigitalSelf(user_id="u")
+    _add(ltm, "u", ["I like green tea"])
+    monkeypatch.setattr(ltm, "profile_centroids", lambda *a: pytest.fail("centroids computed with the gate off"))
+    log = _retrieve(ltm, ds)
+    assert log["ltm_gate"] == {"enabled": False, "skipped": False}
+    assert log["ltm_retrieved_count"] == 1
+    assert not dirty_fields(ds)
+
+
+def test_gate_skips_users_without_memories(ltm, gate):
+    gate(0.3)
+    log = _retrieve(ltm, DigitalSelf(user_id="nobody"))
+    assert log["ltm_gate"]["skipped"] and log["ltm_retrieved_count"] == 0
+
+
+def test_gate_does_not_dirty_the_profile_every_turn(ltm, gate):
+    gate(-1.0)
+    ds = DigitalSelf(user_id="u")
+    _add(ltm, "u", [f"I like tea variety number {i}" for i in range(200)])
+    _retrieve(ltm, ds)
+    assert "profile.embedding" in dirty_fields(ds)
+    ds._dirty.clear()
+    for i in range(3):
+        _add(ltm, "u", [f"I like tea variety number {200 + i}"])
+        _retrieve(ltm, ds)
+    assert "profile.embedding" not in dirty_fields(ds)
+
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_async_builder_matches_the_sync_one(ltm, mode):
+    _add(ltm, "u", ["I like green tea", "I drive a blue car", "tea in the morning"])
+    ds = DigitalSelf(user_id="u")
+
+    def build(use_async):
+        args = ("what tea do I like?", ds, SessionMemory(), short_term_for_mode("stm_ltm"))
+        if use_async:
+            out = asyncio.run(abuild_context_package(*args, AsyncLongTermMemory(ltm), retrieval_mode=mode))
+        else:
+            out = build_context_package(*args, ltm, retrieval_mode=mode)
+        log = out["retrieval_log"]
+        return out["context_text"], log["ltm_ids"], log["ltm_search"]["mode"], log["ltm_cache"]["hit"]
+
+    first, cached = build(False), build(True)
+    assert cached[:3] == first[:3] and (first[3], cached[3]) == (False, True)
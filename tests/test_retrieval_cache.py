@@ -0,0 +1,51 @@
+import pytest
+
+from src.digital_self import DigitalSelf
+from src.memory.numpy_store import NumpyLongTermMemory
+from src.memory.session import SessionMemory
+from src.memory.short_term import short_term_for_mode
+from src.retrieval import build_context_package
+from src.utils import embed_text
+
+
+@pytest.fixture
+def ltm(tmp_path):
+    return NumpyLongTermMemory(str(tmp_path / "vectors"))
+
+
+def _retrieve(ltm, ds, text="what tea do I like?"):
+    out = build_context_package(text, ds, SessionMemory(), short_term_for_mode("stm_ltm"), ltm)
+    return out["retrieval_log"]
+
+
+def _add(ltm, user_id, texts):
+    return ltm.add_many([{"user_id": user_id, "text": t, "embedding": embed_text(t)} for t in texts])
+
+
+def test_cache_is_invalidated_by_writes_and_forgetting(ltm):
+    ds = DigitalSelf(user_id="u")
+    ids = _add(ltm, "u", ["I like green tea", "I like black coffee"])
+    first = _retrieve(ltm, ds)
+    assert first["ltm_cache"]["hit"] is False
+    assert _retrieve(ltm, ds)["ltm_cache"]["hit"] is True
+
+    new = _add(ltm, "u", ["I like oolong tea"])
+    log = _retrieve(ltm, ds)
+    assert log["ltm_cache"]["hit"] is False and new[0] in log["ltm_ids"]
+
+    ltm.delete_by_keyword("u", "green")
+    log = _retrieve(ltm, ds)
+    assert log["ltm_cache"]["hit"] is False and ids[0] not in log["ltm_ids"]
+
+    ltm.delete_by_id(new[0])
+    assert new[0] not in _retrieve(ltm, ds)["ltm_ids"]
+    ltm.wipe_user("u")
+    assert _retrieve(ltm, ds)["ltm_ids"] == []
+
+
+def test_other_users_writes_keep_the_cache(ltm):
+    ds = DigitalSelf(user_id="u")
+    _add(ltm, "u", ["I like green tea"])
+    _retrieve(ltm, ds)
+    _add(ltm, "v", ["I like green tea too"])
+    assert _retrieve(ltm, ds)["ltm_cache"]["hit"] is True
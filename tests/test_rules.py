@@ -0,0 +1,39 @@
+from src.rules import RuleEngine, default_rule_engine
+
+
+def test_default_rules():
+    engine = default_rule_engine()
+    s = engine.scan("I prefer concise answers about Kubernetes. I like Rust and Go. I don't like YAML.")
+    assert s.topic == "devops" and s.tone == "concise"
+    assert s.interest == "Rust and Go"  # original casing
+    assert s.dislike == "yaml"
+    assert s.store_ltm
+
+    s = engine.scan("how do I write a loop?")
+    assert s == ("general", None, None, None, False)
+
+
+def test_lowest_priority_number_wins():
+    engine = default_rule_engine()
+    # memory (10) outranks python (40) wherever it appears
+    assert engine.scan("python question: can you recall my setup?").topic == "memory"
+    assert engine.scan("walk me through it, be concise").tone == "concise"
+
+
+def test_overlapping_phrases_all_fire():
+    engine = RuleEngine()
+    engine.add_topic_rule("banking", ["bank"], priority=20)
+    engine.add_topic_rule("fishing", ["bank fishing"], priority=10)
+    engine.add_rule("store", "bank")
+    assert engine.scan("bank fishing trip").topic == "fishing"
+    s = engine.scan("my bank account")
+    assert s.topic == "banking" and s.store_ltm
+
+
+def test_rules_added_later_are_picked_up():
+    engine = RuleEngine()
+    assert engine.scan("terraform plan").topic == "general"
+    engine.add_topic_rule("Infra", ["terraform"])
+    engine.add_rule("topic", "   ", "ignored")
+    assert engine.scan("terraform plan").topic == "infra"
+    assert len(engine) == 1
@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from src.digital_self import DigitalSelf
+from src.memory.short_term import ShortTermMemory
+from src.server import SessionRegistry, TurnService, _make_handler
+
+
+def _registry(load_ds, **kw):
+    return SessionRegistry(load_ds, lambda ds: None, ShortTermMemory, **kw)
+
+
+def test_slow_load_does_not_block_other_users():
+    release = threading.Event()
+
+    def load(user_id):
+        if user_id == "slow":
+            release.wait(5)
+        return DigitalSelf(user_id=user_id)
+
+    reg = _registry(load)
+    t = threading.Thread(target=reg.acquire, args=("slow",))
+    t.start()
+    time.sleep(0.05)
+    t0 = time.monotonic()
+    reg.release(reg.acquire("fast"))
+    assert time.monotonic() - t0 < 1.0
+    release.set()
+    t.join()
+
+
+def test_concurrent_acquires_load_once_and_failures_are_not_cached():
+    loads = []
+    fail = [True]
+
+    def load(user_id):
+        loads.append(user_id)
+        time.sleep(0.2)
+        if fail[0]:
+            raise OSError("db unavailable")
+        return DigitalSelf(user_id=user_id)
+
+    reg = _registry(load)
+    errors = []
+
+    def worker():
+        try:
+            reg.acquire("u")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1 and len(errors) == 4 and len(reg) == 0
+
+    fail[0] = False
+    state = reg.acquire("u")
+    assert state.ds.user_id == "u" and state.in_use == 1
+
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def start(service):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(service))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_handler_error_returns_500_json(http_server):
+    class Broken(TurnService):
+        def turn(self, user_id, text):
+            raise RuntimeError("boom")
+
+    url = http_server(Broken(_registry(lambda u: DigitalSelf(user_id=u)), None, lambda ds: None))
+    req = urllib.request.Request(url + "/turn", data=json.dumps({"user_id": "u", "text": "hi"}).encode())
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        urllib.request.urlopen(req, timeout=5)
+    assert exc.value.code == 500
+    assert json.loads(exc.value.read()) == {"error": "internal error"}
+
+
+def test_control_command_output_is_returned(http_server):
+    url = http_server(TurnService(_registry(lambda u: DigitalSelf(user_id=u)), None, lambda ds: None))
+
+    def post(text):
+        req = urllib.request.Request(url + "/turn", data=json.dumps({"user_id": "u", "text": text}).encode())
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.loads(resp.read())
+
+    out = post(":show ltm")
+    assert out["handled_control"] and out["control_output"] == "LTM disabled in this memory_mode."
+    assert post(":show stm")["control_output"] == "STM items (0):"
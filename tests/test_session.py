@@ -0,0 +1,93 @@
+import os
+import signal
+import stat
+import subprocess
+import sys
+
+import pytest
+
+import src.memory.session as session_mod
+from src.agent import handle_turn
+from src.digital_self import DigitalSelf
+from src.memory.session import SessionMemory, set_session_spill
+from src.memory.short_term import ShortTermMemory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def spill_root(tmp_path, monkeypatch):
+    """A fresh per-process spill directory for the test, removed afterwards."""
+    monkeypatch.setattr(session_mod, "_SPILL_ROOT", None)
+    monkeypatch.setattr(session_mod.tempfile, "tempdir", str(tmp_path))
+    yield
+    session_mod._remove_spill_root()
+
+
+def test_memory_is_bounded_and_nothing_spills_by_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_mod.tempfile, "tempdir", str(tmp_path))
+    s = SessionMemory(hot_size=10, compact_every=5, max_summaries=3)
+    for i in range(500):
+        s.add("user", f"message {i} " + "x" * 5000)
+    assert len(s.get()) == 10 and s.get()[-1]["content"].startswith("message 499")
+    assert len(s.summaries()) <= 4
+    assert all(len(m["content"]) <= s.max_chars for m in s.get())
+    assert not s.spill and os.listdir(tmp_path) == []
+    assert len(list(s.history())) == 10 + len(s._pending)
+
+
+def test_spill_is_redacted_private_and_removed(spill_root):
+    s = SessionMemory(spill=True)
+    s.add("user", "mail me at someone@example.com")
+    s.add("assistant", "noted")
+    history = list(s.history())
+    assert [m["content"] for m in history] == ["mail me at [REDACTED_EMAIL]", "noted"]
+    assert s.get()[0]["content"] == "mail me at someone@example.com"  # the live window is unchanged
+
+    root = session_mod._SPILL_ROOT
+    assert stat.S_IMODE(os.stat(root).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(s._spill_path).st_mode) == 0o600
+    path = s._spill_path
+    s.close()
+    assert not os.path.exists(path)
+    session_mod._remove_spill_root()
+    assert not os.path.exists(root)
+
+
+def test_turns_spill_the_user_specific_redaction(spill_root):
+    ds = DigitalSelf(user_id="u")
+    ds.privacy.sensitive_keywords.append("card")
+    s = SessionMemory(spill=True)
+    handle_turn("my card is 4111 1111 1111 1111", ds, s, ShortTermMemory(), None)
+    spilled = "\n".join(m["content"] for m in s.history())
+    assert "4111" not in spilled and "[REDACTED_CARD]" in spilled
+
+
+def test_set_session_spill_sets_the_default(monkeypatch):
+    monkeypatch.setattr(signal, "signal", lambda *a: None)
+    try:
+        set_session_spill(True)
+        assert SessionMemory().spill
+    finally:
+        set_session_spill(False)
+    assert not SessionMemory().spill
+
+
+def test_spill_directory_is_removed_on_sigterm(tmp_path):
+    script = (
+        "import os, sys, time\n"
+        "from src.memory.session import SessionMemory, set_session_spill, spill_root\n"
+        "set_session_spill(True)\n"
+        "s = SessionMemory()\n"
+        "s.add('user', 'hello')\n"
+        "s.flush()\n"
+        "print(spill_root(), flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    env = {**os.environ, "TMPDIR": str(tmp_path)}
+    proc = subprocess.Popen([sys.executable, "-c", script], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    root = proc.stdout.readline().strip()
+    assert os.path.isdir(root) and os.listdir(root)
+    proc.send_signal(signal.SIGTERM)
+    assert proc.wait(10) == -signal.SIGTERM
+    assert not os.path.exists(root)
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from src.memory.long_term import LongTermMemory, ShardLayout, read_layout, write_layout
+from src.migration import Cutover, WriteFence, finished_reshards, reshard_ltm
+from src.utils import embed_text
+
+pytest.importorskip("chromadb")
+
+
+def _add(ltm, user_id, texts, **kwargs):
+    return ltm.add_many([{"user_id": user_id, "text": t, "embedding": embed_text(t), **kwargs} for t in texts])
+
+
+def _names(ltm):
+    return sorted(getattr(c, "name", c) for c in ltm.client.list_collections())
+
+
+def test_user_shards_route_and_wipe_drops_the_collection(tmp_path):
+    ltm = LongTermMemory(str(tmp_path), "ltm", ShardLayout("user"))
+    _add(ltm, "a", ["I like tea", "tea with lemon"])
+    _add(ltm, "b", ["I like coffee"])
+    assert len(ltm._all_cols()) == 2
+    assert ltm._col_for("a").count() == 2 and ltm._col_for("b").count() == 1
+    assert ltm.query("b", embed_text("tea"), top_k=5)[0]["text"] == "I like coffee"
+
+    assert ltm.wipe_user("a") == 2
+    assert ltm._shard_name("a") not in _names(ltm)
+    assert ltm.get_user_memories("b")[0] == 1
+
+
+def test_hash_shards_spread_users(tmp_path):
+    ltm = LongTermMemory(str(tmp_path), "ltm", ShardLayout.parse("hash:4"))
+    for i in range(20):
+        _add(ltm, f"user{i}", [f"memory of user {i}"])
+    assert sum(c.count() for c in ltm._all_cols()) == 20
+    assert len(ltm._all_cols()) > 1
+    assert ltm.get_user_memories("user7")[1][0]["text"] == "memory of user 7"
+
+
+def test_reshard_copies_verifies_and_switches(tmp_path):
+    persist = str(tmp_path / "chroma")
+    source = LongTermMemory(persist, "ltm")
+    ids = _add(source, "a", [f"note {i}" for i in range(30)])
+    _add(source, "b", ["an expired note"], retention_days=-1)
+    # another model's collection that happens to share the user-shard prefix
+    other = LongTermMemory(persist, "ltm__ultra")
+    _add(other, "a", ["kept"])
+
+    target = LongTermMemory(persist, "ltm", ShardLayout("user"))
+    late = []
+
+    def on_page(state):
+        if not late:
+            source.delete_by_id(ids[0])
+            late.extend(_add(source, "b", ["written during the copy"]))
+
+    cutover = Cutover(source, lambda backend: LongTermMemory(persist, "ltm", read_layout(persist, "ltm")),
+                      data_dir=str(tmp_path))
+    ckpt = str(tmp_path / "migrations" / "ckpt.json")
+    state = reshard_ltm(source, target, ckpt, page_size=8, on_page=on_page, fence=WriteFence(str(tmp_path)))
+    assert state["completed"] and state["skipped_expired"] >= 1
+    assert read_layout(persist, "ltm") == ShardLayout("user")
+    # the source is left for reshard-ltm --drop_source, which finds it through the checkpoint
+    assert _names(source).count("ltm") == 1
+    assert finished_reshards("ltm", ShardLayout("user"), str(tmp_path)) == [(ckpt, ShardLayout())]
+
+    source.drop_store()
+    assert "ltm" not in _names(target) and "ltm__ultra" in _names(target)
+    assert not os.path.exists(source.keywords.path)
+    assert read_layout(persist, "ltm") == ShardLayout("user")
+
+    with cutover.turn() as ltm:
+        assert ltm is not source and ltm.layout == ShardLayout("user")
+        assert ltm.get_user_memories("a")[0] == 29
+        assert [m["id"] for m in ltm.get_user_memories("b")[1]] == late
+    assert other.get_user_memories("a")[0] == 1
+
+
+def test_reshard_carries_records_without_text(tmp_path):
+    persist = str(tmp_path / "chroma")
+    source = LongTermMemory(persist, "ltm")
+    _add(source, "a", ["note"])
+    source.import_records(["blank"], [""], [embed_text("blank")], [{"user_id": "a", "ts": "2024-01-01T00:00:00"}])
+    target = LongTermMemory(persist, "ltm", ShardLayout("user"))
+    state = reshard_ltm(source, target, str(tmp_path / "ckpt.json"), fence=WriteFence(str(tmp_path)))
+    assert state["completed"] and read_layout(persist, "ltm") == ShardLayout("user")
+    assert "blank" in target._user_page("a", [])["ids"]
+
+
+@pytest.mark.parametrize("fenced", [False, True])
+def test_failed_verification_keeps_the_old_layout(tmp_path, monkeypatch, fenced):
+    persist = str(tmp_path / "chroma")
+    source = LongTermMemory(persist, "ltm")
+    _add(source, "a", ["note"])
+    write_layout(persist, "ltm", ShardLayout())
+    target = LongTermMemory(persist, "ltm", ShardLayout("user"))
+    # a target that loses records: the verification must catch it
+    monkeypatch.setattr(target, "import_records", lambda ids, *a: len(ids))
+    fence = WriteFence(str(tmp_path)) if fenced else None
+    with pytest.raises(RuntimeError, match="verification failed"):
+        reshard_ltm(source, target, str(tmp_path / "ckpt.json"), fence=fence)
+    assert fence is None or not os.path.exists(fence.journal)
+    assert read_layout(persist, "ltm") == ShardLayout()
+    assert source.get_user_memories("a")[0] == 1
@@ -0,0 +1,58 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import src.memory.short_term as short_term
+from src.memory.short_term import ShortTermMemory
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand."""
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(short_term, "time", SimpleNamespace(monotonic=lambda: now.t, time=time.time))
+    return now
+
+
+def test_ring_buffer_keeps_the_newest_items():
+    stm = ShortTermMemory(max_items=3)
+    for i in range(5):
+        stm.add(f"text {i}", f"summary {i}", ["t"])
+    recent = stm.get_recent()
+    assert len(stm) == 3
+    assert [it["summary"] for it in recent] == ["summary 4", "summary 3", "summary 2"]
+    assert [it.get("text") for it in recent[:2]] == ["text 4", "text 3"]
+    assert recent[-1].get("nope", "x") == "x"
+
+
+def test_expiry_follows_the_monotonic_clock(clock):
+    stm = ShortTermMemory(max_items=10, ttl_minutes=1)
+    stm.add("old", "old")
+    clock.t += 30
+    stm.add("new", "new")
+    version = stm.version
+    clock.t += 31
+    assert [it.text for it in stm.get_recent()] == ["new"]
+    assert stm.version > version
+    clock.t += 60
+    assert len(stm.get_recent()) == 0
+
+
+def test_forgetting_bumps_the_version():
+    stm = ShortTermMemory()
+    stm.add("I like green tea", "likes tea")
+    stm.add("my dog is Rex", "dog")
+    stm.add("tea with lemon", "lemon")
+    view = stm.get_recent()
+
+    version = stm.version
+    assert stm.delete_by_keyword("TEA") == 2
+    assert stm.version == version + 1 and [it.text for it in view] == ["my dog is Rex"]
+    assert stm.delete_by_keyword("cat") == 0 and stm.version == version + 1
+
+    assert stm.delete_latest().text == "my dog is Rex"
+    assert stm.delete_latest() is None
+    version = stm.version
+    stm.clear()
+    assert stm.version == version
@@ -0,0 +1,65 @@
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+from src.utils import (
+    HashingEmbeddingBackend,
+    contains_sensitive,
+    make_embedding_backend,
+    redact_sensitive,
+    sensitivity_scanner,
+    trie_pattern,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_trie_pattern_matches_the_same_words():
+    words = ["bank", "banking", "band", "b", "c++"]
+    pattern = re.compile(f"(?:{trie_pattern(words)})$")
+    for w in words:
+        assert pattern.match(w)
+    for w in ["ban", "banks", "c+", ""]:
+        assert not pattern.match(w)
+
+
+def test_scan_and_redact_in_one_pass():
+    text = "mail a@b.co or call 555-123-4567, card 4111 1111 1111 1111; my password is x"
+    kinds = [sp.kind for sp in sensitivity_scanner().scan(text)]
+    assert kinds == ["email", "phone", "card", "password"]
+    redacted = redact_sensitive(text)
+    assert redacted == "mail [REDACTED_EMAIL] or call [REDACTED_PHONE], card [REDACTED_CARD]; my password is x"
+    assert redact_sensitive("nothing here") == "nothing here"
+
+
+def test_user_keywords_are_case_insensitive_and_cached():
+    assert contains_sensitive("My Diagnosis came back", ["diagnosis"])
+    assert not contains_sensitive("My Diagnosis came back")
+    assert not contains_sensitive("all fine", ["diagnosis", "  "])
+    assert sensitivity_scanner(["x"]) is sensitivity_scanner(["x"])
+
+
+def test_local_embedder_is_deterministic_and_normalised():
+    backend = make_embedding_backend("local:128")
+    assert isinstance(backend, HashingEmbeddingBackend) and backend.name == "local-hash-128"
+    assert make_embedding_backend(backend.name).dim == 128
+    a, b, c, empty = backend.embed_batch(["I like green tea", "i LIKE green tea!", "kubernetes operators", ""])
+    assert a.shape == (128,) and a.dtype == np.float32
+    assert np.allclose(a, b) and abs(np.linalg.norm(a) - 1) < 1e-5
+    assert float(a @ c) < float(a @ backend.embed_batch(["green tea"])[0])
+    assert not empty.any()
+    assert np.allclose(HashingEmbeddingBackend(128).embed_batch(["I like green tea"])[0], a)
+
+
+def test_cli_modules_do_not_import_heavy_clients(tmp_path):
+    script = (
+        "import sys, run\n"
+        "from src.memory.long_term import LongTermMemory\n"
+        f"LongTermMemory({str(tmp_path)!r}, 'ltm')\n"
+        "print(sorted(m for m in ('chromadb', 'openai', 'rich') if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"